@@ -0,0 +1,228 @@
+"""Admission control for Gemini calls.
+
+At most LLM_MAX_CONCURRENCY chat requests run at once. Turns beyond that
+wait in a bounded queue. When Gemini slows down, the queue grows; a turn is
+shed instead of queued once the queue is full or its oldest entry has waited
+LLM_SHED_QUEUE_WAIT seconds, and a queued turn is shed once it has waited
+LLM_MAX_QUEUE_WAIT. Shed turns are answered without Gemini (see main.shed_turn).
+
+Fairness is by recent usage: each call's admitted turns are counted with
+exponential decay (LLM_FAIRNESS_HALF_LIFE). A free slot goes to the waiting
+call with the least recent usage, and a full queue drops the waiting turn of
+the call with the most, so a chatty call cannot starve quieter ones. Each
+call has at most LLM_MAX_PER_CALL requests in flight. A request its turn
+gave up on at the deadline still runs, so it keeps counting as active until
+it finishes (see gemini_client).
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from log_config import get_logger
+from metrics import metrics
+from session_registry import registry
+
+# Concurrent Gemini chat requests per worker process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Turns allowed to wait for a slot
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+# Shed new turns once the oldest waiting turn has waited this long (seconds)
+LLM_SHED_QUEUE_WAIT = float(os.getenv("LLM_SHED_QUEUE_WAIT", "2.0"))
+# A waiting turn gives up and is shed after this long (seconds)
+LLM_MAX_QUEUE_WAIT = float(os.getenv("LLM_MAX_QUEUE_WAIT", "4.0"))
+LLM_MAX_PER_CALL = int(os.getenv("LLM_MAX_PER_CALL", "1"))
+# Seconds for a call's usage count to halve
+LLM_FAIRNESS_HALF_LIFE = float(os.getenv("LLM_FAIRNESS_HALF_LIFE", "30"))
+
+log = get_logger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when a turn is shed instead of being sent to Gemini"""
+
+    def __init__(self, reason, waited=0.0):
+        super().__init__(f"LLM overloaded ({reason}, waited {waited:.2f}s)")
+        self.reason = reason
+        self.waited = waited
+
+
+class _Ticket:
+    __slots__ = ("call_sid", "enqueued_at", "admitted", "displaced")
+
+    def __init__(self, call_sid):
+        self.call_sid = call_sid
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+        self.displaced = False
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded, per-call fair wait queue"""
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE,
+                 shed_queue_wait=LLM_SHED_QUEUE_WAIT, max_queue_wait=LLM_MAX_QUEUE_WAIT,
+                 max_per_call=LLM_MAX_PER_CALL, half_life=LLM_FAIRNESS_HALF_LIFE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.shed_queue_wait = shed_queue_wait
+        self.max_queue_wait = max_queue_wait
+        self.max_per_call = max_per_call
+        self.half_life = half_life
+        self._cond = threading.Condition()
+        self._active = 0
+        self._active_by_call = {}  # call_sid -> requests in flight
+        self._waiting = {}  # call_sid -> deque of tickets, oldest first
+        self._queued = 0
+        self._usage = {}  # call_sid -> (decayed admitted turns, as of monotonic time)
+        self._abandoned = 0  # requests still running after their turn gave up on them
+
+    # ---------------- Queue ----------------
+    def _usage_of(self, call_sid, now):
+        usage, at = self._usage.get(call_sid, (0.0, now))
+        return usage * 0.5 ** ((now - at) / self.half_life)
+
+    def _can_run(self, call_sid):
+        return self._active_by_call.get(call_sid, 0) < self.max_per_call
+
+    def _oldest_wait(self, now):
+        return max((now - tickets[0].enqueued_at for tickets in self._waiting.values()), default=0.0)
+
+    def _start(self, call_sid, now):
+        self._active += 1
+        self._active_by_call[call_sid] = self._active_by_call.get(call_sid, 0) + 1
+        self._usage[call_sid] = (self._usage_of(call_sid, now) + 1, now)
+
+    def _dispatch(self):
+        """Admit waiting turns into free slots, least-used call first; caller holds the lock"""
+        now = time.monotonic()
+        while self._active < self.max_concurrency:
+            ready = [tickets[0] for call_sid, tickets in self._waiting.items() if self._can_run(call_sid)]
+            if not ready:
+                return
+            ticket = min(ready, key=lambda t: (self._usage_of(t.call_sid, now), t.enqueued_at))
+            self._dequeue(ticket)
+            ticket.admitted = True
+            self._start(ticket.call_sid, now)
+            self._cond.notify_all()
+
+    def _dequeue(self, ticket):
+        tickets = self._waiting[ticket.call_sid]
+        tickets.remove(ticket)
+        if not tickets:
+            del self._waiting[ticket.call_sid]
+        self._queued -= 1
+
+    def _make_room(self, call_sid, now):
+        """Drop the waiting turn of a call with more recent usage than `call_sid`; False if none"""
+        if not self._waiting:
+            # LLM_MAX_QUEUE=0: nothing to displace
+            return False
+        victim = max((tickets[-1] for tickets in self._waiting.values()),
+                     key=lambda t: (self._usage_of(t.call_sid, now), t.enqueued_at))
+        if self._usage_of(victim.call_sid, now) <= self._usage_of(call_sid, now):
+            return False
+        self._dequeue(victim)
+        victim.displaced = True
+        self._cond.notify_all()
+        return True
+
+    # ---------------- Public API ----------------
+    def acquire(self, call_sid):
+        """Wait for a slot and return the seconds waited; raises Overloaded if the turn is shed"""
+        with self._cond:
+            now = time.monotonic()
+            if self._active < self.max_concurrency and not self._waiting and self._can_run(call_sid):
+                self._start(call_sid, now)
+                metrics.observe("llm.queue_wait", 0.0)
+                return 0.0
+
+            if self._oldest_wait(now) > self.shed_queue_wait:
+                raise self._shed(call_sid, "queue_slow", 0.0)
+            if self._queued >= self.max_queue and not self._make_room(call_sid, now):
+                raise self._shed(call_sid, "queue_full", 0.0)
+
+            ticket = _Ticket(call_sid)
+            self._waiting.setdefault(call_sid, deque()).append(ticket)
+            self._queued += 1
+            self._dispatch()
+            deadline = now + self.max_queue_wait
+            while not ticket.admitted:
+                if ticket.displaced:
+                    raise self._shed(call_sid, "displaced", time.monotonic() - ticket.enqueued_at)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._dequeue(ticket)
+                    raise self._shed(call_sid, "queue_timeout", time.monotonic() - ticket.enqueued_at)
+                self._cond.wait(remaining)
+            waited = time.monotonic() - ticket.enqueued_at
+        metrics.observe("llm.queue_wait", waited)
+        return waited
+
+    def _shed(self, call_sid, reason, waited):
+        """Count a shed turn and return the exception to raise; caller holds the lock"""
+        metrics.inc("llm_shed", reason=reason)
+        log.info("Shedding Gemini request (%s, waited %.2fs, %d active, %d queued)",
+                 reason, waited, self._active, self._queued, extra={"call_sid": call_sid})
+        return Overloaded(reason, waited)
+
+    def release(self, call_sid):
+        """Return a slot taken by acquire()"""
+        with self._cond:
+            self._active -= 1
+            remaining = self._active_by_call.get(call_sid, 1) - 1
+            if remaining:
+                self._active_by_call[call_sid] = remaining
+            else:
+                self._active_by_call.pop(call_sid, None)
+            self._dispatch()
+
+    def adopt(self, future):
+        """Count a request its turn abandoned (still running) as active until it finishes"""
+        with self._cond:
+            self._active += 1
+            self._abandoned += 1
+        future.add_done_callback(self._finish_abandoned)
+
+    def _finish_abandoned(self, future):
+        with self._cond:
+            self._active -= 1
+            self._abandoned -= 1
+            self._dispatch()
+
+    def slot(self, call_sid):
+        """Context manager holding one slot for `call_sid`"""
+        return _Slot(self, call_sid)
+
+    def forget(self, call_sid):
+        """Drop the usage count of a finished call"""
+        with self._cond:
+            self._usage.pop(call_sid, None)
+
+    def stats(self):
+        with self._cond:
+            return {"active": self._active, "queued": self._queued, "abandoned": self._abandoned,
+                    "oldest_wait": self._oldest_wait(time.monotonic())}
+
+
+class _Slot:
+    __slots__ = ("controller", "call_sid", "waited")
+
+    def __init__(self, controller, call_sid):
+        self.controller = controller
+        self.call_sid = call_sid
+        self.waited = None
+
+    def __enter__(self):
+        self.waited = self.controller.acquire(self.call_sid)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.controller.release(self.call_sid)
+        return False
+
+
+llm_admission = AdmissionController()
+
+# Ended and evicted calls keep no usage count
+registry.add_eviction_hook(lambda state, reason: llm_admission.forget(state.call_sid))
@@ -0,0 +1,122 @@
+"""Latency, throughput and compatibility of the search encoder backends.
+
+Compares SEARCH_ENCODER backends (torch, torchscript, onnx) at each intra-op
+thread count on synthetic catalog text:
+
+    python bench_encoder.py --backends torch,torchscript,onnx --threads 1,2,4 --json enc.json
+
+Reported per backend and thread count: single-query latency (the per-turn
+cost), catalog throughput at --batch-size, and cosine agreement with the
+eager PyTorch vectors together with top-10 overlap on a catalog encoded by
+torch, which is what a query from an optimized encoder searches against.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+import fake_backends
+import encoders
+from intelligent_search import EMBEDDING_MODEL, SENTENCE_TRANSFORMERS_AVAILABLE, product_text
+
+QUERIES = ["basmati rice", "something spicy", "biscuits for tea", "lentils", "cooking oil", "instant noodles",
+           "haldi", "crispy namkeen", "gram flour", "ready to eat dinner", "pickle", "sweet chutney",
+           "mujhe toor dal chahiye", "do you have mustard oil", "two packets of parle g", "jeera"]
+
+
+def build(backend, threads):
+    if backend == "torch":
+        return encoders.SentenceTransformerEncoder(EMBEDDING_MODEL, threads)
+    base = encoders.SentenceTransformerEncoder(EMBEDDING_MODEL, threads)
+    if backend == "torchscript":
+        return encoders.TorchScriptEncoder(base.model, threads)
+    if backend == "onnx":
+        return encoders.OnnxEncoder(base.model, EMBEDDING_MODEL, threads)
+    raise ValueError(f"unknown backend {backend!r}")
+
+
+def query_latency(encoder, repeat):
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        encoder.encode([QUERIES[i % len(QUERIES)]])
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"p50_ms": round(samples[len(samples) // 2], 3),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+            "mean_ms": round(statistics.fmean(samples), 3)}
+
+
+def agreement(vectors, reference, catalog_reference, k=10):
+    """Cosine with the torch vectors, and top-k overlap when searching a torch-encoded catalog"""
+    def normalize(m):
+        return m / np.clip(np.linalg.norm(m, axis=1, keepdims=True), 1e-12, None)
+    vectors, reference, catalog = normalize(vectors), normalize(reference), normalize(catalog_reference)
+    cosines = (vectors * reference).sum(axis=1)
+    overlaps = []
+    for vector, ref in zip(vectors, reference):
+        expected = set(np.argsort(-(catalog @ ref))[:k])
+        actual = set(np.argsort(-(catalog @ vector))[:k])
+        overlaps.append(len(expected & actual) / k)
+    return {"mean_cosine": round(float(cosines.mean()), 5), "min_cosine": round(float(cosines.min()), 5),
+            f"top{k}_overlap": round(statistics.fmean(overlaps), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--backends", default="torch,torchscript,onnx")
+    parser.add_argument("--threads", default="1,2,4", help="comma-separated intra-op thread counts")
+    parser.add_argument("--catalog-size", type=int, default=2000, help="texts encoded for throughput")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=100, help="single-query encodes per measurement")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    args = parser.parse_args()
+    if not SENTENCE_TRANSFORMERS_AVAILABLE:
+        sys.exit("sentence-transformers is required for the encoder benchmark")
+
+    texts = [product_text(row) for row in fake_backends.generate_catalog(args.catalog_size)]
+    reference_encoder = encoders.SentenceTransformerEncoder(EMBEDDING_MODEL)
+    reference_queries = reference_encoder.encode(QUERIES)
+    reference_catalog = reference_encoder.encode(texts, batch_size=args.batch_size)
+    del reference_encoder
+
+    results = []
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        for threads in [int(t) for t in args.threads.split(",") if t.strip()]:
+            try:
+                start = time.perf_counter()
+                encoder = build(backend, threads)
+                encoder.encode(["warm up"])
+                load_s = time.perf_counter() - start
+            except ImportError as e:
+                print(f"{backend}: unavailable ({e})", file=sys.stderr)
+                break
+
+            latency = query_latency(encoder, args.repeat)
+            start = time.perf_counter()
+            encoder.encode(texts, batch_size=args.batch_size)
+            throughput = len(texts) / (time.perf_counter() - start)
+            result = {"backend": backend, "threads": threads, "load_s": round(load_s, 2),
+                      "query": latency, "texts_per_s": round(throughput, 1),
+                      **agreement(encoder.encode(QUERIES), reference_queries, reference_catalog)}
+            results.append(result)
+            print(f"{backend:<12} threads={threads:<2}  query p50={latency['p50_ms']:>7.2f}ms  "
+                  f"p95={latency['p95_ms']:>7.2f}ms  {throughput:>8.1f} texts/s  "
+                  f"cosine={result['mean_cosine']:.4f} (min {result['min_cosine']:.4f})  "
+                  f"top10={result['top10_overlap']:.3f}  load={load_s:.1f}s", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": EMBEDDING_MODEL, "catalog_size": args.catalog_size,
+                       "batch_size": args.batch_size, "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
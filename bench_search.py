@@ -0,0 +1,200 @@
+"""Search microbenchmarks over synthetic grocery catalogs.
+
+For each catalog size and search backend (transformer, TF-IDF) this measures
+index build time, search_products / search_by_category /
+find_similar_products latency, add_to_cart name resolution latency, and the
+memory held by the index. Catalogs come from fake_backends.generate_catalog
+with a fixed seed, and Sheets latency is zero, so runs are comparable:
+
+    python bench_search.py --sizes 100,1000,10000,100000 --json bench.json
+    python bench_search.py --compare bench_before.json bench.json
+
+Every operation is repeated until --repeat samples or --budget-s seconds
+(at least one sample), so large catalogs stay tractable.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("FAKE_SHEETS_LATENCY_MS", "0")
+
+import fake_backends
+import sheets_handler
+import intelligent_search
+from cart_manager import add_to_cart
+from session_registry import registry
+
+SEARCH_QUERIES = ["basmati rice", "something spicy", "biscuits for tea", "lentils", "cooking oil",
+                  "instant noodles", "haldi", "crispy namkeen"]
+CATEGORY_QUERIES = ["grocery", "snacks", "spices", "condiments"]
+SIMILAR_QUERIES = ["Toor Dal", "Garam Masala", "Parle-G", "Ghee"]
+
+
+def summarize(samples):
+    """Latency statistics in milliseconds"""
+    ms = sorted(sample * 1000 for sample in samples)
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(ms[len(ms) // 2], 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "min_ms": round(ms[0], 3),
+    }
+
+
+def measure(func, inputs, repeat, budget_s):
+    """Call func over inputs (cycled) until repeat samples or the time budget runs out"""
+    samples = []
+    deadline = time.perf_counter() + budget_s
+    while len(samples) < repeat:
+        start = time.perf_counter()
+        func(inputs[len(samples) % len(inputs)])
+        samples.append(time.perf_counter() - start)
+        if time.perf_counter() > deadline:
+            break
+    return summarize(samples)
+
+
+def index_nbytes(matrix):
+    """Bytes held by a dense or scipy-sparse embedding matrix"""
+    if matrix is None:
+        return 0
+    if hasattr(matrix, "indptr"):
+        return int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+    return int(getattr(matrix, "nbytes", 0))
+
+
+def bench_backend(backend, args):
+    """All measurements for one backend over the currently installed catalog"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    # In-thread build, so build time is the embedding work rather than worker start-up
+    engine = intelligent_search.IntelligentSearch(backend=backend, use_pool=False)
+    build_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # product_search and add_to_cart go through the module-level engine
+    intelligent_search.search_engine = engine
+    return {
+        "index_build_ms": round(build_s * 1000, 3),
+        "index_bytes": index_nbytes(engine.inventory_embeddings) + index_nbytes(engine.category_embeddings),
+        "build_peak_alloc_bytes": peak,
+        "search_products": measure(engine.search_products, SEARCH_QUERIES, args.repeat, args.budget_s),
+        "search_by_category": measure(engine.search_by_category, CATEGORY_QUERIES, args.repeat, args.budget_s),
+        "find_similar_products": measure(engine.find_similar_products, SIMILAR_QUERIES, args.repeat, args.budget_s),
+    }
+
+
+def bench_add_to_cart(catalog, args):
+    """Name resolution in add_to_cart: exact names, then fuzzy ones"""
+    exact = [row["Item Name"] for row in catalog[::max(1, len(catalog) // 8)]]
+    fuzzy = [" ".join(name.split()[1:3]).lower() for name in exact]
+
+    def resolve(name):
+        call_sid = "bench-add"
+        add_to_cart(call_sid, name, 1)
+        registry.end_call(call_sid)
+
+    return {
+        "exact": measure(resolve, exact, args.repeat, args.budget_s),
+        "fuzzy": measure(resolve, fuzzy, args.repeat, args.budget_s),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    backends = [b for b in args.backends if b != "transformer" or intelligent_search.SENTENCE_TRANSFORMERS_AVAILABLE]
+    if backends != args.backends:
+        print("sentence-transformers is not installed; skipping the transformer backend", file=sys.stderr)
+
+    results = []
+    for size in args.sizes:
+        catalog = fake_backends.install_fake_sheets(sheets_handler, catalog_size=size, latency_ms=0)
+        entry = {"catalog_size": size, "backends": {}}
+        for backend in backends:
+            entry["backends"][backend] = bench_backend(backend, args)
+            report = entry["backends"][backend]
+            print(f"size={size:>6}  {backend:<11}  build={report['index_build_ms']:>10.1f}ms  "
+                  f"index={report['index_bytes'] / 1e6:>8.2f}MB  "
+                  f"search p50={report['search_products']['p50_ms']:>9.2f}ms  "
+                  f"category p50={report['search_by_category']['p50_ms']:>8.2f}ms  "
+                  f"similar p50={report['find_similar_products']['p50_ms']:>9.2f}ms", flush=True)
+        entry["add_to_cart"] = bench_add_to_cart(catalog, args)
+        print(f"size={size:>6}  add_to_cart  exact p50={entry['add_to_cart']['exact']['p50_ms']:.2f}ms  "
+              f"fuzzy p50={entry['add_to_cart']['fuzzy']['p50_ms']:.2f}ms", flush=True)
+        results.append(entry)
+
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "budget_s": args.budget_s,
+        "results": results,
+    }
+
+
+def compare(before_path, after_path):
+    """Print p50 ratios (after / before) for every shared measurement"""
+    with open(before_path) as f:
+        before = {entry["catalog_size"]: entry for entry in json.load(f)["results"]}
+    with open(after_path) as f:
+        after = {entry["catalog_size"]: entry for entry in json.load(f)["results"]}
+
+    for size in sorted(before.keys() & after.keys()):
+        old, new = before[size], after[size]
+        rows = [(f"add_to_cart.{kind}", old["add_to_cart"][kind]["p50_ms"], new["add_to_cart"][kind]["p50_ms"])
+                for kind in ("exact", "fuzzy")]
+        for backend in sorted(old["backends"].keys() & new["backends"].keys()):
+            o, n = old["backends"][backend], new["backends"][backend]
+            rows.append((f"{backend}.index_build", o["index_build_ms"], n["index_build_ms"]))
+            for op in ("search_products", "search_by_category", "find_similar_products"):
+                rows.append((f"{backend}.{op}", o[op]["p50_ms"], n[op]["p50_ms"]))
+        for name, old_ms, new_ms in rows:
+            ratio = new_ms / old_ms if old_ms else float("inf")
+            print(f"size={size:>6}  {name:<40} {old_ms:>10.2f}ms -> {new_ms:>10.2f}ms  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default="100,1000,10000,100000", help="comma-separated catalog sizes")
+    parser.add_argument("--backends", default="transformer,tfidf", help="comma-separated search backends")
+    parser.add_argument("--repeat", type=int, default=20, help="samples per operation")
+    parser.add_argument("--budget-s", type=float, default=10.0, help="time budget per operation")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two JSON result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    args.backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+
+    report = run(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Caller-ID prefetch: load a returning caller's profile and saved cart at call start.
+
+Twilio posts the caller's number (``From``) to /twiml while the greeting is
+being played. The customer row, the caller's last order and any cart saved
+under that number are read from Google Sheets in the background, so they are
+already in the call state when the first utterance arrives instead of being
+fetched (or asked for) on the first turn.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from log_config import get_logger
+from metrics import metrics, span
+from session_registry import registry
+from sheets_handler import get_customer_by_phone, get_last_order, load_cart_by_phone, load_cart, save_cart, delete_cart, normalize_phone
+from state_store import state_store, checkpoint_call
+
+# Seconds the first turn waits for a prefetch that is still running
+PREFETCH_WAIT = float(os.getenv("PREFETCH_WAIT", "1.5"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "8"))
+
+log = get_logger(__name__)
+
+# Sheets reads are blocking HTTP calls; run them off the event loop. Lookups get
+# their own pool so prefetches waiting on them can never starve it.
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_lookups = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS * 2, thread_name_prefix="prefetch-read")
+
+
+def _customer_record(row, phone):
+    """Customers sheet row as a customer_info dict"""
+    return {
+        "name": row.get("Name", ""),
+        "phone": str(row.get("Phone Number") or phone),
+        "address": row.get("Address", ""),
+        "city": row.get("City", ""),
+        "state": row.get("State", ""),
+        "zip": str(row.get("Zip", "")),
+    }
+
+
+def _prefetch(call_sid, phone):
+    """Fetch profile, last order and saved cart concurrently and store them in the call state"""
+    start = time.perf_counter()
+    with span("prefetch.caller"):
+        customer = _lookups.submit(get_customer_by_phone, phone)
+        last_order = _lookups.submit(get_last_order, phone)
+        # A cart saved under this call (a re-delivered webhook) wins over one saved under the number
+        cart = load_cart(call_sid) or load_cart_by_phone(phone)
+        customer, last_order = customer.result(), last_order.result()
+
+    state = registry.get(call_sid, create=True)
+    adopted = False
+    with state.lock:
+        if customer and not state.customer:
+            state.customer = _customer_record(customer, phone)
+        if cart and cart["Items"] and not (state.cart and state.cart.get("items")):
+            state.cart = {
+                "items": cart["Items"],
+                "total": sum(item.get("subtotal", 0) for item in cart["Items"]),
+                "customer_phone": cart["Customer Phone"] or phone,
+            }
+            adopted = True
+        state.last_order = last_order
+
+    # A cart left by an earlier call moves to this call's row, so placing the
+    # order (which deletes this call's row) does not leave it to be adopted again
+    previous_session = cart.get("Session ID") if adopted else None
+    if previous_session and previous_session != call_sid:
+        save_cart(call_sid, {"Customer Phone": cart["Customer Phone"] or phone, "Items": cart["Items"]})
+        delete_cart(previous_session)
+
+    # Another worker may serve the first turn; share what was found unless a turn already did
+    if state_store.shared and state_store.get("call", call_sid) is None:
+        checkpoint_call(call_sid)
+
+    metrics.inc("caller_prefetch_hits" if customer else "caller_prefetch_misses")
+    log.debug("Caller prefetch done in %.0fms (customer=%s, cart=%s, last_order=%s)",
+              (time.perf_counter() - start) * 1000, bool(customer), bool(cart), bool(last_order),
+              extra={"call_sid": call_sid})
+    return customer is not None
+
+
+def start_caller_prefetch(call_sid, phone):
+    """Start prefetching the caller's data in the background; returns immediately"""
+    if not call_sid or not normalize_phone(phone):
+        return None
+    state = registry.get(call_sid, create=True)
+    with state.lock:
+        if state.prefetch is not None:
+            # Twilio retried the webhook
+            return state.prefetch
+        state.caller_phone = phone
+        state.prefetch = _executor.submit(_prefetch, call_sid, phone)
+        return state.prefetch
+
+
+def wait_for_prefetch(call_sid, timeout=PREFETCH_WAIT):
+    """Block until the call's prefetch finished (or timed out); False if none was started"""
+    state = registry.get(call_sid)
+    future = state.prefetch if state is not None else None
+    if future is None:
+        return False
+    try:
+        future.result(timeout=timeout)
+    except FutureTimeout:
+        metrics.inc("caller_prefetch_late")
+        log.debug("Caller prefetch still running after %.1fs", timeout, extra={"call_sid": call_sid})
+    except Exception as e:
+        log.warning("Caller prefetch failed: %s", e, extra={"call_sid": call_sid})
+    return True
@@ -1,27 +1,56 @@
 from datetime import datetime
 from sheets_handler import save_cart, delete_cart, save_customer
 from language import LANG
+from session_registry import registry
+from conversation import ConversationHistory
+from order_history import order_index
+from query_normalizer import normalize_query
+from log_config import get_logger, SampledDebug
 import json
-# Global data stores
-shopping_carts = {}  # {call_sid: {items: [], total: 0, customer_phone: ""}}
-customer_info = {}   # {call_sid: {name: "", phone: "", address: "", city: "", state: "", zip: ""}}
-conversation_history = {}  # {call_sid: [{role: "user"/"assistant", content: ""}]}
+import uuid
+
+log = get_logger(__name__)
+_sampled_compare = SampledDebug(log)
+
+# Per-call data stores (views over the shared session registry)
+shopping_carts = registry.field("cart")  # {call_sid: {items: [], total: 0, customer_phone: ""}}
+customer_info = registry.field("customer")   # {call_sid: {name: "", phone: "", address: "", city: "", state: "", zip: ""}}
+conversation_history = registry.field("history")  # {call_sid: ConversationHistory}
+
+def flush_cart(state, reason):
+    """Eviction hook: persist a non-empty cart before its call state is dropped"""
+    cart = state.cart
+    if not cart or not cart.get("items"):
+        return
+    save_cart(state.call_sid, {
+        "Customer Phone": cart.get("customer_phone", ""),
+        "Items": cart["items"],
+        "Total": cart["total"]
+    })
+    log.debug("Flushed cart for evicted session (%s)", reason, extra={"call_sid": state.call_sid})
+
+registry.add_eviction_hook(flush_cart)
 
 def add_to_cart(call_sid, product_name, quantity, customer_phone=None, language="en"):
     """Add item to shopping cart and update Google Sheets"""
     from sheets_handler import get_inventory, save_cart
     
     inventory = get_inventory()
-    print(f"DEBUG: add_to_cart searching for '{product_name}' in {len(inventory)} items")
+    # A catalog name is matched as said; anything else may be Hindi/Gujarati
+    if not any(item.get("Item Name", "").lower() == product_name.lower() for item in inventory):
+        product_name = normalize_query(product_name)
+    log.debug("add_to_cart searching for %r in %d items", product_name, len(inventory))
     
     # First try exact match
     matched_item = None
+    debug = _sampled_compare.enabled
     for item in inventory:
         item_name = item.get("Item Name", "")
-        print(f"DEBUG: Comparing '{product_name.lower()}' with '{item_name.lower()}'")
+        if debug:
+            _sampled_compare("Comparing %r with %r", product_name, item_name)
         if item_name.lower() == product_name.lower():
             matched_item = item
-            print(f"DEBUG: Exact match found: {item_name}")
+            log.debug("Exact match found: %s", item_name)
             break
     
     # If no exact match, try fuzzy matching
@@ -54,47 +83,51 @@ def add_to_cart(call_sid, product_name, quantity, customer_phone=None, language=
         
         if best_match:
             matched_item = best_match
-            print(f"DEBUG: Best fuzzy match found: {matched_item['Item Name']} (score: {best_score:.2f}) for query '{product_name}'")
+            log.debug("Best fuzzy match found: %s (score: %.2f) for query %r", matched_item['Item Name'], best_score, product_name)
     
     if matched_item:
         available_qty = matched_item.get("Quantity", 0)
-        print(f"DEBUG: Found item '{matched_item['Item Name']}' with quantity {available_qty}")
+        log.debug("Found item %r with quantity %s", matched_item['Item Name'], available_qty)
         
         if available_qty >= quantity:
-            if call_sid not in shopping_carts:
-                shopping_carts[call_sid] = {"items": [], "total": 0, "customer_phone": customer_phone}
-            
-            # Check if item already in cart
-            item_found = False
-            for cart_item in shopping_carts[call_sid]["items"]:
-                if cart_item["name"] == matched_item["Item Name"]:
-                    cart_item["quantity"] += quantity
-                    cart_item["subtotal"] = cart_item["quantity"] * matched_item["Price (USD)"]
-                    item_found = True
-                    break
-            
-            if not item_found:
-                shopping_carts[call_sid]["items"].append({
-                    "name": matched_item["Item Name"],
-                    "quantity": quantity,
-                    "price": matched_item["Price (USD)"],
-                    "subtotal": quantity * matched_item["Price (USD)"]
-                })
-            
-            shopping_carts[call_sid]["total"] = sum(item["subtotal"] for item in shopping_carts[call_sid]["items"])
-            
-            # Save to Google Sheets
-            try:
-                # Format cart data for sheets
-                cart_for_sheets = {
-                    "Customer Phone": shopping_carts[call_sid].get("customer_phone", ""),
-                    "Items": shopping_carts[call_sid]["items"],
-                    "Total": shopping_carts[call_sid]["total"]
-                }
-                save_cart(call_sid, cart_for_sheets)
-                print(f"DEBUG: Cart saved to Google Sheets for session {call_sid}")
-            except Exception as e:
-                print(f"ERROR: Failed to save cart to sheets: {e}")
+            # Hold the call's lock for the whole read-modify-write-save so
+            # concurrent adds on the same call never lose an update
+            with registry.lock(call_sid):
+                if call_sid not in shopping_carts:
+                    shopping_carts[call_sid] = {"items": [], "total": 0, "customer_phone": customer_phone}
+                cart = shopping_carts[call_sid]
+
+                # Check if item already in cart
+                item_found = False
+                for cart_item in cart["items"]:
+                    if cart_item["name"] == matched_item["Item Name"]:
+                        cart_item["quantity"] += quantity
+                        cart_item["subtotal"] = cart_item["quantity"] * matched_item["Price (USD)"]
+                        item_found = True
+                        break
+
+                if not item_found:
+                    cart["items"].append({
+                        "name": matched_item["Item Name"],
+                        "quantity": quantity,
+                        "price": matched_item["Price (USD)"],
+                        "subtotal": quantity * matched_item["Price (USD)"]
+                    })
+
+                cart["total"] = sum(item["subtotal"] for item in cart["items"])
+
+                # Save to Google Sheets
+                try:
+                    # Format cart data for sheets
+                    cart_for_sheets = {
+                        "Customer Phone": cart.get("customer_phone", ""),
+                        "Items": cart["items"],
+                        "Total": cart["total"]
+                    }
+                    save_cart(call_sid, cart_for_sheets)
+                    log.debug("Cart saved to Google Sheets", extra={"call_sid": call_sid})
+                except Exception as e:
+                    log.error("Failed to save cart to sheets: %s", e, extra={"call_sid": call_sid})
             
             return True, LANG["item_added"][language].format(qty=quantity, item=matched_item['Item Name'])
         else:
@@ -102,8 +135,58 @@ def add_to_cart(call_sid, product_name, quantity, customer_phone=None, language=
     
     return False, LANG["no_products"][language].format(query=product_name)
 
+def add_items_to_cart(call_sid, items, customer_phone=None):
+    """Add several (product name, quantity) pairs with a single cart write
+
+    Names are matched exactly against the inventory; quantities are capped at
+    the stock available. Returns (added [(name, quantity)], unavailable [name]).
+    """
+    from sheets_handler import get_inventory, save_cart
+
+    by_name = {item.get("Item Name", "").lower(): item for item in get_inventory()}
+    added, unavailable = [], []
+    with registry.lock(call_sid):
+        if call_sid not in shopping_carts:
+            shopping_carts[call_sid] = {"items": [], "total": 0, "customer_phone": customer_phone}
+        cart = shopping_carts[call_sid]
+        in_cart = {cart_item["name"]: cart_item for cart_item in cart["items"]}
+
+        for name, quantity in items:
+            matched_item = by_name.get(name.lower())
+            available_qty = matched_item.get("Quantity", 0) if matched_item else 0
+            if available_qty <= 0:
+                unavailable.append(name)
+                continue
+            quantity = min(quantity, available_qty)
+            price = matched_item["Price (USD)"]
+            cart_item = in_cart.get(matched_item["Item Name"])
+            if cart_item is None:
+                cart_item = {"name": matched_item["Item Name"], "quantity": 0, "price": price, "subtotal": 0}
+                cart["items"].append(cart_item)
+                in_cart[cart_item["name"]] = cart_item
+            cart_item["quantity"] += quantity
+            cart_item["subtotal"] = cart_item["quantity"] * price
+            added.append((matched_item["Item Name"], quantity))
+
+        if added:
+            cart["total"] = sum(item["subtotal"] for item in cart["items"])
+            try:
+                save_cart(call_sid, {
+                    "Customer Phone": cart.get("customer_phone", ""),
+                    "Items": cart["items"],
+                    "Total": cart["total"]
+                })
+            except Exception as e:
+                log.error("Failed to save cart to sheets: %s", e, extra={"call_sid": call_sid})
+    return added, unavailable
+
 def remove_from_cart(call_sid, product_name, quantity=None, language="en"):
     """Remove item from shopping cart"""
+    with registry.lock(call_sid):
+        return _remove_from_cart(call_sid, product_name, quantity, language)
+
+def _remove_from_cart(call_sid, product_name, quantity, language):
+    """Remove item from shopping cart; caller holds the call's lock"""
     from sheets_handler import save_cart
     
     if call_sid not in shopping_carts:
@@ -127,9 +210,9 @@ def remove_from_cart(call_sid, product_name, quantity=None, language="en"):
                         "Total": cart["total"]
                     }
                     save_cart(call_sid, cart_for_sheets)
-                    print(f"DEBUG: Cart updated after removing {removed_item['name']}")
+                    log.debug("Cart updated after removing %s", removed_item['name'], extra={"call_sid": call_sid})
                 except Exception as e:
-                    print(f"ERROR: Failed to save cart after removal: {e}")
+                    log.error("Failed to save cart after removal: %s", e, extra={"call_sid": call_sid})
                 
                 return True, LANG["item_removed"][language].format(qty=removed_item['quantity'], item=removed_item['name'])
             else:
@@ -146,9 +229,9 @@ def remove_from_cart(call_sid, product_name, quantity=None, language="en"):
                         "Total": cart["total"]
                     }
                     save_cart(call_sid, cart_for_sheets)
-                    print(f"DEBUG: Cart updated after reducing {cart_item['name']} quantity")
+                    log.debug("Cart updated after reducing %s quantity", cart_item['name'], extra={"call_sid": call_sid})
                 except Exception as e:
-                    print(f"ERROR: Failed to save cart after quantity reduction: {e}")
+                    log.error("Failed to save cart after quantity reduction: %s", e, extra={"call_sid": call_sid})
                 
                 return True, f"Reduced {cart_item['name']} quantity by {quantity}. Now you have {cart_item['quantity']} in cart."
     
@@ -156,41 +239,43 @@ def remove_from_cart(call_sid, product_name, quantity=None, language="en"):
 
 def get_cart_summary(call_sid, language="en"):
     """Get summary of shopping cart"""
-    if call_sid not in shopping_carts or not shopping_carts[call_sid]["items"]:
-        return LANG["cart_empty"][language]
-    
-    cart = shopping_carts[call_sid]
-    item_count = len(cart["items"])
-    total = cart["total"]
+    with registry.lock(call_sid):
+        if call_sid not in shopping_carts or not shopping_carts[call_sid]["items"]:
+            return LANG["cart_empty"][language]
+        
+        cart = shopping_carts[call_sid]
+        item_count = len(cart["items"])
+        total = cart["total"]
     return LANG["cart_summary"][language].format(count=item_count, total=total)
 
 def place_order(call_sid, customer_data, language="en"):
     """Place order and update Google Sheets"""
+    with registry.lock(call_sid):
+        return _place_order(call_sid, customer_data, language)
+
+def _place_order(call_sid, customer_data, language):
+    """Place order and update Google Sheets; caller holds the call's lock"""
     if call_sid not in shopping_carts or not shopping_carts[call_sid]["items"]:
         return False, LANG["cart_empty"][language]
     
     try:
-        # Update inventory
-        from sheets_handler import get_inventory, inventory_sheet
-        inventory = get_inventory()
-        for cart_item in shopping_carts[call_sid]["items"]:
-            for i, item in enumerate(inventory):
-                if item["Item Name"] == cart_item["name"]:
-                    new_qty = item["Quantity"] - cart_item["quantity"]
-                    # Update Google Sheets
-                    inventory_sheet.update_cell(i+2, 3, new_qty)  # +2 because of header row
+        # Update inventory (queued for replay if Google Sheets is down)
+        from sheets_handler import decrement_stock, append_order
+        # Timestamp first so IDs still sort by time; the suffix keeps orders placed in the same second apart
+        order_id = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+        decrement_stock(order_id, shopping_carts[call_sid]["items"])
         
         # Add to orders sheet
-        from sheets_handler import orders_sheet
         order_data = [
-            datetime.now().strftime("%Y%m%d%H%M%S"),  # Order ID
+            order_id,
             customer_data.get("phone", ""),
             json.dumps(shopping_carts[call_sid]["items"]),
             shopping_carts[call_sid]["total"],
             "Pending",
             datetime.now().strftime("%Y-%m-%d")
         ]
-        orders_sheet.append_row(order_data)
+        append_order(order_data)
+        order_index.record_order(order_id, order_data[1], shopping_carts[call_sid]["items"], order_data[5])
         
         # Save/update customer information
         save_customer({
@@ -210,7 +295,6 @@ def place_order(call_sid, customer_data, language="en"):
         # Remove cart from Google Sheets
         delete_cart(call_sid)
         
-        order_id = datetime.now().strftime("%Y%m%d%H%M%S")
         return True, LANG["order_placed"][language].format(order_id=order_id)
     
     except Exception as e:
@@ -218,26 +302,17 @@ def place_order(call_sid, customer_data, language="en"):
 
 def add_to_conversation_history(call_sid, role, content):
     """Add message to conversation history"""
-    if call_sid not in conversation_history:
-        conversation_history[call_sid] = []
-    
-    conversation_history[call_sid].append({
-        "role": role,
-        "content": content,
-        "timestamp": datetime.now().isoformat()
-    })
-    
-    # Keep only the last 10 messages to avoid memory issues
-    if len(conversation_history[call_sid]) > 10:
-        conversation_history[call_sid] = conversation_history[call_sid][-10:]
+    with registry.lock(call_sid):
+        if call_sid not in conversation_history:
+            # Ring buffer keeps only the last 10 messages
+            conversation_history[call_sid] = ConversationHistory()
+        
+        conversation_history[call_sid].append(role, content)
 
 def get_conversation_context(call_sid):
     """Get recent conversation context"""
     if call_sid not in conversation_history:
         return ""
     
-    context = "Recent conversation:\n"
-    for msg in conversation_history[call_sid][-5:]:  # Last 5 messages
-        context += f"{msg['role']}: {msg['content']}\n"
-    
-    return context
\ No newline at end of file
+    with registry.lock(call_sid):
+        return conversation_history[call_sid].render(5)  # Last 5 messages
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""Circuit breaker for calls to an unreliable backend (Google Sheets).
+
+After ``failure_threshold`` consecutive failures the circuit opens and calls
+fail immediately with CircuitOpen instead of each waiting for an HTTP
+timeout. After ``reset_timeout`` seconds one probe call is let through
+(half-open): success closes the circuit, failure opens it again.
+"""
+import functools
+import threading
+import time
+
+from log_config import get_logger
+from metrics import metrics
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+log = get_logger(__name__)
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the backend while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self._on_close = []
+
+    def add_close_listener(self, callback):
+        """Call callback() whenever the circuit closes after being open"""
+        self._on_close.append(callback)
+
+    def _allow(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                log.info("Circuit %s half-open: probing", self.name)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def _record_success(self):
+        with self._lock:
+            reopened = self.state != CLOSED
+            self.state, self.failures, self._probing = CLOSED, 0, False
+        if reopened:
+            log.info("Circuit %s closed", self.name)
+            metrics.inc("circuit_closed", breaker=self.name)
+            for callback in self._on_close:
+                callback()
+
+    def _record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    log.warning("Circuit %s open after %d failures (last: %s)", self.name, self.failures, error)
+                    metrics.inc("circuit_opened", breaker=self.name)
+                self.state, self.opened_at = OPEN, time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        """func(*args, **kwargs) unless the circuit is open"""
+        if not self._allow():
+            metrics.inc("circuit_rejected", breaker=self.name)
+            raise CircuitOpen(f"{self.name} circuit is open")
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        self._record_success()
+        return result
+
+    @property
+    def is_closed(self):
+        return self.state == CLOSED
+
+
+class GuardedWorksheet:
+    """Worksheet proxy whose API calls go through a circuit breaker"""
+
+    def __init__(self, worksheet, breaker):
+        self._worksheet = worksheet
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def guarded(*args, **kwargs):
+            return self._breaker.call(attr, *args, **kwargs)
+        return guarded
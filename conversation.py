@@ -0,0 +1,66 @@
+import time
+from collections import deque
+from itertools import islice
+
+# Messages kept per call
+HISTORY_CAPACITY = 10
+# Messages rendered into the conversation context
+CONTEXT_MESSAGES = 5
+
+
+class Message:
+    """One conversation turn; timestamp is time.monotonic()"""
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role, content, timestamp=None):
+        self.role = role
+        self.content = content
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content!r})"
+
+
+class ConversationHistory:
+    """Fixed-capacity ring buffer of messages with a cached context rendering"""
+    __slots__ = ("_messages", "_rendered", "_rendered_count")
+
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        self._messages = deque(maxlen=capacity)
+        self._rendered = None
+        self._rendered_count = None
+
+    def append(self, role, content):
+        """Add a message, dropping the oldest once capacity is reached"""
+        self._messages.append(Message(role, content))
+        self._rendered = None
+
+    def render(self, count=CONTEXT_MESSAGES):
+        """Context string for the last `count` messages; recomputed only after appends"""
+        if self._rendered is None or self._rendered_count != count:
+            start = max(len(self._messages) - count, 0)
+            lines = [f"{msg.role}: {msg.content}\n" for msg in islice(self._messages, start, None)]
+            self._rendered = "Recent conversation:\n" + "".join(lines)
+            self._rendered_count = count
+        return self._rendered
+
+    def as_pairs(self):
+        """Serializable [role, content] pairs, oldest first"""
+        return [[msg.role, msg.content] for msg in self._messages]
+
+    @classmethod
+    def from_pairs(cls, pairs, capacity=HISTORY_CAPACITY):
+        """Rebuild a history from as_pairs() output"""
+        history = cls(capacity)
+        for role, content in pairs:
+            history.append(role, content)
+        return history
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __getitem__(self, index):
+        return self._messages[index]
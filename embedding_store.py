@@ -0,0 +1,212 @@
+import os
+
+import numpy as np
+
+from log_config import get_logger
+
+# Storage precision for dense catalog embeddings: float32, float16 or int8
+EMBEDDING_PRECISION = os.getenv("EMBEDDING_PRECISION", "float32").lower()
+# Rows converted to float32/int32 at a time while scoring a reduced-precision store
+SCORE_BLOCK_ROWS = 8192
+# Query rows multiplied against each block when building the neighbour table
+NEIGHBOUR_QUERY_ROWS = 512
+
+log = get_logger(__name__)
+
+
+def _normalize(matrix):
+    """L2-normalize rows so cosine similarity is a plain dot product"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class EmbeddingStore:
+    """Row-normalized catalog embeddings scored by cosine similarity"""
+    precision = None
+
+    def __len__(self):
+        raise NotImplementedError
+
+    @property
+    def nbytes(self):
+        raise NotImplementedError
+
+    def vector(self, index):
+        """Approximate float32 embedding of one row"""
+        raise NotImplementedError
+
+    def scores(self, query):
+        """Cosine similarity of a query vector to every row, as float32"""
+        raise NotImplementedError
+
+    def block(self, start, stop):
+        """Approximate float32 embeddings of rows start:stop"""
+        raise NotImplementedError
+
+    def take(self, indices):
+        """Approximate float32 embeddings of the given rows"""
+        raise NotImplementedError
+
+
+class Float32Store(EmbeddingStore):
+    precision = "float32"
+
+    def __init__(self, embeddings):
+        self.matrix = _normalize(embeddings)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes
+
+    def vector(self, index):
+        return self.matrix[index]
+
+    def scores(self, query):
+        return self.matrix @ _normalize(query).ravel()
+
+    def block(self, start, stop):
+        return self.matrix[start:stop]
+
+    def take(self, indices):
+        return self.matrix[indices]
+
+
+class Float16Store(EmbeddingStore):
+    """Half-precision rows; half the memory of float32"""
+    precision = "float16"
+
+    def __init__(self, embeddings):
+        self.matrix = _normalize(embeddings).astype(np.float16)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes
+
+    def vector(self, index):
+        return self.matrix[index].astype(np.float32)
+
+    def scores(self, query):
+        # numpy has no BLAS kernel for float16, so upcast one block at a time
+        query = _normalize(query).ravel()
+        out = np.empty(len(self.matrix), dtype=np.float32)
+        for start in range(0, len(self.matrix), SCORE_BLOCK_ROWS):
+            block = self.matrix[start:start + SCORE_BLOCK_ROWS]
+            out[start:start + len(block)] = block.astype(np.float32) @ query
+        return out
+
+    def block(self, start, stop):
+        return self.matrix[start:stop].astype(np.float32)
+
+    def take(self, indices):
+        return self.matrix[indices].astype(np.float32)
+
+
+class Int8Store(EmbeddingStore):
+    """Symmetric int8 rows with a float32 scale per vector; about a quarter of float32"""
+    precision = "int8"
+
+    def __init__(self, embeddings):
+        self.matrix, self.row_scales = self._quantize(_normalize(embeddings))
+
+    @staticmethod
+    def _quantize(matrix):
+        scales = np.abs(matrix).max(axis=-1, keepdims=True) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(matrix / scales), -127, 127).astype(np.int8)
+        return quantized, scales.ravel().astype(np.float32)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes + self.row_scales.nbytes
+
+    def vector(self, index):
+        return self.matrix[index].astype(np.float32) * self.row_scales[index]
+
+    def scores(self, query):
+        # Quantize the query too, take integer dot products and rescale
+        query_q, query_scale = self._quantize(_normalize(query).reshape(1, -1))
+        query_q = query_q.ravel().astype(np.int32)
+        out = np.empty(len(self.matrix), dtype=np.float32)
+        for start in range(0, len(self.matrix), SCORE_BLOCK_ROWS):
+            block = self.matrix[start:start + SCORE_BLOCK_ROWS]
+            out[start:start + len(block)] = block.astype(np.int32) @ query_q
+        out *= self.row_scales
+        out *= query_scale[0]
+        return out
+
+    def block(self, start, stop):
+        return self.matrix[start:stop].astype(np.float32) * self.row_scales[start:stop, None]
+
+    def take(self, indices):
+        return self.matrix[indices].astype(np.float32) * self.row_scales[indices, None]
+
+
+STORES = {store.precision: store for store in (Float32Store, Float16Store, Int8Store)}
+
+
+def nearest_neighbours(store, k, rows=None, candidates=None):
+    """Indices of the k rows most similar to each of `rows` (itself excluded), best first
+
+    Computed as blocked matrix products: NEIGHBOUR_QUERY_ROWS query rows at a
+    time against SCORE_BLOCK_ROWS candidate rows, keeping a running top-k, so
+    memory stays bounded for any catalog size. `candidates` (sorted row
+    indices, not including `rows`) restricts the rows that may be neighbours.
+    Returns (indices int32, scores float32), both of shape (len(rows), k).
+    """
+    rows = np.arange(len(store)) if rows is None else np.asarray(rows, dtype=np.int64)
+    if candidates is None:
+        candidates = np.arange(len(store))
+        k = min(k, len(store) - 1)
+    else:
+        candidates = np.asarray(candidates, dtype=np.int64)
+        k = min(k, len(candidates))
+    k = max(k, 0)
+    out_indices = np.empty((len(rows), k), dtype=np.int32)
+    out_scores = np.empty((len(rows), k), dtype=np.float32)
+    if k == 0 or len(rows) == 0:
+        return out_indices, out_scores
+
+    for q_start in range(0, len(rows), NEIGHBOUR_QUERY_ROWS):
+        query_rows = rows[q_start:q_start + NEIGHBOUR_QUERY_ROWS]
+        queries = store.take(query_rows)
+        best_scores = np.empty((len(query_rows), 0), dtype=np.float32)
+        best_indices = np.empty((len(query_rows), 0), dtype=np.int64)
+        for c_start in range(0, len(candidates), SCORE_BLOCK_ROWS):
+            block_rows = candidates[c_start:c_start + SCORE_BLOCK_ROWS]
+            contiguous = block_rows[-1] - block_rows[0] + 1 == len(block_rows)
+            block = store.block(block_rows[0], block_rows[-1] + 1) if contiguous else store.take(block_rows)
+            scores = queries @ block.T
+            scores[query_rows[:, None] == block_rows[None, :]] = -np.inf
+            scores = np.concatenate([best_scores, scores], axis=1)
+            indices = np.concatenate([best_indices, np.broadcast_to(block_rows, (len(query_rows), len(block_rows)))], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                indices = np.take_along_axis(indices, keep, axis=1)
+            best_scores, best_indices = scores, indices
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        out_scores[q_start:q_start + len(query_rows)] = np.take_along_axis(best_scores, order, axis=1)
+        out_indices[q_start:q_start + len(query_rows)] = np.take_along_axis(best_indices, order, axis=1)
+    return out_indices, out_scores
+
+
+def make_embedding_store(embeddings, precision=EMBEDDING_PRECISION):
+    """Wrap encoder output in a store of the configured precision"""
+    store = STORES.get(precision)
+    if len(embeddings) == 0:
+        store = Float32Store
+    elif store is None:
+        log.warning("Unknown EMBEDDING_PRECISION %r, using float32", precision)
+        store = Float32Store
+    return store(embeddings)
@@ -0,0 +1,193 @@
+"""Sentence encoders for IntelligentSearch.
+
+SEARCH_ENCODER selects how text is embedded on CPU:
+
+    torch        SentenceTransformer in PyTorch eager mode (default)
+    torchscript  traced graph, Linear layers dynamically quantized to int8
+    onnx         exported ONNX graph run by onnxruntime, int8 weights
+
+All three tokenize with the model's own tokenizer and mean-pool token
+embeddings like all-MiniLM-L6-v2 does, so their vectors are interchangeable
+with stored catalog embeddings (see bench_encoder.py for measured agreement).
+onnx needs the optional ``onnx`` and ``onnxruntime`` packages; if they are
+missing the torch encoder is used.
+
+    ENCODER_THREADS=0      # intra-op threads; 0 keeps the library default
+    ENCODER_QUANTIZE=1     # int8 weights for torchscript/onnx
+    ENCODER_CACHE_DIR=...  # where exported graphs are kept
+"""
+import os
+
+import numpy as np
+
+from log_config import get_logger
+from metrics import span
+
+SEARCH_ENCODER = os.getenv("SEARCH_ENCODER", "torch").lower()
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))
+ENCODER_QUANTIZE = os.getenv("ENCODER_QUANTIZE", "1") == "1"
+ENCODER_CACHE_DIR = os.getenv("ENCODER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+
+# Inputs of the exported graphs, in BertModel.forward order
+INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+
+log = get_logger(__name__)
+
+
+class SentenceTransformerEncoder:
+    """SentenceTransformer in PyTorch eager mode"""
+    name = "torch"
+
+    def __init__(self, model_name, threads=ENCODER_THREADS):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=32):
+        return self.model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True)
+
+
+class PooledEncoder:
+    """Tokenize, run a token-embedding graph, mean-pool and normalize"""
+    name = None
+
+    def __init__(self, st_model):
+        self.tokenizer = st_model.tokenizer
+        self.max_length = st_model.max_seq_length
+        self.dimensions = st_model.get_sentence_embedding_dimension()
+
+    def _run(self, batch):
+        """Token embeddings (batch, sequence, dimensions) for tokenized numpy inputs"""
+        raise NotImplementedError
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        # Batch texts of similar length together so little time is spent on padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = np.empty((len(texts), self.dimensions), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            indices = order[start:start + batch_size]
+            batch = self.tokenizer([texts[i] for i in indices], padding=True, truncation=True,
+                                   max_length=self.max_length, return_tensors="np")
+            batch = {name: np.asarray(batch[name], dtype=np.int64) if name in batch
+                     else np.zeros_like(batch["input_ids"], dtype=np.int64) for name in INPUT_NAMES}
+            tokens = self._run(batch)
+            mask = batch["attention_mask"][..., None].astype(np.float32)
+            pooled = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            out[indices] = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return out
+
+
+def _token_embedding_module(st_model):
+    """torch.nn.Module mapping (input_ids, attention_mask, token_type_ids) to token embeddings"""
+    import torch
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(input_ids=input_ids, attention_mask=attention_mask,
+                                    token_type_ids=token_type_ids)[0]
+
+    return TokenEmbeddings(st_model[0].auto_model).eval()
+
+
+def _sample_inputs(st_model):
+    import torch
+    sample = st_model.tokenizer(["basmati rice 5 kg"], return_tensors="pt")
+    return tuple(sample[name] if name in sample else torch.zeros_like(sample["input_ids"]) for name in INPUT_NAMES)
+
+
+class TorchScriptEncoder(PooledEncoder):
+    """Traced TorchScript graph, optionally with int8 dynamic quantization"""
+    name = "torchscript"
+
+    def __init__(self, st_model, threads=ENCODER_THREADS, quantize=ENCODER_QUANTIZE):
+        import torch
+        super().__init__(st_model)
+        if threads:
+            torch.set_num_threads(threads)
+        module = _token_embedding_module(st_model)
+        if quantize:
+            module = torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+        with torch.inference_mode():
+            self.module = torch.jit.trace(module, _sample_inputs(st_model), check_trace=False)
+        self._torch = torch
+
+    def _run(self, batch):
+        torch = self._torch
+        with torch.inference_mode():
+            return self.module(*(torch.from_numpy(batch[name]) for name in INPUT_NAMES)).numpy()
+
+
+def _model_slug(model_name):
+    return model_name.replace("/", "__")
+
+
+def export_onnx(st_model, model_name, quantize=ENCODER_QUANTIZE, cache_dir=ENCODER_CACHE_DIR):
+    """Export (once) the model's transformer to ONNX; returns the graph's path"""
+    import torch
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{_model_slug(model_name)}.onnx")
+    quantized_path = os.path.join(cache_dir, f"{_model_slug(model_name)}.int8.onnx")
+    target = quantized_path if quantize else path
+    if os.path.exists(target):
+        return target
+
+    # Several workers may export at once; each writes its own file and renames it into place
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if not os.path.exists(path):
+        dynamic = {name: {0: "batch", 1: "sequence"} for name in INPUT_NAMES + ("token_embeddings",)}
+        with span("search.export_onnx"), torch.no_grad():
+            torch.onnx.export(_token_embedding_module(st_model), _sample_inputs(st_model), tmp,
+                              input_names=list(INPUT_NAMES), output_names=["token_embeddings"],
+                              dynamic_axes=dynamic, opset_version=14)
+        os.replace(tmp, path)
+        log.info("Exported %s to %s", model_name, path)
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(path, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, quantized_path)
+        log.info("Quantized ONNX graph written to %s", quantized_path)
+    return target
+
+
+class OnnxEncoder(PooledEncoder):
+    """Exported ONNX graph run by onnxruntime on CPU"""
+    name = "onnx"
+
+    def __init__(self, st_model, model_name, threads=ENCODER_THREADS, quantize=ENCODER_QUANTIZE):
+        import onnxruntime as ort
+        super().__init__(st_model)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads:
+            options.intra_op_num_threads = threads
+        self.path = export_onnx(st_model, model_name, quantize)
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+
+    def _run(self, batch):
+        return self.session.run(None, batch)[0]
+
+
+def create_encoder(model_name, backend=SEARCH_ENCODER, threads=ENCODER_THREADS):
+    """Encoder for the configured backend, falling back to eager PyTorch"""
+    base = SentenceTransformerEncoder(model_name, threads)
+    try:
+        if backend == "onnx":
+            return OnnxEncoder(base.model, model_name, threads)
+        if backend == "torchscript":
+            return TorchScriptEncoder(base.model, threads)
+        if backend != "torch":
+            log.warning("Unknown SEARCH_ENCODER %r, using torch", backend)
+    except ImportError as e:
+        log.warning("%s encoder unavailable (%s), using torch", backend, e)
+    return base
@@ -0,0 +1,301 @@
+"""Local stand-ins for Google Sheets and Gemini with configurable latency.
+
+Enabled in main.py with ``FAKE_BACKENDS=1`` so the app can be load-tested
+and benchmarked without credentials or network access:
+
+    FAKE_SHEETS_LATENCY_MS=150   # per worksheet request
+    FAKE_SHEETS_ERROR_RATE=0.0   # fraction of worksheet requests that fail
+    FAKE_LLM_LATENCY_MS=800      # mean Gemini round trip
+    FAKE_LLM_JITTER_MS=200       # +/- uniform jitter
+    FAKE_LLM_SLOW_RATE=0.0       # fraction of responses that are slow
+    FAKE_LLM_SLOW_MS=8000        # extra delay for a slow response
+    FAKE_CATALOG_SIZE=200        # synthetic inventory rows
+"""
+import os
+import random
+import re
+import threading
+import time
+
+FAKE_SHEETS_LATENCY_MS = float(os.getenv("FAKE_SHEETS_LATENCY_MS", "150"))
+FAKE_SHEETS_ERROR_RATE = float(os.getenv("FAKE_SHEETS_ERROR_RATE", "0"))
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))
+FAKE_LLM_JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "200"))
+FAKE_LLM_SLOW_RATE = float(os.getenv("FAKE_LLM_SLOW_RATE", "0"))
+FAKE_LLM_SLOW_MS = float(os.getenv("FAKE_LLM_SLOW_MS", "8000"))
+FAKE_CATALOG_SIZE = int(os.getenv("FAKE_CATALOG_SIZE", "200"))
+
+# ---------------- Synthetic catalog ----------------
+_PRODUCTS = {
+    "Grocery": [("Basmati Rice", "rice, basmati"), ("Sona Masoori Rice", "rice"), ("Toor Dal", "lentils, dal, pulses"),
+                ("Moong Dal", "lentils, dal"), ("Chana Dal", "lentils, dal"), ("Whole Wheat Atta", "flour, atta, wheat"),
+                ("Besan", "gram flour"), ("Black Eyed Peas", "pulses, beans"), ("Horse Gram", "lentils, protein"),
+                ("Rajma", "kidney beans, pulses"), ("Poha", "flattened rice"), ("Sooji", "semolina, rava")],
+    "Snacks": [("Milk Bikis", "biscuits, cookies"), ("Parle-G", "biscuits, glucose"), ("Aloo Bhujia", "namkeen, savory"),
+               ("Khakhra", "gujarati, crispy"), ("Mathri", "namkeen, crispy"), ("Chakli", "namkeen, crunchy"),
+               ("Banana Chips", "chips, kerala"), ("Masala Peanuts", "peanuts, spicy")],
+    "Spices": [("Turmeric Powder", "haldi, spice"), ("Red Chilli Powder", "mirchi, spice"), ("Garam Masala", "masala, blend"),
+               ("Cumin Seeds", "jeera, whole spice"), ("Coriander Powder", "dhania, spice"), ("Mustard Seeds", "rai, whole spice"),
+               ("Hing", "asafoetida"), ("Kasuri Methi", "fenugreek leaves")],
+    "Food": [("Maggi Masala Noodles", "noodles, instant"), ("Ready Paneer Tikka", "ready to eat"), ("Frozen Parathas", "frozen, bread"),
+             ("Mango Pickle", "achar, pickle"), ("Ghee", "clarified butter"), ("Mustard Oil", "oil, cooking")],
+    "Condiments": [("Tomato Ketchup", "ketchup, sauce"), ("Green Chutney", "chutney, mint"), ("Tamarind Chutney", "imli, sweet")],
+}
+_BRANDS = ["Chora", "Deep", "Swad", "Laxmi", "Haldiram's", "MDH", "Everest", "Aashirvaad", "24 Mantra", "Britannia"]
+_SIZES = ["200 g", "500 g", "1 kg", "2 lb", "4 lb", "5kg", "7 oz", "10 lb", "400 g", "1 lb"]
+
+
+def generate_catalog(size, seed=42):
+    """Grocery-like inventory rows in the Inventory sheet's schema"""
+    rng = random.Random(seed)
+    flat = [(category, name, tags) for category, items in _PRODUCTS.items() for name, tags in items]
+    rows = []
+    seen = set()
+    while len(rows) < size:
+        category, name, tags = flat[len(rows) % len(flat)]
+        brand = rng.choice(_BRANDS)
+        item_size = rng.choice(_SIZES)
+        item_name = f"{brand} {name} {item_size}"
+        if item_name in seen:
+            item_name = f"{item_name} #{len(rows)}"
+        seen.add(item_name)
+        rows.append({
+            "Item Name": item_name,
+            "Category": category,
+            "Quantity": rng.randint(0, 50),
+            "Price (USD)": round(rng.uniform(0.99, 24.99), 2),
+            "Description": f"{brand} {name.lower()} ({category.lower()})",
+            "Tags": f"{tags}, {category.lower()}",
+        })
+    return rows
+
+
+# ---------------- Google Sheets ----------------
+def _sleep_ms(ms):
+    if ms > 0:
+        time.sleep(ms / 1000.0)
+
+
+class FakeWorksheet:
+    """In-memory stand-in for a gspread Worksheet"""
+
+    def __init__(self, title, header, rows=(), latency_ms=None):
+        self.title = title
+        self.header = list(header)
+        self.rows = [list(row) for row in rows]
+        self.latency_ms = FAKE_SHEETS_LATENCY_MS if latency_ms is None else latency_ms
+        self.error_rate = FAKE_SHEETS_ERROR_RATE
+        self.outage = False  # set to fail every request, as during a Sheets outage
+        self._lock = threading.Lock()
+
+    def _request(self):
+        """Simulated round trip: latency, then an injected failure if any"""
+        _sleep_ms(self.latency_ms)
+        if self.outage or (self.error_rate and random.random() < self.error_rate):
+            raise ConnectionError(f"fake Sheets request to {self.title} failed")
+
+    def get_all_records(self):
+        self._request()
+        with self._lock:
+            return [dict(zip(self.header, row)) for row in self.rows]
+
+    def get_all_values(self):
+        self._request()
+        with self._lock:
+            return [list(self.header)] + [list(row) for row in self.rows]
+
+    def update_cell(self, row, col, value):
+        self._request()
+        with self._lock:
+            target = self.rows[row - 2]
+            while len(target) < col:
+                target.append("")
+            target[col - 1] = value
+
+    def update(self, range_name, values):
+        """Minimal A1 range update: 'A{row}' or 'A{row}:Z{row}' for one or more rows"""
+        self._request()
+        first_row = int(re.search(r"\d+", range_name).group())
+        with self._lock:
+            for offset, values_row in enumerate(values):
+                index = first_row - 2 + offset
+                while len(self.rows) <= index:
+                    self.rows.append([""] * len(self.header))
+                self.rows[index] = list(values_row)
+
+    def append_row(self, values):
+        self._request()
+        with self._lock:
+            self.rows.append(list(values))
+
+    def append_rows(self, rows):
+        self._request()
+        with self._lock:
+            self.rows.extend(list(row) for row in rows)
+
+    def delete_rows(self, index):
+        self._request()
+        with self._lock:
+            del self.rows[index - 2]
+
+
+def install_fake_sheets(sheets_module, catalog_size=FAKE_CATALOG_SIZE, latency_ms=None):
+    """Point sheets_handler at in-memory worksheets seeded with a synthetic catalog"""
+    inventory_header = ["Item Name", "Category", "Quantity", "Price (USD)", "Description", "Tags"]
+    catalog = generate_catalog(catalog_size)
+    sheets_module.inventory_sheet = FakeWorksheet(
+        "Inventory", inventory_header, ([row[key] for key in inventory_header] for row in catalog), latency_ms)
+    sheets_module.customers_sheet = FakeWorksheet(
+        "Customers", ["Phone Number", "Name", "Address", "City", "State", "Zip", "Last Order Date"], (), latency_ms)
+    sheets_module.orders_sheet = FakeWorksheet(
+        "Orders", ["Order ID", "Customer Phone", "Items JSON", "Total", "Status", "Date"], (), latency_ms)
+    sheets_module.carts_sheet = FakeWorksheet(
+        "Carts", ["Session ID", "Customer Phone", "Items JSON", "Last Updated"], (), latency_ms)
+    return catalog
+
+
+# ---------------- Gemini ----------------
+class FakeFunctionCall:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+
+class FakePart:
+    def __init__(self, text=None, function_call=None):
+        self.text = text
+        self.function_call = function_call
+
+
+class FakeContent:
+    def __init__(self, role, parts):
+        self.role = role
+        self.parts = parts
+
+
+class FakeCandidate:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, parts, prompt_tokens):
+        self.candidates = [FakeCandidate(FakeContent("model", parts))]
+        self.usage_metadata = FakeUsage(prompt_tokens, sum(len(p.text or "") for p in parts) // 4)
+
+    @property
+    def text(self):
+        return "".join(part.text or "" for part in self.candidates[0].content.parts)
+
+
+_NUMBERS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "a": 1, "an": 1}
+
+
+def _detect_language(text):
+    lowered = text.lower()
+    if re.search(r"[ऀ-ॿ]", text) or any(w in lowered for w in ("mujhe", "chahiye", "kya", "hai")):
+        return "hi"
+    if re.search(r"[઀-૿]", text) or any(w in lowered for w in ("tame", "cho", "chhe", "joie")):
+        return "gu"
+    return "en"
+
+
+def fake_intent(message):
+    """Rule-based stand-in for Gemini's tool selection; returns response parts"""
+    utterance = message.split("USER:", 1)[-1].strip().strip('"')
+    lowered = utterance.lower()
+    language = _detect_language(utterance)
+
+    calls = []
+    for qty, product in re.findall(r"add (\w+) ([a-z][a-z '\-]+?)(?= and add |,|$)", lowered):
+        quantity = int(qty) if qty.isdigit() else _NUMBERS.get(qty, 1)
+        calls.append(FakeFunctionCall("add_to_cart", {"product_name": product.strip(), "quantity": quantity, "language": language}))
+    if calls:
+        return [FakePart(function_call=call) for call in calls]
+    if "remove" in lowered:
+        product = lowered.split("remove", 1)[1].strip() or "item"
+        return [FakePart(function_call=FakeFunctionCall("remove_from_cart", {"product_name": product, "language": language}))]
+    if re.search(r"\busual\b|same as last time|repeat (?:my|the) (?:last )?order|reorder", lowered):
+        return [FakePart(function_call=FakeFunctionCall("reorder_usual", {"language": language}))]
+    if "cart" in lowered or "card" in lowered:
+        return [FakePart(function_call=FakeFunctionCall("get_cart_summary", {"language": language}))]
+    if "order" in lowered or "checkout" in lowered:
+        name = re.search(r"name (\w+)", lowered)
+        phone = re.search(r"phone (\d+)", lowered)
+        address = re.search(r"address (.+)$", lowered)
+        return [FakePart(function_call=FakeFunctionCall("place_order", {
+            "customer_name": name.group(1).title() if name else "unknown",
+            "customer_phone": phone.group(1) if phone else "unknown",
+            "customer_address": address.group(1) if address else "unknown",
+            "language": language,
+        }))]
+    search = (re.search(r"(?:do you have|looking for|show me|search for|want|need)\s+(.+)$", lowered)
+              or re.search(r"(?:mujhe\s+)?(.+?)\s+chahiye", lowered))
+    if search or "what do you have" in lowered:
+        query = search.group(1) if search else "items"
+        return [FakePart(function_call=FakeFunctionCall("search_products", {"query": query, "language": language}))]
+    if "bye" in lowered or "thank" in lowered:
+        return [FakePart(text=f"<language>{language}</language><response>Thank you, goodbye!</response>")]
+    return [FakePart(text=f"<language>{language}</language><response>How can I help you with your groceries?</response>")]
+
+
+class FakeChatSession:
+    """Stand-in for genai ChatSession with injected latency"""
+
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = [_as_content(entry) for entry in (history or [])]
+
+    def send_message(self, content, *, generation_config=None, safety_settings=None, stream=False, **kwargs):
+        # google-generativeai 0.3.2 turns extra keywords into request fields and rejects unknown ones
+        if kwargs:
+            raise ValueError(f"Unknown field for GenerateContentRequest: {next(iter(kwargs))}")
+        delay = FAKE_LLM_LATENCY_MS + random.uniform(-FAKE_LLM_JITTER_MS, FAKE_LLM_JITTER_MS)
+        if FAKE_LLM_SLOW_RATE and random.random() < FAKE_LLM_SLOW_RATE:
+            delay += FAKE_LLM_SLOW_MS
+        _sleep_ms(delay)
+
+        text = content if isinstance(content, str) else str(content)
+        if text.startswith("You are Aditi"):
+            parts = [FakePart(text="<language>en</language><response>Understood.</response>")]
+        else:
+            parts = fake_intent(text)
+        prompt_tokens = sum(len(p.text or "") for c in self.history for p in c.parts) // 4 + len(text) // 4
+        self.history.append(FakeContent("user", [FakePart(text=text)]))
+        self.history.append(FakeContent("model", parts))
+        return FakeResponse(parts, prompt_tokens)
+
+
+def _as_content(entry):
+    if isinstance(entry, dict):
+        return FakeContent(entry["role"], [FakePart(text=part) if isinstance(part, str) else part for part in entry["parts"]])
+    return entry
+
+
+class FakeGenerativeModel:
+    """Stand-in for genai.GenerativeModel"""
+
+    def __init__(self, model_name=None, tools=None, **kwargs):
+        self.model_name = model_name
+        self.tools = tools
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
+
+
+class _FakeGenAI:
+    """Module-shaped replacement for google.generativeai"""
+    GenerativeModel = FakeGenerativeModel
+
+    @staticmethod
+    def configure(**kwargs):
+        pass
+
+
+fake_genai = _FakeGenAI()
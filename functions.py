@@ -110,5 +110,20 @@ function_declarations = [
             },
             "required": ["customer_name", "customer_phone", "customer_address", "language"]
         }
+    },
+    {
+        "name": "reorder_usual",
+        "description": "Add the caller's usual items from their previous orders to the cart in one step. Use when they ask for their usual order, the same as last time, or to repeat an order.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {
+                "language": {
+                    "type": "STRING",
+                    "description": "Language code: en, hi, or gu",
+                    "enum": ["en", "hi", "gu"]
+                }
+            },
+            "required": ["language"]
+        }
     }
 ]
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""Deadline-bounded, hedged and retried Gemini chat requests.
+
+``send_message(chat, content)`` replaces ``chat.send_message(content)`` for
+a turn:
+
+- every turn has a deadline (GEMINI_TURN_DEADLINE), enforced by waiting on
+  the request's future. google-generativeai 0.3.2 takes no per-request
+  timeout, so a request past the deadline is abandoned: the turn moves on
+  with a clone of the chat (GeminiTimeout.chat), and the request finishes
+  in a GEMINI_WORKERS pool thread, counted by admission control as active
+  until it does;
+- if no answer has arrived after the recent p95 latency, a second copy of
+  the request is sent on a clone of the chat and the first answer wins
+  (GEMINI_HEDGE, at most GEMINI_MAX_HEDGES hedges in flight);
+- transient errors (timeouts, 429, 5xx) are retried with full-jitter
+  exponential backoff while the deadline allows.
+
+A ChatSession appends to its history when an answer arrives, so only the
+first request of a turn runs on the caller's chat; hedges and retries run
+on clones started from the history as it was before the turn. The chat
+that produced the answer is returned and becomes the call's session.
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from admission import llm_admission
+from log_config import get_logger
+from metrics import metrics, span
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _TRANSIENT = (google_exceptions.DeadlineExceeded, google_exceptions.ServiceUnavailable,
+                  google_exceptions.ResourceExhausted, google_exceptions.InternalServerError)
+except ImportError:
+    _TRANSIENT = ()
+
+# Seconds a turn may wait for Gemini before it is answered without it
+GEMINI_TURN_DEADLINE = float(os.getenv("GEMINI_TURN_DEADLINE", "8"))
+# Send a duplicate request once a turn is slower than this latency quantile
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "1") == "1"
+GEMINI_HEDGE_QUANTILE = float(os.getenv("GEMINI_HEDGE_QUANTILE", "0.95"))
+# Hedge delay until enough latencies have been seen, and its lower bound
+GEMINI_HEDGE_DEFAULT_DELAY = float(os.getenv("GEMINI_HEDGE_DEFAULT_DELAY", "3.0"))
+GEMINI_HEDGE_MIN_DELAY = 0.5
+GEMINI_MAX_HEDGES = int(os.getenv("GEMINI_MAX_HEDGES", "4"))
+GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", "2"))
+# Backoff before retry n is uniform in [0, GEMINI_RETRY_BASE * 2**n] seconds
+GEMINI_RETRY_BASE = float(os.getenv("GEMINI_RETRY_BASE", "0.25"))
+# Recent request latencies the hedge quantile is computed over
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+log = get_logger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("GEMINI_WORKERS", "32")), thread_name_prefix="gemini")
+_hedges = threading.BoundedSemaphore(GEMINI_MAX_HEDGES)
+
+
+class GeminiTimeout(Exception):
+    """No answer from Gemini before the turn's deadline
+
+    ``chat`` is a clone of the chat as it was before the turn; use it from now
+    on, since an abandoned request may still append to the original.
+    """
+
+    def __init__(self, message, chat=None):
+        super().__init__(message)
+        self.chat = chat
+
+
+class LatencyTracker:
+    """Rolling window of successful request latencies"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q, default):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return default
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+latencies = LatencyTracker()
+
+
+def _is_transient(error):
+    return isinstance(error, _TRANSIENT + (TimeoutError, ConnectionError))
+
+
+def _clone(chat, history):
+    """New chat session on the same model, starting from `history`"""
+    return chat.model.start_chat(history=list(history))
+
+
+def _send(chat, content):
+    """One request; the caller stops waiting for it at the turn's deadline"""
+    start = time.perf_counter()
+    with span("gemini.request"):
+        response = chat.send_message(content)
+    latencies.add(time.perf_counter() - start)
+    return response
+
+
+def _submit(chat, content):
+    """Run _send in the pool with this thread's context (call_sid for logs and spans)"""
+    ctx = contextvars.copy_context()
+    return _executor.submit(ctx.run, _send, chat, content)
+
+
+def _hedged(chat, content, deadline, hedge, history):
+    """Send once, and once more on a clone if the first is slow; first answer wins"""
+    pending = {_submit(chat, content): chat}
+    hedge_at = None
+    if hedge:
+        delay = max(latencies.quantile(GEMINI_HEDGE_QUANTILE, GEMINI_HEDGE_DEFAULT_DELAY), GEMINI_HEDGE_MIN_DELAY)
+        hedge_at = time.monotonic() + delay
+    hedged = False
+    error = None
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                raise GeminiTimeout(f"no answer within {GEMINI_TURN_DEADLINE:.1f}s")
+            wake = min(deadline, hedge_at) if hedge_at is not None else deadline
+            done, _ = wait(pending, timeout=max(wake - now, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                session = pending.pop(future)
+                if future.exception() is None:
+                    if session is not chat:
+                        metrics.inc("gemini_hedge_wins")
+                    return future.result(), session
+                error = future.exception()
+            if error is not None and not pending:
+                raise error
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                # Hedges are capped so a slow Gemini is not sent twice the load
+                if _hedges.acquire(blocking=False):
+                    hedged = True
+                    metrics.inc("gemini_hedges")
+                    clone = _clone(chat, history)
+                    pending[_submit(clone, content)] = clone
+    finally:
+        for future in pending:
+            # A request already running cannot be cancelled; it keeps its thread until Gemini answers
+            if not future.cancel():
+                llm_admission.adopt(future)
+        if hedged:
+            _hedges.release()
+
+
+def send_message(chat, content, deadline=GEMINI_TURN_DEADLINE, hedge=GEMINI_HEDGE, retries=GEMINI_RETRIES):
+    """(response, chat that answered) for one turn; raises GeminiTimeout past the deadline"""
+    deadline = time.monotonic() + deadline
+    history = list(chat.history)
+    session = chat
+    for attempt in range(retries + 1):
+        try:
+            return _hedged(session, content, deadline, hedge, history)
+        except GeminiTimeout as e:
+            metrics.inc("gemini_deadline_misses")
+            e.chat = _clone(chat, history)
+            raise
+        except Exception as e:
+            if not _is_transient(e) or attempt == retries:
+                raise
+            backoff = random.uniform(0, GEMINI_RETRY_BASE * 2 ** (attempt + 1))
+            if time.monotonic() + backoff >= deadline:
+                metrics.inc("gemini_deadline_misses")
+                raise GeminiTimeout(f"no time left to retry after {type(e).__name__}", _clone(chat, history)) from e
+            metrics.inc("gemini_retries")
+            log.warning("Transient Gemini error (%s); retrying in %.2fs", e, backoff)
+            time.sleep(backoff)
+            # The failed request may still complete on the original chat; retry on a clone
+            session = _clone(chat, history)
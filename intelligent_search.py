@@ -2,89 +2,374 @@ import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sheets_handler import get_inventory
+from metrics import metrics, span, timed
+from embedding_store import make_embedding_store, nearest_neighbours
+from lexical_index import BM25Index
+from query_normalizer import normalizer
+from log_config import get_logger, SampledDebug
+from concurrent.futures import ProcessPoolExecutor
+import importlib.util
+import logging
+import multiprocessing
+import os
 import re
+import threading
 
-try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    SENTENCE_TRANSFORMERS_AVAILABLE = False
-    print("WARNING: sentence-transformers not available, using TF-IDF fallback")
+log = get_logger(__name__)
+_sampled_rank = SampledDebug(log)
+
+# Checked without importing: importing sentence_transformers (and torch) takes seconds
+SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+if not SENTENCE_TRANSFORMERS_AVAILABLE:
+    log.warning("sentence-transformers not available, using TF-IDF fallback")
+
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+# Processes that build catalog embeddings (each preloads the model); 0 builds in the calling thread
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+# Smaller catalogs are cheaper to embed in-thread than to ship to a worker
+EMBEDDING_POOL_MIN_ITEMS = int(os.getenv("EMBEDDING_POOL_MIN_ITEMS", "500"))
+# Seconds between background inventory refreshes of the live engine
+INDEX_REFRESH_INTERVAL = float(os.getenv("INDEX_REFRESH_INTERVAL", "60"))
+# Neighbours per item precomputed at each index build for find_similar_products; 0 disables the table
+SIMILAR_NEIGHBOURS = int(os.getenv("SIMILAR_NEIGHBOURS", "20"))
+# Larger catalogs score similar products per request instead (the table costs O(n²) to build)
+SIMILAR_TABLE_MAX_ITEMS = int(os.getenv("SIMILAR_TABLE_MAX_ITEMS", "50000"))
+# Past this share of changed products a refresh rebuilds the whole table
+SIMILAR_INCREMENTAL_MAX_CHANGED = 0.25
+# How dense and BM25 rankings are combined: "rrf" (reciprocal rank), "weighted" or "off" (dense only)
+SEARCH_FUSION = os.getenv("SEARCH_FUSION", "rrf").lower()
+# Share of the BM25 score in "weighted" fusion
+SEARCH_LEXICAL_WEIGHT = float(os.getenv("SEARCH_LEXICAL_WEIGHT", "0.4"))
+# Reciprocal rank fusion constant; larger values flatten the head of each ranking
+RRF_K = 60
+# Top rows taken from each ranking before fusing
+FUSION_CANDIDATES = 50
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+def load_encoder():
+    """Load the SEARCH_ENCODER encoder once; None if sentence-transformers is not installed"""
+    global _encoder
+    if not SENTENCE_TRANSFORMERS_AVAILABLE:
+        return None
+    with _encoder_lock:
+        if _encoder is None:
+            from encoders import create_encoder
+            with span("search.load_model"):
+                _encoder = create_encoder(EMBEDDING_MODEL)
+                # First call initializes kernels and thread pools
+                _encoder.encode(["warm up"])
+            log.info("Loaded embedding model %s (%s encoder)", EMBEDDING_MODEL, _encoder.name)
+        return _encoder
+
+def product_text(item):
+    """All searchable text of an inventory row"""
+    return f"{item.get('Item Name', '')} {item.get('Category', '')} {item.get('Description', '')} {item.get('Tags', '')}"
+
+class SearchIndex:
+    """Immutable snapshot of the catalog and its embeddings; replaced whole on refresh"""
+    __slots__ = ("inventory_data", "inventory_embeddings", "categories", "category_embeddings",
+                 "vectorizer", "fingerprint", "positions", "texts", "neighbours", "neighbour_scores", "lexical",
+                 "row_categories")
+
+    def __init__(self, inventory_data, inventory_embeddings, categories, category_embeddings,
+                 vectorizer=None, fingerprint=None, texts=None, neighbours=None, neighbour_scores=None,
+                 lexical=None):
+        self.inventory_data = inventory_data
+        self.inventory_embeddings = inventory_embeddings
+        self.categories = categories
+        self.category_embeddings = category_embeddings
+        self.vectorizer = vectorizer
+        self.fingerprint = fingerprint
+        # Lowercased item name -> row, for lookups by exact name
+        self.positions = {item.get('Item Name', '').lower(): i for i, item in enumerate(inventory_data)}
+        # Lowercased category of each row, for masking whole categories out of a ranking
+        self.row_categories = np.array([item.get('Category', '').lower() for item in inventory_data], dtype=str)
+        self.texts = texts
+        # Row indices of each row's most similar rows, best first (None when not built)
+        self.neighbours = neighbours
+        self.neighbour_scores = neighbour_scores
+        # BM25 index over the same product texts (None when not built)
+        self.lexical = lexical
+
+EMPTY_INDEX = SearchIndex([], np.array([]), [], np.array([]))
+
+def _rows(embeddings):
+    """Row count of an embedding store, dense array or sparse TF-IDF matrix (which has no len())"""
+    return embeddings.shape[0] if hasattr(embeddings, "shape") else len(embeddings)
+
+def embed_catalog(product_texts, categories, use_transformers):
+    """Product and category embeddings (plus the fitted vectorizer for TF-IDF)
+
+    CPU-bound; runs in an embedding worker process for large catalogs.
+    """
+    if use_transformers:
+        encoder = load_encoder()
+        # Normalized and stored at EMBEDDING_PRECISION (see embedding_store)
+        return make_embedding_store(encoder.encode(product_texts)), encoder.encode(categories), None
+    # Use TF-IDF as fallback
+    vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
+    return vectorizer.fit_transform(product_texts), vectorizer.transform(categories), vectorizer
+
+# ---------------- Similar-product table ----------------
+class _SparseRows:
+    """TF-IDF matrix with the block/take interface of an EmbeddingStore"""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def block(self, start, stop):
+        return self.matrix[start:stop].toarray().astype(np.float32)
+
+    def take(self, indices):
+        return self.matrix[indices].toarray().astype(np.float32)
+
+def _top_k(indices, scores, k):
+    """Best k columns of each row of (indices, scores), best first"""
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, keep, axis=1)
+        indices = np.take_along_axis(indices, keep, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(indices, order, axis=1).astype(np.int32), np.take_along_axis(scores, order, axis=1)
+
+def build_neighbours(embeddings, use_transformers, texts, k=SIMILAR_NEIGHBOURS, previous=None):
+    """Neighbour table (indices, scores) for a catalog, or (None, None) when disabled
+
+    With the `previous` index, rows whose product text is unchanged keep their
+    neighbours and are only compared against the changed rows; rows that are
+    new or changed, or that lost a neighbour, are recomputed in full. TF-IDF
+    vectors all shift when the vectorizer is refitted, so that table is
+    always rebuilt.
+    """
+    store = embeddings if use_transformers else _SparseRows(embeddings)
+    n = len(store)
+    if k <= 0 or n < 2 or n > SIMILAR_TABLE_MAX_ITEMS:
+        return None, None
+    k = min(k, n - 1)
+
+    reusable = (use_transformers and previous is not None and previous.neighbours is not None
+                and previous.neighbours.shape[1] == k and len(set(texts)) == n)
+    if reusable:
+        old_rows = {text: i for i, text in enumerate(previous.texts)}
+        new_to_old = np.array([old_rows.get(text, -1) for text in texts], dtype=np.int64)
+        changed = np.flatnonzero(new_to_old < 0)
+        reusable = len(changed) <= SIMILAR_INCREMENTAL_MAX_CHANGED * n
+    if not reusable:
+        with span("search.build_neighbours"):
+            return nearest_neighbours(store, k)
+
+    with span("search.update_neighbours"):
+        unchanged = np.flatnonzero(new_to_old >= 0)
+        old_to_new = np.full(len(previous.texts), -1, dtype=np.int64)
+        old_to_new[new_to_old[unchanged]] = unchanged
+        mapped = old_to_new[previous.neighbours[new_to_old[unchanged]]]
+        intact = (mapped >= 0).all(axis=1)
+        keep, recompute = unchanged[intact], np.concatenate([changed, unchanged[~intact]])
+
+        indices = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=np.float32)
+        if recompute.size:
+            indices[recompute], scores[recompute] = nearest_neighbours(store, k, recompute)
+        if keep.size:
+            kept_indices, kept_scores = mapped[intact], previous.neighbour_scores[new_to_old[keep]]
+            if changed.size:
+                # A changed row may now rank among an unchanged row's neighbours
+                new_indices, new_scores = nearest_neighbours(store, k, keep, candidates=changed)
+                kept_indices = np.concatenate([kept_indices, new_indices], axis=1)
+                kept_scores = np.concatenate([kept_scores, new_scores], axis=1)
+            indices[keep], scores[keep] = _top_k(kept_indices, kept_scores, k)
+    log.debug("Neighbour table updated: %d rows recomputed, %d reused", len(recompute), len(keep))
+    return indices, scores
+
+# ---------------- Hybrid ranking ----------------
+def _top_rows(scores, k):
+    """Indices of the k highest scores, best first"""
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
+    return np.argsort(-scores, kind="stable")
+
+def fuse_rankings(dense, lexical, method=SEARCH_FUSION, candidates=FUSION_CANDIDATES):
+    """Rows ranked by combining dense similarity and BM25 scores, best first
+
+    "rrf" sums 1 / (RRF_K + rank) over both rankings, which needs no score
+    calibration; "weighted" mixes min-max normalized scores with
+    SEARCH_LEXICAL_WEIGHT. Only the top `candidates` of each ranking compete.
+    """
+    dense_top = _top_rows(dense, candidates)
+    lexical_top = _top_rows(lexical, candidates)
+    lexical_top = lexical_top[lexical[lexical_top] > 0]
+    if method == "weighted":
+        pool = np.union1d(dense_top, lexical_top)
+        dense_part, lexical_part = dense[pool], lexical[pool]
+        spread = dense_part.max() - dense_part.min()
+        dense_part = (dense_part - dense_part.min()) / spread if spread > 0 else np.ones_like(dense_part)
+        lexical_part = lexical_part / lexical_part.max() if lexical_part.max() > 0 else lexical_part
+        fused = (1 - SEARCH_LEXICAL_WEIGHT) * dense_part + SEARCH_LEXICAL_WEIGHT * lexical_part
+        return pool[np.argsort(-fused, kind="stable")]
+    fused = {}
+    for ranking in (dense_top, lexical_top):
+        for rank, row in enumerate(ranking.tolist()):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return np.array(sorted(fused, key=fused.get, reverse=True), dtype=np.int64)
+
+# ---------------- Embedding worker pool ----------------
+_pool = None
+_pool_lock = threading.Lock()
+
+def _init_embedding_worker():
+    """Preload the model once per worker process"""
+    load_encoder()
+
+def _embedding_pool():
+    """Process pool for embedding builds; None when EMBEDDING_WORKERS=0"""
+    global _pool
+    if EMBEDDING_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that already runs torch and server threads is unsafe
+            _pool = ProcessPoolExecutor(EMBEDDING_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_embedding_worker)
+            log.info("Started %d embedding worker process(es)", EMBEDDING_WORKERS)
+        return _pool
+
+def shutdown_embedding_pool(wait=False):
+    """Stop the embedding workers (app shutdown, or before forking)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
 
 class IntelligentSearch:
-    def __init__(self):
-        # Use sentence transformers if available, otherwise TF-IDF
-        if SENTENCE_TRANSFORMERS_AVAILABLE:
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, backend=None, use_pool=True, similar_neighbours=SIMILAR_NEIGHBOURS):
+        # "transformer" or "tfidf"; defaults to sentence transformers if available, otherwise TF-IDF
+        if backend is None:
+            backend = "transformer" if SENTENCE_TRANSFORMERS_AVAILABLE else "tfidf"
+        if backend == "transformer":
+            # Query encoding stays in-process; catalog builds may use the worker pool
+            self.model = load_encoder()
             self.use_transformers = True
         else:
-            self.vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
             self.use_transformers = False
-            
-        self.inventory_embeddings = None
-        self.inventory_data = None
-        self.category_embeddings = None
-        self.categories = None
+        self.use_pool = use_pool
+        self.similar_neighbours = similar_neighbours
+        
+        self.index = EMPTY_INDEX
+        self._refresh_lock = threading.Lock()
+        self._refresh_requested = threading.Event()
+        self._refresher = None
         self._initialize_embeddings()
     
+    # Read-only views of the current snapshot
+    inventory_data = property(lambda self: self.index.inventory_data)
+    inventory_embeddings = property(lambda self: self.index.inventory_embeddings)
+    categories = property(lambda self: self.index.categories)
+    category_embeddings = property(lambda self: self.index.category_embeddings)
+    
     def _initialize_embeddings(self):
         """Initialize embeddings for inventory and categories"""
         try:
-            # Force refresh inventory data to ensure consistency
             self.refresh_inventory()
             
         except Exception as e:
-            print(f"Error initializing embeddings: {e}")
-            import traceback
-            traceback.print_exc()
-            self.inventory_data = []
-            self.inventory_embeddings = np.array([])
+            log.exception("Error initializing embeddings: %s", e)
+            self.index = EMPTY_INDEX
     
+    @timed("search.refresh_inventory")
     def refresh_inventory(self):
-        """Refresh inventory data and regenerate embeddings"""
-        self.inventory_data = get_inventory()
-        print(f"DEBUG: Loaded {len(self.inventory_data)} items for embedding initialization")
-        
-        # Print first few items for debugging
-        for i, item in enumerate(self.inventory_data[:5]):
-            print(f"DEBUG: Item {i+1}: {item.get('Item Name', 'N/A')} - Qty: {item.get('Quantity', 0)}")
+        """Reload inventory and swap in a new index; embeddings are rebuilt only if product text changed
         
-        # Create text representations for each product
-        product_texts = []
-        categories = set()
-        
-        for item in self.inventory_data:
-            # Combine all searchable text
-            text = f"{item.get('Item Name', '')} {item.get('Category', '')} {item.get('Description', '')} {item.get('Tags', '')}"
-            product_texts.append(text)
-            categories.add(item.get('Category', '').lower())
-        
-        # Generate embeddings for products
-        if self.use_transformers:
-            self.inventory_embeddings = self.model.encode(product_texts)
-        else:
-            # Use TF-IDF as fallback
-            self.inventory_embeddings = self.vectorizer.fit_transform(product_texts)
-        
-        # Generate embeddings for categories
-        self.categories = list(categories)
+        Searches keep using the previous snapshot until the swap, so they never
+        wait for a rebuild. Returns False if another refresh is already running.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            inventory_data = get_inventory()
+            log.debug("Loaded %d items for embedding initialization", len(inventory_data))
+            
+            # Create text representations for each product
+            product_texts = [product_text(item) for item in inventory_data]
+            categories = sorted({item.get('Category', '').lower() for item in inventory_data})
+            fingerprint = hash((self.use_transformers, tuple(product_texts)))
+            
+            current = self.index
+            if current.fingerprint == fingerprint:
+                # Only stock or prices changed: keep the embeddings
+                self.index = SearchIndex(inventory_data, current.inventory_embeddings, current.categories,
+                                         current.category_embeddings, current.vectorizer, fingerprint,
+                                         current.texts, current.neighbours, current.neighbour_scores,
+                                         current.lexical)
+                return True
+            
+            with span("search.encode_catalog"):
+                pool = _embedding_pool() if self.use_pool and len(product_texts) >= EMBEDDING_POOL_MIN_ITEMS else None
+                if pool is not None:
+                    embedded = pool.submit(embed_catalog, product_texts, categories, self.use_transformers).result()
+                else:
+                    embedded = embed_catalog(product_texts, categories, self.use_transformers)
+            
+            inventory_embeddings, category_embeddings, vectorizer = embedded
+            with span("search.build_lexical"):
+                lexical = BM25Index.build(product_texts, previous=current.lexical)
+            neighbours, neighbour_scores = build_neighbours(inventory_embeddings, self.use_transformers, product_texts,
+                                                            self.similar_neighbours, previous=current)
+            
+            # Atomic swap: a single reference assignment
+            self.index = SearchIndex(inventory_data, inventory_embeddings, categories, category_embeddings, vectorizer,
+                                     fingerprint=fingerprint, texts=product_texts,
+                                     neighbours=neighbours, neighbour_scores=neighbour_scores, lexical=lexical)
+            # Item names are never rewritten as Hindi/Gujarati
+            normalizer.set_catalog(item.get('Item Name', '') for item in inventory_data)
+            log.info("Initialized %s embeddings for %d products and %d categories",
+                     'transformer' if self.use_transformers else 'TF-IDF', len(inventory_data), len(categories))
+            log.debug("Categories found: %s", categories)
+            return True
+        finally:
+            self._refresh_lock.release()
+    
+    def start_refresher(self, interval=INDEX_REFRESH_INTERVAL):
+        """Refresh the index in a background thread every `interval` seconds or on request"""
+        if self._refresher is not None or interval <= 0:
+            return
+        def run():
+            while True:
+                self._refresh_requested.wait(interval)
+                self._refresh_requested.clear()
+                try:
+                    self.refresh_inventory()
+                except Exception as e:
+                    log.exception("Background index refresh failed: %s", e)
+        self._refresher = threading.Thread(target=run, name="search-index-refresh", daemon=True)
+        self._refresher.start()
+    
+    def request_refresh(self):
+        """Ask the background refresher to reload inventory now"""
+        self._refresh_requested.set()
+    
+    def _encode_query(self, index, text):
+        """Query vector compatible with the index's embeddings"""
         if self.use_transformers:
-            self.category_embeddings = self.model.encode(self.categories)
-        else:
-            self.category_embeddings = self.vectorizer.transform(self.categories)
-        
-        print(f"DEBUG: Initialized {'transformer' if self.use_transformers else 'TF-IDF'} embeddings for {len(self.inventory_data)} products and {len(self.categories)} categories")
-        print(f"DEBUG: Categories found: {self.categories}")
+            return self.model.encode([text])
+        return index.vectorizer.transform([text])
     
+    @timed("search.search_products")
     def search_products(self, query, max_results=10, similarity_threshold=0.1):
         """Search products using semantic similarity"""
-        print(f"DEBUG: IntelligentSearch.search_products called with query: '{query}'")
+        log.debug("IntelligentSearch.search_products called with query: %r", query)
         
-        # Refresh inventory to ensure we have latest data
-        self.refresh_inventory()
+        # One snapshot for the whole query, even if a refresh swaps the index meanwhile
+        index = self.index
         
-        if not self.inventory_data or len(self.inventory_embeddings) == 0:
-            print("DEBUG: No inventory data or embeddings available")
+        if not index.inventory_data or _rows(index.inventory_embeddings) == 0:
+            log.warning("No inventory data or embeddings available")
             return []
         
         # Handle general listing queries
@@ -105,76 +390,88 @@ class IntelligentSearch:
                 requested_category = category
                 break
         
-        print(f"DEBUG: Is listing query: {is_listing_query}, Requested category: {requested_category}")
+        log.debug("Is listing query: %s, Requested category: %s", is_listing_query, requested_category)
         
         if requested_category:
             # Return top 5 items from specific category
-            result = self._get_top_items_by_category(requested_category, max_items=5)
-            print(f"DEBUG: Returning top 5 items from {requested_category}: {len(result)} items")
+            result = self._get_top_items_by_category(index, requested_category, max_items=5)
+            log.debug("Returning top 5 items from %s: %d items", requested_category, len(result))
             return result
         elif is_listing_query:
             # Return products grouped by category
-            result = self._get_products_by_category()
-            print(f"DEBUG: Returning category-organized results: {list(result.keys()) if result else 'None'}")
+            result = self._get_products_by_category(index)
+            log.debug("Returning category-organized results: %s", list(result.keys()) if result else None)
             return result
         
         # Generate embedding for the query
-        if self.use_transformers:
-            query_embedding = self.model.encode([query])
-            similarities = cosine_similarity(query_embedding, self.inventory_embeddings)[0]
+        with span("search.encode"):
+            query_embedding = self._encode_query(index, query)
+        with span("search.score"):
+            if self.use_transformers:
+                similarities = index.inventory_embeddings.scores(query_embedding[0])
+            else:
+                similarities = cosine_similarity(query_embedding, index.inventory_embeddings).flatten()
+        
+        if index.lexical is not None and SEARCH_FUSION != "off":
+            # Hybrid: exact tokens (brands, "5kg") from BM25, meaning from the dense scores
+            with span("search.lexical"):
+                lexical = index.lexical.scores(query)
+                sorted_indices = fuse_rankings(similarities, lexical)
         else:
-            query_embedding = self.vectorizer.transform([query])
-            similarities = cosine_similarity(query_embedding, self.inventory_embeddings).flatten()
-        
-        # Get indices sorted by similarity
-        sorted_indices = np.argsort(similarities)[::-1]
+            lexical = None
+            # Get indices sorted by similarity
+            sorted_indices = np.argsort(similarities)[::-1]
         
-        print(f"DEBUG: Top 5 similarity scores for '{query}': {similarities[sorted_indices[:5]]}")
+        log.debug("Top 5 similarity scores for %r: %s", query, similarities[sorted_indices[:5]])
         
         # Filter by threshold and stock
         results = []
+        debug = _sampled_rank.enabled
         for idx in sorted_indices:
-            item = self.inventory_data[idx]
+            item = index.inventory_data[idx]
             similarity_score = similarities[idx]
             
-            print(f"DEBUG: Item '{item.get('Item Name', '')}' - Similarity: {similarity_score:.3f}, Quantity: {item.get('Quantity', 0)}")
+            if debug:
+                _sampled_rank("Item %r - Similarity: %.3f, Quantity: %s",
+                              item.get('Item Name', ''), similarity_score, item.get('Quantity', 0))
             
             # Lower the threshold and include out-of-stock items for debugging
             if similarity_score < 0.1:  # Lower threshold
-                break
+                if lexical is None:
+                    break
+                if lexical[idx] <= 0:
+                    # Fused order is not monotone in similarity; a lexical match still counts
+                    continue
             
-            # Include all items for now to debug
-            item['similarity_score'] = similarity_score
-            results.append(item)
+            # Include all items for now to debug; copied because snapshots are shared between queries
+            results.append(dict(item, similarity_score=similarity_score))
             
             if len(results) >= max_results:
                 break
         
         # Filter out-of-stock items after getting results
         in_stock_results = [item for item in results if item.get('Quantity', 0) > 0]
-        print(f"DEBUG: Found {len(results)} total matches, {len(in_stock_results)} in stock")
+        log.debug("Found %d total matches, %d in stock", len(results), len(in_stock_results))
         
         return in_stock_results
     
+    @timed("search.search_by_category")
     def search_by_category(self, category_query, max_results=10):
         """Search for products by category using semantic similarity"""
-        if not self.categories or len(self.category_embeddings) == 0:
+        index = self.index
+        if not index.categories or _rows(index.category_embeddings) == 0:
             return []
         
         # Find the most similar category
-        if self.use_transformers:
-            query_embedding = self.model.encode([category_query])
-            similarities = cosine_similarity(query_embedding, self.category_embeddings)[0]
-        else:
-            query_embedding = self.vectorizer.transform([category_query])
-            similarities = cosine_similarity(query_embedding, self.category_embeddings).flatten()
+        query_embedding = self._encode_query(index, category_query)
+        similarities = cosine_similarity(query_embedding, index.category_embeddings).flatten()
         
         best_category_idx = np.argmax(similarities)
-        best_category = self.categories[best_category_idx]
+        best_category = index.categories[best_category_idx]
         
         # Get products from that category
         results = []
-        for item in self.inventory_data:
+        for item in index.inventory_data:
             if item.get('Category', '').lower() == best_category and item.get('Quantity', 0) > 0:
                 results.append(item)
                 if len(results) >= max_results:
@@ -182,26 +479,27 @@ class IntelligentSearch:
         
         return results, best_category
     
-    def _get_products_by_category(self):
+    def _get_products_by_category(self, index):
         """Get products organized by category for general listing"""
         category_products = {}
         
-        for item in self.inventory_data:
+        for item in index.inventory_data:
             if item.get('Quantity', 0) > 0:  # Only in-stock items
                 category = item.get('Category', 'Other')
                 if category not in category_products:
                     category_products[category] = []
                 category_products[category].append(item)
         
-        print(f"DEBUG: _get_products_by_category returning: {[(cat, len(items)) for cat, items in category_products.items()]}")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("_get_products_by_category returning: %s", [(cat, len(items)) for cat, items in category_products.items()])
         return category_products
     
-    def _get_top_items_by_category(self, requested_category, max_items=5):
+    def _get_top_items_by_category(self, index, requested_category, max_items=5):
         """Get top items from a specific category"""
         category_items = []
         
         # Find items matching the requested category (case-insensitive)
-        for item in self.inventory_data:
+        for item in index.inventory_data:
             if item.get('Quantity', 0) > 0:  # Only in-stock items
                 item_category = item.get('Category', '').lower()
                 if requested_category.lower() in item_category or item_category in requested_category.lower():
@@ -212,58 +510,134 @@ class IntelligentSearch:
         
         # Return top items
         top_items = category_items[:max_items]
-        print(f"DEBUG: _get_top_items_by_category for '{requested_category}': found {len(category_items)} total, returning top {len(top_items)}")
+        log.debug("_get_top_items_by_category for %r: found %d total, returning top %d",
+                  requested_category, len(category_items), len(top_items))
         
         return top_items
     
+    def _target_row(self, index, product_name):
+        """Row of a product: exact name, else the first name containing it; -1 if none"""
+        target_idx = index.positions.get(product_name.lower(), -1)
+        if target_idx == -1:
+            for i, item in enumerate(index.inventory_data):
+                if product_name.lower() in item.get('Item Name', '').lower():
+                    return i
+        return target_idx
+    
+    def _row_similarities(self, index, row):
+        """Similarity of one catalog row to every row"""
+        embeddings = index.inventory_embeddings
+        if self.use_transformers:
+            return embeddings.scores(embeddings.vector(row))
+        return cosine_similarity(embeddings[row], embeddings).flatten()
+    
+    @timed("search.find_similar_products")
     def find_similar_products(self, product_name, max_results=3):
         """Find products similar to a given product name"""
-        if not self.inventory_data:
+        index = self.index
+        if not index.inventory_data:
             return []
         
-        # Find the target product first
-        target_item = None
-        target_idx = -1
-        
-        for i, item in enumerate(self.inventory_data):
-            if product_name.lower() in item.get('Item Name', '').lower():
-                target_item = item
-                target_idx = i
-                break
-        
+        target_idx = self._target_row(index, product_name)
         if target_idx == -1:
             # If no exact match, search semantically
             return self.search_products(product_name, max_results)
         
-        # Find similar products using embeddings
-        if self.use_transformers:
-            target_embedding = self.inventory_embeddings[target_idx].reshape(1, -1)
-            similarities = cosine_similarity(target_embedding, self.inventory_embeddings)[0]
-        else:
-            target_embedding = self.inventory_embeddings[target_idx]
-            similarities = cosine_similarity(target_embedding, self.inventory_embeddings).flatten()
+        if index.neighbours is not None:
+            similar_products = []
+            for idx in index.neighbours[target_idx]:
+                item = index.inventory_data[idx]
+                if item.get('Quantity', 0) > 0:
+                    similar_products.append(item)
+                    if len(similar_products) >= max_results:
+                        break
+            return similar_products
         
-        # Get most similar products (excluding the target)
-        sorted_indices = np.argsort(similarities)[::-1][1:max_results+1]
+        # No precomputed table: score the target against the whole catalog
+        similarities = self._row_similarities(index, target_idx)
+        similarities[target_idx] = -np.inf
         
         similar_products = []
-        for idx in sorted_indices:
-            item = self.inventory_data[idx]
+        for idx in _top_rows(similarities, max_results):
+            item = index.inventory_data[idx]
             if item.get('Quantity', 0) > 0:
                 similar_products.append(item)
         
         return similar_products
     
+    @timed("search.find_related_products")
+    def find_related_products(self, product_name, max_results=10):
+        """Products most similar to a given product among the other categories, best first
+        
+        One pass over the catalog embeddings with the product's own category
+        masked out; only the best `max_results` rows are ranked.
+        """
+        index = self.index
+        target_idx = self._target_row(index, product_name) if index.inventory_data else -1
+        if target_idx == -1:
+            return []
+        
+        similarities = self._row_similarities(index, target_idx)
+        similarities[index.row_categories == index.row_categories[target_idx]] = -np.inf
+        candidates = min(max_results, int(np.isfinite(similarities).sum()))
+        return [index.inventory_data[idx] for idx in _top_rows(similarities, candidates)]
+    
+    def get_item(self, name):
+        """Inventory row with exactly this item name (case-insensitive), or None"""
+        index = self.index
+        position = index.positions.get(name.lower())
+        return index.inventory_data[position] if position is not None else None
+    
     def get_categories_summary(self):
         """Get a summary of available categories"""
         category_counts = {}
         
-        for item in self.inventory_data:
+        for item in self.index.inventory_data:
             if item.get('Quantity', 0) > 0:
                 category = item.get('Category', 'Other')
                 category_counts[category] = category_counts.get(category, 0) + 1
         
         return category_counts
 
-# Global instance
-search_engine = IntelligentSearch()
\ No newline at end of file
+# ---------------- Engine lifecycle ----------------
+# The full engine is built off the request path by warm_up(); until it is
+# ready, queries are served by a TF-IDF engine that builds in well under a second.
+search_engine = None
+search_ready = threading.Event()
+_degraded_engine = None
+_engine_lock = threading.Lock()
+
+def warm_up(backend=None, engine=None):
+    """Build (or adopt a preloaded) search engine, switch queries over to it and keep it refreshed"""
+    global search_engine
+    if engine is None:
+        engine = IntelligentSearch(backend)
+    else:
+        # Preloaded in a pre-fork master without the pool; this process's rebuilds may use its own
+        engine.use_pool = True
+    engine.start_refresher()
+    search_engine = engine
+    search_ready.set()
+    return engine
+
+def refresh_degraded_engine():
+    """Reload the degraded engine's catalog, e.g. once the worksheets are attached"""
+    # The lock waits out a degraded engine being built from the old inventory
+    with _engine_lock:
+        engine = _degraded_engine
+    if engine is not None and search_engine is None:
+        engine.refresh_inventory()
+
+def get_search_engine():
+    """Engine for a query: the full one once warm, otherwise the degraded TF-IDF one"""
+    global _degraded_engine
+    engine = search_engine
+    if engine is not None:
+        return engine
+    metrics.inc("search_degraded_queries")
+    with _engine_lock:
+        if _degraded_engine is None:
+            log.warning("Search engine still warming up; using degraded TF-IDF search")
+            # Built in-thread: the worker pool may still be loading the model
+            _degraded_engine = IntelligentSearch(backend="tfidf", use_pool=False, similar_neighbours=0)
+        return _degraded_engine
\ No newline at end of file
@@ -136,6 +136,26 @@ LANG = {
         "hi": "मैंने आपके लिए ये उत्पाद पाए हैं। आप अपने कार्ट में क्या जोड़ना चाहेंगे?",
          "gu": "में तमारा माटे आ उत्पादो शोध्या छे. तमे तमारा कार्टमा शुं उमेरवा मागो छो?"
     },
+    "reorder_added": {
+        "en": "Added your usual order: {items}. Cart total: ${total:.2f}",
+        "hi": "आपका हमेशा वाला ऑर्डर जोड़ दिया: {items}। कार्ट कुल: ${total:.2f}",
+        "gu": "तमारो हंमेशनो ऑर्डर उमेरी दीधो: {items}. कार्ट कुल: ${total:.2f}"
+    },
+    "reorder_unavailable": {
+        "en": " Not available right now: {items}.",
+        "hi": " अभी उपलब्ध नहीं: {items}।",
+        "gu": " हमणां उपलब्ध नथी: {items}."
+    },
+    "no_usual_order": {
+        "en": "I couldn't find a previous order for your number. What would you like to buy?",
+        "hi": "आपके नंबर पर कोई पिछला ऑर्डर नहीं मिला। आप क्या खरीदना चाहेंगे?",
+        "gu": "तमारा नंबर पर कोई पाछलो ऑर्डर मळ्यो नथी. तमे शुं खरीदवा मागो छो?"
+    },
+    "please_hold": {
+        "en": "We have many callers right now. Please hold on and tell me again in a moment.",
+        "hi": "अभी बहुत सारे कॉल आ रहे हैं। कृपया थोड़ा रुकिए और एक पल में फिर से बताइए।",
+        "gu": "हमणां घणा कॉल आवी रह्या छे. कृपया थोडी राह जुओ अने एक पळमां फरीथी कहो."
+    },
     "unclear_request": {
         "en": "I didn't understand that clearly. Could you please repeat?",
         "hi": "मैं इसे स्पष्ट रूप से नहीं समझ पाया। क्या आप कृपया दोहरा सकते हैं?",
@@ -0,0 +1,136 @@
+"""BM25 inverted index over the catalog for the lexical half of hybrid search.
+
+Dense embeddings match meaning but blur exact tokens; brand names and pack
+sizes ("4 lb", "5kg") are what BM25 is good at. Sizes are folded into one
+token ("5 kg", "5kg" and "5 KG" all become ``5kg``) so they match however
+the caller or the catalog writes them.
+
+Like SearchIndex, an index is immutable once built; a refresh builds a new
+one from the previous index, tokenizing only the products whose text changed.
+"""
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+# Standard BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Past this share of changed products a refresh rebuilds the index from scratch
+INCREMENTAL_MAX_CHANGED = 0.25
+
+_UNITS = {"kg": "kg", "kgs": "kg", "g": "g", "gm": "g", "gms": "g", "gram": "g", "grams": "g",
+          "lb": "lb", "lbs": "lb", "pound": "lb", "pounds": "lb", "oz": "oz", "ml": "ml",
+          "l": "l", "ltr": "l", "litre": "l", "liter": "l", "pack": "pack", "packs": "pack",
+          "pc": "pc", "pcs": "pc", "pieces": "pc"}
+_SIZE = re.compile(r"\b(\d+(?:\.\d+)?)\s*(" + "|".join(sorted(_UNITS, key=len, reverse=True)) + r")\b")
+_TOKEN = re.compile(r"\w+")
+_STOP_WORDS = frozenset("a an and the of for in on with to is are do you have i want need some me my please".split())
+
+
+def tokenize(text):
+    """Lowercased word tokens with sizes folded into single tokens"""
+    text = _SIZE.sub(lambda m: f" {m.group(1)}{_UNITS[m.group(2)]} ", text.lower())
+    return [token for token in _TOKEN.findall(text) if token not in _STOP_WORDS]
+
+
+class BM25Index:
+    """Term -> (document rows, term frequencies) postings plus document lengths"""
+    __slots__ = ("postings", "doc_lengths", "texts", "_length_norms")
+
+    def __init__(self, postings, doc_lengths, texts):
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.texts = texts
+        avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        # Document-length part of the BM25 denominator, fixed per index
+        self._length_norms = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(avg_length, 1e-9))
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, texts, previous=None):
+        """Index `texts`, updating `previous` in place of a full rebuild when few products changed"""
+        texts = list(texts)
+        if previous is not None and len(set(texts)) == len(texts) and len(set(previous.texts)) == len(previous.texts):
+            old_rows = {text: row for row, text in enumerate(previous.texts)}
+            new_to_old = np.fromiter((old_rows.get(text, -1) for text in texts), dtype=np.int64, count=len(texts))
+            changed = np.flatnonzero(new_to_old < 0)
+            if len(changed) <= INCREMENTAL_MAX_CHANGED * len(texts):
+                return cls._update(previous, texts, new_to_old, changed)
+
+        grouped = {}
+        doc_lengths = np.empty(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths[row] = sum(counts.values())
+            for term, tf in counts.items():
+                rows, tfs = grouped.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(tf)
+        postings = {term: (np.asarray(rows, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+                    for term, (rows, tfs) in grouped.items()}
+        return cls(postings, doc_lengths, texts)
+
+    @classmethod
+    def _update(cls, previous, texts, new_to_old, changed):
+        """New index from `previous`: drop removed rows, renumber kept ones, add changed ones"""
+        unchanged = np.flatnonzero(new_to_old >= 0)
+        old_to_new = np.full(len(previous), -1, dtype=np.int64)
+        old_to_new[new_to_old[unchanged]] = unchanged
+        removed = np.flatnonzero(old_to_new < 0)
+
+        added = {}
+        doc_lengths = np.empty(len(texts), dtype=np.float32)
+        doc_lengths[unchanged] = previous.doc_lengths[new_to_old[unchanged]]
+        for row in changed:
+            counts = Counter(tokenize(texts[row]))
+            doc_lengths[row] = sum(counts.values())
+            for term, tf in counts.items():
+                rows, tfs = added.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(tf)
+
+        # Products edited in place or appended leave every other row where it was:
+        # only the postings of terms in removed or added documents need work
+        kept = np.flatnonzero(old_to_new >= 0)
+        if np.array_equal(old_to_new[kept], kept):
+            postings = dict(previous.postings)
+            affected = set(added)
+            for row in removed:
+                affected.update(tokenize(previous.texts[row]))
+        else:
+            postings = {}
+            affected = previous.postings.keys() | added.keys()
+
+        for term in affected:
+            rows, tfs = previous.postings.get(term, (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)))
+            mapped = old_to_new[rows]
+            keep = mapped >= 0
+            rows, tfs = mapped[keep].astype(np.int32), tfs[keep]
+            if term in added:
+                new_rows, new_tfs = added[term]
+                rows = np.concatenate([rows, np.asarray(new_rows, dtype=np.int32)])
+                tfs = np.concatenate([tfs, np.asarray(new_tfs, dtype=np.float32)])
+            if len(rows):
+                postings[term] = (rows, tfs)
+            else:
+                postings.pop(term, None)
+        return cls(postings, doc_lengths, texts)
+
+    def scores(self, query):
+        """BM25 score of every document for a query string (zeros when nothing matches)"""
+        n = len(self.doc_lengths)
+        out = np.zeros(n, dtype=np.float32)
+        if not n:
+            return out
+        for term, query_tf in Counter(tokenize(query)).items():
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows, tfs = posting
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            out[rows] += query_tf * idf * tfs * (BM25_K1 + 1) / (tfs + self._length_norms[rows])
+        return out
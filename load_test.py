@@ -0,0 +1,231 @@
+"""Concurrent-call load test for the Twilio webhook flow.
+
+Each simulated call follows what Twilio does: POST /twiml, then for every
+utterance POST /handle-speech and follow the <Redirect> to /check-status
+(sleeping for each <Pause>) until a <Gather> or <Hangup> comes back.
+
+By default the app runs in-process with FAKE_BACKENDS=1, so Gemini and
+Google Sheets are simulated with configurable latency (see fake_backends.py):
+
+    python load_test.py --concurrency 1,10,50,100 --calls 200
+    python load_test.py --url http://localhost:8080 --concurrency 20
+
+Reports per-turn latency percentiles, throughput, peak thread count and
+resident memory at each concurrency level.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+
+# Scripted conversations; one is picked per simulated call
+SCRIPTS = [
+    ["do you have basmati rice", "add two basmati rice", "what is in my cart", "thank you bye"],
+    ["add one toor dal and add two milk bikis", "remove milk bikis", "show me my cart", "bye"],
+    ["looking for turmeric", "add one turmeric powder", "place order name ravi phone 5551234 address 12 main street", "thanks bye"],
+    ["mujhe garam masala chahiye", "add three garam masala", "cart", "bye"],
+]
+
+REDIRECT_RE = re.compile(r"<Redirect>[^<]*?(/check-status/[^<]+)</Redirect>")
+PAUSE_RE = re.compile(r'<Pause length="(\d+)"/>')
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+def rss_mb():
+    """Resident set size of this process in MB (Linux), or None"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Sampler:
+    """Background sampler of peak thread count and RSS while a level runs"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self.peak_rss_mb = max(self.peak_rss_mb, rss_mb() or 0.0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+async def run_call(client, index, args, turn_latencies, errors):
+    """Drive one simulated call through every turn of a script"""
+    call_sid = f"CA{index:08d}{random.getrandbits(40):010x}"
+    caller = f"+1555{index % 10_000_000:07d}"
+    script = SCRIPTS[index % len(SCRIPTS)]
+    form = {"CallSid": call_sid, "From": caller}
+
+    response = await client.post("/twiml", data=form)
+    if response.status_code != 200:
+        errors.append(f"/twiml {response.status_code}")
+        return
+
+    for utterance in script:
+        start = time.perf_counter()
+        response = await client.post("/handle-speech", data={**form, "SpeechResult": utterance})
+        polls = 0
+        while True:
+            body = response.text
+            if response.status_code != 200:
+                errors.append(f"{call_sid} HTTP {response.status_code}")
+                return
+            redirect = REDIRECT_RE.search(body)
+            if not redirect:
+                break
+            polls += 1
+            if polls > args.max_polls:
+                errors.append(f"{call_sid} gave up after {polls} polls")
+                return
+            pause = sum(int(n) for n in PAUSE_RE.findall(body))
+            await asyncio.sleep(pause * args.pause_scale)
+            response = await client.post(redirect.group(1), data=form)
+
+        turn_latencies.append(time.perf_counter() - start)
+        if "<Gather" not in body:
+            # Hangup: the assistant ended the call
+            break
+
+
+async def run_level(client, concurrency, args):
+    """Run args.calls calls with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    turn_latencies, errors = [], []
+
+    async def limited(index):
+        async with semaphore:
+            try:
+                await run_call(client, index, args, turn_latencies, errors)
+            except Exception as e:
+                errors.append(f"call {index}: {type(e).__name__}: {e}")
+
+    calls = max(args.calls, concurrency)
+    with Sampler() as sampler:
+        start = time.perf_counter()
+        await asyncio.gather(*(limited(i) for i in range(calls)))
+        elapsed = time.perf_counter() - start
+
+    ms = [latency * 1000 for latency in turn_latencies]
+    return {
+        "concurrency": concurrency,
+        "calls": calls,
+        "turns": len(ms),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "elapsed_s": round(elapsed, 2),
+        "turns_per_s": round(len(ms) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(ms, 0.50), 1),
+        "p95_ms": round(percentile(ms, 0.95), 1),
+        "p99_ms": round(percentile(ms, 0.99), 1),
+        "mean_ms": round(statistics.fmean(ms), 1) if ms else 0.0,
+        "peak_threads": sampler.peak_threads,
+        "peak_rss_mb": round(sampler.peak_rss_mb, 1),
+    }
+
+
+def load_app():
+    """Import the app in-process with fake backends configured"""
+    os.environ.setdefault("FAKE_BACKENDS", "1")
+    os.environ.setdefault("NGROK_URL", "loadtest.local")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import main
+    return main.app
+
+
+async def wait_until_ready(client, timeout=300.0):
+    """Poll /ready so warm-up time is not counted as turn latency"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        response = await client.get("/ready")
+        if response.status_code == 200:
+            return True
+        await asyncio.sleep(0.25)
+    return False
+
+
+async def run(args):
+    import httpx
+    results = []
+    app = None if args.url else load_app()
+    async with contextlib.AsyncExitStack() as stack:
+        if app is None:
+            client = await stack.enter_async_context(httpx.AsyncClient(base_url=args.url, timeout=60.0))
+        else:
+            # ASGITransport does not send lifespan events, so run the app's lifespan here
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = await stack.enter_async_context(httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60.0))
+        if not await wait_until_ready(client):
+            print("App did not become ready; measuring degraded mode", file=sys.stderr)
+
+        for concurrency in args.concurrency:
+            result = await run_level(client, concurrency, args)
+            results.append(result)
+            print(f"concurrency={result['concurrency']:>4}  turns={result['turns']:>5}  "
+                  f"errors={result['errors']:>3}  {result['turns_per_s']:>7.2f} turns/s  "
+                  f"p50={result['p50_ms']:>8.1f}ms  p95={result['p95_ms']:>8.1f}ms  p99={result['p99_ms']:>8.1f}ms  "
+                  f"threads={result['peak_threads']:>4}  rss={result['peak_rss_mb']:>7.1f}MB", flush=True)
+            for sample in result["error_samples"]:
+                print(f"    {sample}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--concurrency", default="1,10,50",
+                        help="comma-separated concurrent-call levels to ramp through")
+    parser.add_argument("--calls", type=int, default=50, help="calls per level (at least the concurrency)")
+    parser.add_argument("--url", help="base URL of a running server instead of the in-process app")
+    parser.add_argument("--pause-scale", type=float, default=0.25,
+                        help="fraction of each TwiML <Pause> to actually wait (1.0 = like Twilio)")
+    parser.add_argument("--max-polls", type=int, default=200, help="status polls per turn before giving up")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="also write results as JSON")
+    args = parser.parse_args()
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    random.seed(args.seed)
+
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "json"}, "results": results}, f, indent=2)
+    sys.exit(1 if any(result["errors"] for result in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Rule-based intent matching for turns answered without Gemini.
+
+When admission control sheds a turn, the common simple requests (search,
+add an item, read back the cart, reorder the usual) are still served by
+matching the utterance against a few English, Hinglish and Gujarati
+patterns and running the same tool handlers Gemini would have called.
+Anything not matched here gets a "please hold" reply instead.
+"""
+import re
+
+_QUANTITIES = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+               "ek": 1, "do": 2, "teen": 3, "char": 4, "paanch": 5, "be": 2, "tran": 3}
+_QUANTITY = r"(\d+|" + "|".join(_QUANTITIES) + r")"
+
+_REORDER = re.compile(r"\busual\b|same as (?:last time|before)|repeat (?:my|the) (?:last )?order|\breorder\b"
+                      r"|hamesha wala|pichla order|pehle jaisa|pahela jevu")
+_CART = re.compile(r"\b(?:cart|card|kart|tokri)\b")
+_ADD = (
+    re.compile(r"\badd " + _QUANTITY + r" (.+)$"),
+    re.compile(r"^" + _QUANTITY + r" (?:kilo |kg |packet )?(.+?) (?:add|daal|dal|jod|umer)\w*(?: (?:karo|kar do|do|dijiye|do na))?$"),
+)
+_SEARCH = (
+    re.compile(r"(?:do you have|looking for|show me|search for|i want|i need)\s+(.+)$"),
+    re.compile(r"^(?:mujhe |mane |amne )?(.+?)\s+(?:chahiye|chaiye|joie|joiye|hai kya|che)\b"),
+)
+# Order placement needs name, phone and address: left to Gemini
+_ORDER = re.compile(r"\border\b|checkout")
+
+
+def _quantity(word):
+    return int(word) if word.isdigit() else _QUANTITIES.get(word, 1)
+
+
+def match_intent(utterance):
+    """[(tool name, args)] for a simple request, or None if it needs Gemini"""
+    lowered = re.sub(r"[.,!?;:\"'।]", " ", utterance.lower())
+    lowered = " ".join(lowered.split())
+    if not lowered:
+        return None
+    if _REORDER.search(lowered):
+        return [("reorder_usual", {})]
+    for pattern in _ADD:
+        match = pattern.search(lowered)
+        if match:
+            return [("add_to_cart", {"product_name": match.group(2), "quantity": _quantity(match.group(1))})]
+    if _CART.search(lowered):
+        return [("get_cart_summary", {})]
+    if _ORDER.search(lowered):
+        return None
+    for pattern in _SEARCH:
+        match = pattern.search(lowered)
+        if match:
+            return [("search_products", {"query": match.group(1)})]
+    return None
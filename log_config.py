@@ -0,0 +1,107 @@
+"""Leveled, structured logging for the voice assistant.
+
+Use ``log = get_logger(__name__)`` and lazy %-style arguments
+(``log.debug("matched %s", name)``) so disabled levels never format anything.
+Levels are set per module from the environment:
+
+    LOG_LEVEL=INFO                                   # default for every module
+    LOG_LEVELS=cart_manager=DEBUG,intelligent_search=WARNING
+    LOG_FORMAT=text|json
+    LOG_SAMPLE_EVERY=100                             # hot-path debug sampling rate
+"""
+import itertools
+import json
+import logging
+import os
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_SAMPLE_EVERY = max(1, int(os.getenv("LOG_SAMPLE_EVERY", "100")))
+
+# Standard LogRecord attributes; anything else passed via `extra` is a structured field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+    """``time level logger message key=value ...``"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        doc = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        doc.update(_fields(record))
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str, ensure_ascii=False)
+
+
+def configure_logging():
+    """Install the root handler and per-module levels (idempotent)"""
+    root = logging.getLogger()
+    if getattr(root, "_grocerybabu_configured", False):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    for entry in LOG_LEVELS.split(","):
+        if "=" in entry:
+            name, level = entry.split("=", 1)
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+    root._grocerybabu_configured = True
+
+
+def get_logger(name):
+    """Module logger; configures logging on first use"""
+    configure_logging()
+    return logging.getLogger(name)
+
+
+class SampledDebug:
+    """Debug logging for hot loops: emits one record in every `every` calls
+
+    Callers should check ``enabled`` once outside the loop so a disabled
+    logger costs a single attribute read per iteration:
+
+        sampled = SampledDebug(log)
+        debug = sampled.enabled
+        for row in rows:
+            if debug:
+                sampled("compared %s", row)
+    """
+
+    def __init__(self, logger, every=LOG_SAMPLE_EVERY):
+        self.logger = logger
+        self.every = every
+        self._counter = itertools.count()
+
+    @property
+    def enabled(self):
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    def __call__(self, msg, *args):
+        if next(self._counter) % self.every == 0:
+            self.logger.debug(msg, *args, extra={"sample_rate": self.every}, stacklevel=2)
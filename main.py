@@ -5,7 +5,8 @@ import gspread
 import uvicorn
 import google.generativeai as genai
 from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import Response
+from fastapi.responses import Response, PlainTextResponse, JSONResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from google.oauth2.service_account import Credentials
 from datetime import datetime
@@ -17,10 +18,25 @@ import asyncio
 from typing import Dict
 
 # Import modules
+import intelligent_search
 from functions import function_declarations
-from sheets_handler import get_inventory, get_customer_by_phone, save_customer, save_cart, load_cart, delete_cart
-from cart_manager import shopping_carts, customer_info, conversation_history, add_to_cart, get_cart_summary, place_order, add_to_conversation_history, get_conversation_context, remove_from_cart
+from tool_dispatcher import ToolDispatcher
+from sheets_handler import get_customer_by_phone, save_customer, save_cart, load_cart, delete_cart
+from cart_manager import shopping_carts, customer_info, conversation_history, add_to_cart, add_items_to_cart, get_cart_summary, place_order, add_to_conversation_history, remove_from_cart
+from order_history import order_index
 from product_search import search_products, find_similar_products, find_complementary_products, get_categories_summary
+from session_registry import registry, get_session_language, set_session_language, DEFAULT_LANGUAGE
+from caller_prefetch import start_caller_prefetch, wait_for_prefetch
+from query_normalizer import normalizer, normalize_query
+from admission import llm_admission, Overloaded
+import gemini_client
+from gemini_client import GeminiTimeout
+from local_intent import match_intent
+from metrics import metrics, span, current_call_sid
+from log_config import get_logger
+import prefork
+from state_store import state_store, hydrate_call, checkpoint_call, claim_turn, release_turn, publish_result, fetch_result, clear_result, release_call
+from prompt_builder import ASR_HINTS, build_turn_prompt, commit_prompt_state, log_prompt_tokens, history_over_budget, build_state_summary, seed_history
 
 # Import filler sentences and language utilities
 from filler_sentences import get_processing_phrase, get_completion_phrase
@@ -29,19 +45,26 @@ from language import LANG
 # ---------------- Load environment variables ----------------
 load_dotenv()
 
+# Named explicitly so LOG_LEVELS=main=DEBUG works when run as a script too
+log = get_logger("main")
+
 PORT = int(os.getenv("PORT", "8080"))
+# "uvicorn" (each worker loads everything itself) or "prefork" (load once, fork workers; see prefork.py)
+SERVER_MODE = os.getenv("SERVER_MODE", "uvicorn").lower()
 DOMAIN = os.getenv("NGROK_URL")
 if not DOMAIN:
     raise ValueError("NGROK_URL environment variable not set.")
 
 # ---------------- Processing Feedback System ----------------
-# Thread-safe queues for processing feedback
-processing_queues: Dict[str, queue.Queue] = {}
-processing_threads: Dict[str, threading.Thread] = {}
-processing_results: Dict[str, Dict] = {}
+# Thread-safe queues for processing feedback (views over the session registry)
+processing_queues: Dict[str, queue.Queue] = registry.field("processing_queue")
+processing_threads: Dict[str, threading.Thread] = registry.field("processing_thread")
+processing_results: Dict[str, Dict] = registry.field("processing_result")
 
 def processing_worker(call_sid: str, user_input: str):
     """Background worker to process user request and provide feedback"""
+    # Attribute every span recorded on this thread to the call
+    current_call_sid.set(call_sid)
     try:
         # Get the queue for this call
         if call_sid not in processing_queues:
@@ -49,8 +72,8 @@ def processing_worker(call_sid: str, user_input: str):
         
         q = processing_queues[call_sid]
         
-        # Use session language from previous interactions, fallback to global language
-        session_lang = get_session_language(call_sid) if call_sid in session_languages else current_language
+        # Use session language from previous interactions (never another caller's)
+        session_lang = get_session_language(call_sid)
         
         # Send processing message in appropriate language
         processing_phrase = get_processing_phrase(session_lang)
@@ -64,124 +87,152 @@ def processing_worker(call_sid: str, user_input: str):
         asyncio.set_event_loop(loop)
         
         try:
-            detected_language, clean_response = loop.run_until_complete(
-                process_user_query(user_input, call_sid)
-            )
+            with span("process_user_query"):
+                detected_language, clean_response = loop.run_until_complete(
+                    process_user_query(user_input, call_sid)
+                )
             
             # Send completion message in detected language
             completion_phrase = get_completion_phrase(detected_language)
             q.put({"type": "completion", "message": f"{completion_phrase} {clean_response}"})
             
-            # Store the final result
-            processing_results[call_sid] = {
+            # Persist call state for other workers, then publish the final result
+            checkpoint_call(call_sid)
+            publish_result(call_sid, {
                 "language": detected_language,
                 "response": clean_response,
                 "ready": True
-            }
+            })
             
         finally:
             loop.close()
             
     except Exception as e:
-        print(f"Error in processing worker for {call_sid}: {e}")
+        log.exception("Error in processing worker for %s: %s", call_sid, e)
+        release_turn(call_sid)
         if call_sid in processing_queues:
-            error_msg = get_localized_text("processing_error", current_language) or "Sorry, I encountered an error processing your request."
+            error_msg = get_localized_text("processing_error", get_session_language(call_sid)) or "Sorry, I encountered an error processing your request."
             processing_queues[call_sid].put({"type": "error", "message": error_msg})
 
 # ---------------- Google Sheets Setup ----------------
-print("DEBUG: Setting up Google Sheets connection...")
-
-GOOGLE_SHEETS_CREDENTIALS = os.path.join(os.path.dirname(__file__), "service_account.json")
-print(f"DEBUG: Looking for credentials at: {GOOGLE_SHEETS_CREDENTIALS}")
-
-if not os.path.exists(GOOGLE_SHEETS_CREDENTIALS):
-    print("ERROR: service_account.json file not found next to main.py")
-    print("DEBUG: Please ensure you have the service_account.json file in the same directory as main.py")
-    raise ValueError("service_account.json file not found next to main.py")
-
-# Parse the credentials JSON
-try:
-    with open(GOOGLE_SHEETS_CREDENTIALS, "r") as f:
-        credentials_info = json.load(f)
-    print("DEBUG: Successfully loaded credentials JSON")
-except Exception as e:
-    print(f"ERROR: Failed to parse credentials JSON: {e}")
-    raise
-
-scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-creds = Credentials.from_service_account_info(credentials_info, scopes=scope)
-client = gspread.authorize(creds)
-print("DEBUG: Successfully authorized gspread client")
-
-# Open the Google Sheet
-SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
-print(f"DEBUG: SPREADSHEET_ID from environment: {SPREADSHEET_ID}")
-
-if not SPREADSHEET_ID:
-    print("ERROR: SPREADSHEET_ID environment variable not set")
-    print("DEBUG: Please set SPREADSHEET_ID in your .env file")
-    raise ValueError("SPREADSHEET_ID environment variable not set.")
-
-# Initialize all worksheets
-try:
-    print("DEBUG: Attempting to connect to Google Sheets...")
-    sheet = client.open_by_key(SPREADSHEET_ID)
-    print(f"DEBUG: Successfully opened spreadsheet: {sheet.title}")
-    
-    # Import the sheet variables from sheets_handler
+FAKE_BACKENDS = os.getenv("FAKE_BACKENDS") == "1"
+# Seconds before a Google Sheets HTTP request is abandoned
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", "10"))
+
+def connect_google_sheets(recover_writes=True):
+    """Authorize gspread and attach every worksheet to sheets_handler (run at startup).
+
+    Returns False if Google Sheets could not be opened and the worksheets are
+    not attached. recover_writes=False leaves writes queued by exited workers
+    for the serving processes to replay (see preload_for_fork).
+    """
     import sheets_handler
     
-    # Get or create all required worksheets
-    try:
-        sheets_handler.inventory_sheet = sheet.worksheet("Inventory")
-        print("DEBUG: Found existing Inventory worksheet")
-    except Exception as e:
-        print(f"DEBUG: Creating new Inventory worksheet: {e}")
-        sheets_handler.inventory_sheet = sheet.add_worksheet(title="Inventory", rows=100, cols=10)
-        sheets_handler.inventory_sheet.append_row(["Item Name", "Category", "Quantity", "Price (USD)", "Description", "Tags"])
+    if FAKE_BACKENDS:
+        import fake_backends
+        fake_backends.install_fake_sheets(sheets_handler)
+        sheets_handler.guard_worksheets(recover=recover_writes)
+        log.warning("FAKE_BACKENDS=1: using in-memory worksheets")
+        return True
     
+    log.debug("Setting up Google Sheets connection...")
+
+    GOOGLE_SHEETS_CREDENTIALS = os.path.join(os.path.dirname(__file__), "service_account.json")
+    log.debug("Looking for credentials at: %s", GOOGLE_SHEETS_CREDENTIALS)
+
+    if not os.path.exists(GOOGLE_SHEETS_CREDENTIALS):
+        log.error("service_account.json file not found next to main.py")
+        log.error("Please ensure you have the service_account.json file in the same directory as main.py")
+        raise ValueError("service_account.json file not found next to main.py")
+
+    # Parse the credentials JSON
     try:
-        sheets_handler.customers_sheet = sheet.worksheet("Customers")
-        print("DEBUG: Found existing Customers worksheet")
+        with open(GOOGLE_SHEETS_CREDENTIALS, "r") as f:
+            credentials_info = json.load(f)
+        log.debug("Successfully loaded credentials JSON")
     except Exception as e:
-        print(f"DEBUG: Creating new Customers worksheet: {e}")
-        sheets_handler.customers_sheet = sheet.add_worksheet(title="Customers", rows=100, cols=10)
-        sheets_handler.customers_sheet.append_row(["Phone Number", "Name", "Address", "City", "State", "Zip", "Last Order Date"])
-    
+        log.error("Failed to parse credentials JSON: %s", e)
+        raise
+
+    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+    creds = Credentials.from_service_account_info(credentials_info, scopes=scope)
+    client = gspread.authorize(creds)
+    # Fail a hung request well before Twilio gives up on the webhook
+    client.set_timeout(SHEETS_TIMEOUT)
+    log.debug("Successfully authorized gspread client")
+
+    # Open the Google Sheet
+    SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
+    log.debug("SPREADSHEET_ID from environment: %s", SPREADSHEET_ID)
+
+    if not SPREADSHEET_ID:
+        log.error("SPREADSHEET_ID environment variable not set")
+        log.error("Please set SPREADSHEET_ID in your .env file")
+        raise ValueError("SPREADSHEET_ID environment variable not set.")
+
+    # Initialize all worksheets
     try:
-        sheets_handler.orders_sheet = sheet.worksheet("Orders")
-        print("DEBUG: Found existing Orders worksheet")
-    except Exception as e:
-        print(f"DEBUG: Creating new Orders worksheet: {e}")
-        sheets_handler.orders_sheet = sheet.add_worksheet(title="Orders", rows=100, cols=10)
-        sheets_handler.orders_sheet.append_row(["Order ID", "Customer Phone", "Items JSON", "Total", "Status", "Date"])
+        log.debug("Attempting to connect to Google Sheets...")
+        sheet = client.open_by_key(SPREADSHEET_ID)
+        log.debug("Successfully opened spreadsheet: %s", sheet.title)
     
-    try:
-        sheets_handler.carts_sheet = sheet.worksheet("Carts")
-        print("DEBUG: Found existing Carts worksheet")
-    except Exception as e:
-        print(f"DEBUG: Creating new Carts worksheet: {e}")
-        sheets_handler.carts_sheet = sheet.add_worksheet(title="Carts", rows=100, cols=10)
-        sheets_handler.carts_sheet.append_row(["Session ID", "Customer Phone", "Items JSON", "Last Updated"])
+        # Import the sheet variables from sheets_handler
+        import sheets_handler
     
-    print("DEBUG: All worksheets initialized successfully")
-        
-except Exception as e:
-    print(f"ERROR: Failed to access Google Sheets: {e}")
-    print("DEBUG: This could be due to:")
-    print("  1. Missing or invalid service_account.json file")
-    print("  2. Wrong SPREADSHEET_ID in environment variables")
-    print("  3. Insufficient permissions for the service account")
-    print("  4. Network connectivity issues")
+        # Get or create all required worksheets
+        try:
+            sheets_handler.inventory_sheet = sheet.worksheet("Inventory")
+            log.debug("Found existing Inventory worksheet")
+        except Exception as e:
+            log.debug("Creating new Inventory worksheet: %s", e)
+            sheets_handler.inventory_sheet = sheet.add_worksheet(title="Inventory", rows=100, cols=10)
+            sheets_handler.inventory_sheet.append_row(["Item Name", "Category", "Quantity", "Price (USD)", "Description", "Tags"])
     
-    # Initialize sheets_handler with None values to prevent errors
-    import sheets_handler
-    sheets_handler.inventory_sheet = None
-    sheets_handler.customers_sheet = None
-    sheets_handler.orders_sheet = None
-    sheets_handler.carts_sheet = None
+        try:
+            sheets_handler.customers_sheet = sheet.worksheet("Customers")
+            log.debug("Found existing Customers worksheet")
+        except Exception as e:
+            log.debug("Creating new Customers worksheet: %s", e)
+            sheets_handler.customers_sheet = sheet.add_worksheet(title="Customers", rows=100, cols=10)
+            sheets_handler.customers_sheet.append_row(["Phone Number", "Name", "Address", "City", "State", "Zip", "Last Order Date"])
+    
+        try:
+            sheets_handler.orders_sheet = sheet.worksheet("Orders")
+            log.debug("Found existing Orders worksheet")
+        except Exception as e:
+            log.debug("Creating new Orders worksheet: %s", e)
+            sheets_handler.orders_sheet = sheet.add_worksheet(title="Orders", rows=100, cols=10)
+            sheets_handler.orders_sheet.append_row(["Order ID", "Customer Phone", "Items JSON", "Total", "Status", "Date"])
     
-    print("DEBUG: Will use fallback data only")
+        try:
+            sheets_handler.carts_sheet = sheet.worksheet("Carts")
+            log.debug("Found existing Carts worksheet")
+        except Exception as e:
+            log.debug("Creating new Carts worksheet: %s", e)
+            sheets_handler.carts_sheet = sheet.add_worksheet(title="Carts", rows=100, cols=10)
+            sheets_handler.carts_sheet.append_row(["Session ID", "Customer Phone", "Items JSON", "Last Updated"])
+    
+        log.debug("All worksheets initialized successfully")
+        
+    except Exception as e:
+        log.error("Failed to access Google Sheets: %s. This could be due to: "
+                  "1. Missing or invalid service_account.json file, "
+                  "2. Wrong SPREADSHEET_ID in environment variables, "
+                  "3. Insufficient permissions for the service account, "
+                  "4. Network connectivity issues", e)
+    
+        # Initialize sheets_handler with None values to prevent errors
+        import sheets_handler
+        sheets_handler.inventory_sheet = None
+        sheets_handler.customers_sheet = None
+        sheets_handler.orders_sheet = None
+        sheets_handler.carts_sheet = None
+    
+        log.warning("Will use the inventory snapshot only")
+
+    # Every worksheet request goes through the Sheets circuit breaker
+    sheets_handler.guard_worksheets(recover=recover_writes)
+    return sheets_handler.worksheets_attached()
 
 # ---------------- Greeting ----------------
 WELCOME_GREETING = "नमस्ते! Welcome to GroceryBabu! I'm Aditi, your personal shopping assistant. You can ask me about products, add items to your cart, or place an order."
@@ -196,19 +247,22 @@ LANGUAGE_MAP = {
 
 # ---------------- Gemini API ----------------
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
+if FAKE_BACKENDS:
+    # Rule-based stand-in with injected latency (see fake_backends.py)
+    import fake_backends
+    genai = fake_backends.fake_genai
+    log.warning("FAKE_BACKENDS=1: using simulated Gemini responses")
+elif not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY environment variable not set.")
 
 genai.configure(api_key=GOOGLE_API_KEY)
 
-# Store active chat sessions and context
-sessions = {}
-conversation_context = {}
-call_retry_counts = {}
+# Store active chat sessions and context (views over the session registry)
+sessions = registry.field("chat")
+conversation_context = registry.field("context")
+call_retry_counts = registry.field("retry_count")
 
-# Global language management
-current_language = "en"  # Default language
-session_languages = {}  # Track language per session
+# Language is tracked strictly per session (see session_registry.get_session_language)
 
 # Warm-up session for faster first requests
 warmup_session = None
@@ -217,7 +271,7 @@ def initialize_warmup_session():
     """Initialize a warm-up Gemini session to reduce first request latency"""
     global warmup_session
     try:
-        print("DEBUG: Initializing Gemini warm-up session...")
+        log.debug("Initializing Gemini warm-up session...")
         model = genai.GenerativeModel(
             model_name='gemini-1.5-flash',
             tools=function_declarations
@@ -231,45 +285,18 @@ def initialize_warmup_session():
         # Send a simple test message to fully initialize
         test_response = warmup_session.send_message("Hello, test message for initialization")
         
-        print("DEBUG: Gemini warm-up session initialized successfully")
+        log.debug("Gemini warm-up session initialized successfully")
         return True
         
     except Exception as e:
-        print(f"DEBUG: Warm-up session initialization failed: {e}")
+        log.warning("Warm-up session initialization failed: %s", e)
         warmup_session = None
         return False
 
-def set_global_language(lang_code):
-    """Set global language with fallback to English"""
-    global current_language
-    print("DEBUG: Setting global language to", lang_code)
-    if lang_code in ["en", "hi", "gu"]:
-        current_language = lang_code
-    else:
-        current_language = "en"
-    return current_language
-
-def get_session_language(call_sid):
-    """Get language for specific session with fallback"""
-    print("DEBUG: Getting session language for", call_sid)
-    print("DEBUG: Session languages:", session_languages)
-    return session_languages.get(call_sid, current_language)
-
-def set_session_language(call_sid, lang_code):
-    """Set language for specific session"""
-    print("DEBUG: Setting session language for", call_sid, "to", lang_code)
-    if lang_code in ["en", "hi", "gu"]:
-        print("DEBUG: Setting session language to", lang_code)
-        session_languages[call_sid] = lang_code
-    else:
-        print("DEBUG: Setting session language to default", current_language)
-        session_languages[call_sid] = current_language
-    return session_languages[call_sid]
-
 def get_localized_text(key, lang_code=None, **kwargs):
     """Get localized text with fallback to English"""
     if lang_code is None:
-        lang_code = current_language
+        lang_code = DEFAULT_LANGUAGE
     
     if key in LANG and lang_code in LANG[key]:
         text = LANG[key][lang_code]
@@ -285,7 +312,7 @@ def get_localized_text(key, lang_code=None, **kwargs):
         return text
 
 # Enhanced system prompt with better speech recognition error handling
-SYSTEM_PROMPT = """You are Aditi, a helpful grocery assistant at GroceryBabu.
+SYSTEM_PROMPT = f"""You are Aditi, a helpful grocery assistant at GroceryBabu.
 
 LANGUAGE: Detect user's language from input and respond in same language using format:
 <language>[hi/gu/en]</language><response>[response]</response>
@@ -300,6 +327,8 @@ SPEECH RECOGNITION ERROR HANDLING:
 - "place order" → "place order", "order place" → "place order"
 - "Play Store" → usually means "place order" or "products"
 
+{ASR_HINTS}
+
 ORDER PROCESSING RULES:
 1. If user says "order", "place order", "checkout", "Play Store app" → proceed to order placement
 2. For names: If unclear, use what you hear (e.g., "Mrutyunjay Patra" → accept as name)
@@ -317,6 +346,7 @@ FUNCTION SELECTION:
 - add_to_cart(): When user selects products
 - get_cart_summary(): When user asks about cart
 - remove_from_cart(): When user wants to remove items
+- reorder_usual(): When user wants their usual order / same as last time
 - place_order(): When user wants to complete purchase
 Detect user language:
         - Hindi words (mujhe, chahiye, kharidna, etc.) → respond in Hindi (code: hi)
@@ -334,7 +364,9 @@ Detect user language:
         User: "Tame kya cho?"
         → <language>gu</language><response>हुं मजामा छूं! तमने शुं जोयए?</response>
 
-RESPONSE FORMAT: Always use <language>code</language><response>message</response>"""
+RESPONSE FORMAT: Always use <language>code</language><response>message</response>
+
+Each user turn contains only the new utterance. When cart, customer details or language change, the turn starts with a STATE UPDATE block; treat it as the current state."""
 
 def parse_language_response(response_text):
     """Parse language-tagged response format"""
@@ -351,38 +383,31 @@ def parse_language_response(response_text):
     return None, response_text
 
 def initialize_session(call_sid):
-    """Initialize a new chat session with the system prompt (optimized with warm-up)"""
-    global warmup_session
-    
-    # Try to use warm-up session for faster initialization
-    if warmup_session is not None:
-        try:
-            # Clone the warm-up session for this call
-            model = genai.GenerativeModel(
-                model_name='gemini-1.5-flash',
-                tools=function_declarations
-            )
-            sessions[call_sid] = model.start_chat(history=[])
-            sessions[call_sid].send_message(SYSTEM_PROMPT)
-            print(f"DEBUG: Fast session initialization for {call_sid}")
-        except Exception as e:
-            print(f"DEBUG: Fast initialization failed, using standard method: {e}")
-            # Fallback to standard initialization
-            model = genai.GenerativeModel(
-                model_name='gemini-1.5-flash',
-                tools=function_declarations
-            )
-            sessions[call_sid] = model.start_chat(history=[])
-            sessions[call_sid].send_message(SYSTEM_PROMPT)
-    else:
-        # Standard initialization
-        model = genai.GenerativeModel(
-            model_name='gemini-1.5-flash',
-            tools=function_declarations
-        )
-        sessions[call_sid] = model.start_chat(history=[])
-        sessions[call_sid].send_message(SYSTEM_PROMPT)
-    
+    """Initialize a new chat session with the system prompt"""
+    model = genai.GenerativeModel(
+        model_name='gemini-1.5-flash',
+        tools=function_declarations
+    )
+    # A call served by another worker earlier: rebuild the chat from its state summary
+    history = conversation_history.get(call_sid)
+    summary = None
+    if history is not None and len(history) > 1:
+        summary = build_state_summary(call_sid)
+        log.debug("Rebuilding chat session for %s from shared state", call_sid)
+    # The system prompt is seeded into the history, so starting the chat sends no request
+    sessions[call_sid] = model.start_chat(history=seed_history(SYSTEM_PROMPT, summary))
+
+def load_call_data(call_sid):
+    """Caller profile and saved cart for a call's first turn (Sheets only, no Gemini)"""
+    # A call served by another worker earlier already has them in its shared state
+    history = conversation_history.get(call_sid)
+    if history is not None and len(history) > 1:
+        return
+
+    # Caller-ID prefetch (started by /twiml) already loaded the profile and saved cart
+    if wait_for_prefetch(call_sid):
+        return
+
     # Load existing cart if available
     existing_cart = load_cart(call_sid)
     if existing_cart:
@@ -392,214 +417,281 @@ def initialize_session(call_sid):
             "customer_phone": existing_cart["Customer Phone"]
         }
 
+def compact_session_if_needed(call_sid):
+    """Restart an over-budget chat session from a compact state summary"""
+    chat = sessions[call_sid]
+    if not history_over_budget(chat.history):
+        return False
+    
+    old_turns = len(chat.history)
+    summary = build_state_summary(call_sid)
+    model = genai.GenerativeModel(
+        model_name='gemini-1.5-flash',
+        tools=function_declarations
+    )
+    sessions[call_sid] = model.start_chat(history=seed_history(SYSTEM_PROMPT, summary))
+    log.debug("Compacted chat session for %s: %s turns -> %s", call_sid, old_turns, len(sessions[call_sid].history))
+    return True
+
+# ---------------- Tools ----------------
+# One handler per entry in functions.function_declarations. Cart reads and
+# orders run in a later phase than cart changes requested in the same turn.
+tools = ToolDispatcher(function_declarations)
+
+def _last_user_utterance(call_sid):
+    """What the caller said this turn, as transcribed"""
+    history = conversation_history.get(call_sid)
+    if history is None:
+        return ""
+    return next((message.content for message in reversed(list(history)) if message.role == "user"), "")
+
+@tools.register("search_products")
+def tool_search_products(call_sid, args, lang_code):
+    """Search the catalog and describe the matches"""
+    query = args.get("query", "")
+    results = search_products(query)
+    if results:
+        # Gemini translated a word the lexicon may not know yet ("sabudana" -> "sago")
+        normalizer.learn(_last_user_utterance(call_sid), query)
+
+    if isinstance(results, dict):
+        if not results:
+            response_text = get_localized_text("no_inventory", lang_code) or "I don't have any items in stock right now."
+        else:
+            response_text = get_localized_text("available_categories", lang_code) or "Available categories: "
+            for category, items in list(results.items())[:3]:
+                response_text += f"{category} ({len(items)} items), "
+            response_text += get_localized_text("which_category", lang_code) or "Which category interests you?"
+
+    elif isinstance(results, list):
+        if results:
+            if len(results) == 1:
+                item = results[0]
+                response_text = get_localized_text("ask_quantity", lang_code, item=item['Item Name']) or f"I found {item['Item Name']}. How many would you like?"
+            elif len(results) > 5:
+                response_text = get_localized_text("product_found", lang_code, count=len(results), items="") or f"Found {len(results)} products. Popular ones: "
+                product_names = [item['Item Name'] for item in results[:3]]
+                response_text += ", ".join(product_names) + ". "
+                response_text += get_localized_text("which_one", lang_code) or "Which one would you like?"
+            else:
+                response_text = get_localized_text("product_found", lang_code, count=len(results), items="") or "Found these products: "
+                product_names = [item['Item Name'] for item in results[:3]]
+                response_text += ", ".join(product_names) + ". "
+                response_text += get_localized_text("which_one", lang_code) or "Which one would you like?"
+        else:
+            similar = find_similar_products(query)
+            if similar:
+                response_text = get_localized_text("no_products", lang_code, query=query) or f"No '{query}' found. Similar items: "
+                similar_names = [item['Item Name'] for item in similar[:2]]
+                response_text += ", ".join(similar_names) + ". "
+                response_text += get_localized_text("which_interests", lang_code) or "Which one interests you?"
+            else:
+                categories = get_categories_summary()
+                if categories:
+                    response_text = get_localized_text("no_products", lang_code, query=query) or f"No '{query}' found. Categories: "
+                    for cat, count in list(categories.items())[:3]:
+                        response_text += f"{cat} ({count} items), "
+                    response_text += get_localized_text("which_category", lang_code) or "Which category?"
+                else:
+                    response_text = get_localized_text("no_products", lang_code, query=query) or f"No products matching '{query}' found."
+    return response_text
+
+@tools.register("add_to_cart")
+def tool_add_to_cart(call_sid, args, lang_code):
+    """Add a product to the cart, suggesting a complementary item"""
+    product_name = args.get("product_name", "")
+    quantity = args.get("quantity", 1)
+
+    customer_phone = None
+    if call_sid in customer_info and "phone" in customer_info[call_sid]:
+        customer_phone = customer_info[call_sid]["phone"]
+    elif call_sid in shopping_carts and "customer_phone" in shopping_carts[call_sid]:
+        customer_phone = shopping_carts[call_sid]["customer_phone"]
+
+    success, response_text = add_to_cart(call_sid, product_name, quantity, customer_phone)
+
+    # Localize the response
+    if success:
+        response_text = get_localized_text("item_added", lang_code, qty=quantity, item=product_name) or response_text
+    else:
+        response_text = get_localized_text("add_failed", lang_code) or response_text
+
+    if success and call_sid in shopping_carts and len(shopping_carts[call_sid]["items"]) <= 2:
+        cart_items = [item["name"] for item in shopping_carts[call_sid]["items"]]
+        # Suggestions are keyed by catalog name; the spoken name may be partial
+        spoken = normalize_query(product_name).lower()
+        catalog_name = next((name for name in cart_items if spoken in name.lower()), product_name)
+        complementary = find_complementary_products(catalog_name, max_results=3)
+        available_suggestions = [item for item in complementary if item['Item Name'] not in cart_items]
+
+        if available_suggestions:
+            item = available_suggestions[0]
+            suggestion_text = get_localized_text("suggest_item", lang_code, item=item['Item Name']) or f" Would you also like {item['Item Name']}?"
+            response_text += suggestion_text
+    return response_text
+
+@tools.register("reorder_usual")
+def tool_reorder_usual(call_sid, args, lang_code):
+    """Rebuild the caller's usual order in the cart with one cart write"""
+    customer_phone = None
+    if call_sid in customer_info and customer_info[call_sid].get("phone"):
+        customer_phone = customer_info[call_sid]["phone"]
+    else:
+        state = registry.get(call_sid)
+        customer_phone = state.caller_phone if state is not None else None
+
+    usual = order_index.usual_items(customer_phone) if customer_phone else []
+    if not usual:
+        return get_localized_text("no_usual_order", lang_code)
+
+    added, unavailable = add_items_to_cart(call_sid, usual, customer_phone)
+    if added:
+        items = ", ".join(f"{quantity} {name}" for name, quantity in added)
+        response_text = get_localized_text("reorder_added", lang_code, items=items, total=shopping_carts[call_sid]["total"])
+    else:
+        response_text = get_localized_text("cart_empty", lang_code)
+    if unavailable:
+        response_text += get_localized_text("reorder_unavailable", lang_code, items=", ".join(unavailable))
+    return response_text
+
+@tools.register("remove_from_cart")
+def tool_remove_from_cart(call_sid, args, lang_code):
+    """Remove a product from the cart"""
+    product_name = args.get("product_name", "")
+    success, response_text = remove_from_cart(call_sid, product_name)
+
+    # Localize the response
+    if success:
+        response_text = get_localized_text("item_removed", lang_code, item=product_name) or response_text
+    else:
+        response_text = get_localized_text("remove_failed", lang_code) or response_text
+    return response_text
+
+@tools.register("get_cart_summary", phase=1)
+def tool_get_cart_summary(call_sid, args, lang_code):
+    """Read back the cart"""
+    response_text = get_cart_summary(call_sid)
+
+    # Get localized cart summary if cart is empty
+    if "empty" in response_text.lower():
+        response_text = get_localized_text("cart_empty", lang_code) or response_text
+    return response_text
+
+@tools.register("place_order", phase=1)
+def tool_place_order(call_sid, args, lang_code):
+    """Place the order with the customer details collected so far"""
+    # Extract customer info from args or conversation context
+    name = args.get("customer_name", "")
+    phone = args.get("customer_phone", "")
+    address = args.get("customer_address", "")
+
+    # If info is missing from function call, check conversation context
+    if (not name or name.lower() == "unknown") and call_sid in customer_info and "name" in customer_info[call_sid]:
+        name = customer_info[call_sid]["name"]
+
+    if (not phone or phone.lower() == "unknown") and call_sid in customer_info and "phone" in customer_info[call_sid]:
+        phone = customer_info[call_sid]["phone"]
+
+    if (not address or address.lower() == "unknown") and call_sid in customer_info and "address" in customer_info[call_sid]:
+        address = customer_info[call_sid]["address"]
+
+    # For demo purposes, use placeholder if still missing
+    if not name or name.lower() == "unknown":
+        name = "Customer"  # Simple placeholder
+
+    if not phone or phone.lower() == "unknown":
+        phone = "0000000000"  # Placeholder phone
+
+    if not address or address.lower() == "unknown":
+        address = "Default Address"  # Placeholder address
+
+    # Place the order
+    if call_sid in shopping_carts and shopping_carts[call_sid]["items"]:
+        address_parts = address.split(',')
+        customer_data = {
+            "name": name,
+            "phone": phone,
+            "address": address_parts[0].strip() if len(address_parts) > 0 else address,
+            "city": address_parts[1].strip() if len(address_parts) > 1 else "",
+            "state": address_parts[2].strip() if len(address_parts) > 2 else "",
+            "zip": address_parts[3].strip() if len(address_parts) > 3 else ""
+        }
+
+        success, response_text = place_order(call_sid, customer_data)
+
+        # Localize order response
+        if success and "Order ID:" in response_text:
+            order_id = response_text.split("Order ID:")[1].strip()
+            response_text = get_localized_text("order_placed", lang_code, order_id=order_id) or response_text
+    else:
+        response_text = get_localized_text("cart_empty", lang_code) or "Your cart is empty. Add items before ordering."
+    return response_text
+
+if tools.missing():
+    log.warning("Declared tools without a handler: %s", ", ".join(tools.missing()))
+
 async def process_user_query(user_prompt, call_sid):
     """Process user query with function calling"""
     add_to_conversation_history(call_sid, "user", user_prompt)
-    context = get_conversation_context(call_sid)
-    
-    # Initialize session if it doesn't exist
-    if call_sid not in sessions:
-        initialize_session(call_sid)
     
     # Get current session language
     session_lang = get_session_language(call_sid)
-    
-    # Enhanced context with speech recognition error handling
-    enhanced_context = f"""CONVERSATION HISTORY:
-{context}
 
-SPEECH RECOGNITION CONTEXT:
-User might say things that get misrecognized:
-- "Play Store app" usually means "place order" or "products"
-- "card" usually means "cart"
-- Numbers might be misheard: "tour" → "two", "wife" → "five"
-- Names might be misheard but accept them as-is for demo
-
-CURRENT USER INPUT: "{user_prompt}"
-
-Interpret the user's intent considering possible speech recognition errors."""
+    # Waiting on Sheets must not hold one of the Gemini slots
+    if call_sid not in sessions:
+        load_call_data(call_sid)
 
     try:
-        print(f"DEBUG: Sending to Gemini: {user_prompt}")
-        response = sessions[call_sid].send_message(enhanced_context)
+        # Starting the chat session and sending the turn both wait for a Gemini slot
+        with llm_admission.slot(call_sid):
+            # Initialize session if it doesn't exist
+            if call_sid not in sessions:
+                initialize_session(call_sid)
+            else:
+                compact_session_if_needed(call_sid)
+
+            # The chat session already holds the history and the system prompt holds
+            # the speech-recognition hints, so send only the utterance plus state deltas
+            turn_prompt, prompt_state = build_turn_prompt(call_sid, user_prompt)
+            log.debug("Sending to Gemini: %s", user_prompt)
+            with span("gemini.send_message"):
+                # Deadline-bounded and hedged; a hedge that wins brings its own chat session
+                response, sessions[call_sid] = gemini_client.send_message(sessions[call_sid], turn_prompt)
+        # Only a prompt the model received counts as seen; a failed turn resends the deltas
+        commit_prompt_state(call_sid, prompt_state)
+        log_prompt_tokens(call_sid, turn_prompt, response)
         
-        has_function_call = False
-        function_call = None
+        function_calls = []
         if response.candidates and response.candidates[0].content.parts:
             for part in response.candidates[0].content.parts:
                 if hasattr(part, 'function_call') and part.function_call:
-                    has_function_call = True
-                    function_call = part.function_call
-                    break
+                    function_calls.append((part.function_call.name, dict(part.function_call.args)))
         
-        if has_function_call:
-            function_name = function_call.name
-            args = dict(function_call.args)
-            
-            print(f"DEBUG: Function call: {function_name} with args: {args}")
-            
-            # Update global language immediately when detected by Gemini
-            if 'language' in args and args['language'] in ["en", "hi", "gu"]:
-                detected_lang = args['language']
-                set_global_language(detected_lang)
-                set_session_language(call_sid, detected_lang)
-                print(f"DEBUG: Updated global language to {detected_lang}")
+        if function_calls:
+            log.debug("Function calls: %s", function_calls)
             
-            if function_name == "search_products":
-                query = args.get("query", "")
-                lang_code = args.get("language", session_lang)
-                results = search_products(query)
-                
-                if isinstance(results, dict):
-                    if not results:
-                        response_text = get_localized_text("no_inventory", lang_code) or "I don't have any items in stock right now."
-                    else:
-                        response_text = get_localized_text("available_categories", lang_code) or "Available categories: "
-                        for category, items in list(results.items())[:3]:
-                            response_text += f"{category} ({len(items)} items), "
-                        response_text += get_localized_text("which_category", lang_code) or "Which category interests you?"
-                
-                elif isinstance(results, list):
-                    if results:
-                        if len(results) == 1:
-                            item = results[0]
-                            response_text = get_localized_text("ask_quantity", lang_code, item=item['Item Name']) or f"I found {item['Item Name']}. How many would you like?"
-                        elif len(results) > 5:
-                            response_text = get_localized_text("product_found", lang_code, count=len(results), items="") or f"Found {len(results)} products. Popular ones: "
-                            product_names = [item['Item Name'] for item in results[:3]]
-                            response_text += ", ".join(product_names) + ". "
-                            response_text += get_localized_text("which_one", lang_code) or "Which one would you like?"
-                        else:
-                            response_text = get_localized_text("product_found", lang_code, count=len(results), items="") or "Found these products: "
-                            product_names = [item['Item Name'] for item in results[:3]]
-                            response_text += ", ".join(product_names) + ". "
-                            response_text += get_localized_text("which_one", lang_code) or "Which one would you like?"
-                    else:
-                        similar = find_similar_products(query)
-                        if similar:
-                            response_text = get_localized_text("no_products", lang_code, query=query) or f"No '{query}' found. Similar items: "
-                            similar_names = [item['Item Name'] for item in similar[:2]]
-                            response_text += ", ".join(similar_names) + ". "
-                            response_text += get_localized_text("which_interests", lang_code) or "Which one interests you?"
-                        else:
-                            categories = get_categories_summary()
-                            if categories:
-                                response_text = get_localized_text("no_products", lang_code, query=query) or f"No '{query}' found. Categories: "
-                                for cat, count in list(categories.items())[:3]:
-                                    response_text += f"{cat} ({count} items), "
-                                response_text += get_localized_text("which_category", lang_code) or "Which category?"
-                            else:
-                                response_text = get_localized_text("no_products", lang_code, query=query) or f"No products matching '{query}' found."
-            
-            elif function_name == "add_to_cart":
-                product_name = args.get("product_name", "")
-                quantity = args.get("quantity", 1)
-                lang_code = args.get("language", session_lang)
-                
-                customer_phone = None
-                if call_sid in customer_info and "phone" in customer_info[call_sid]:
-                    customer_phone = customer_info[call_sid]["phone"]
-                elif call_sid in shopping_carts and "customer_phone" in shopping_carts[call_sid]:
-                    customer_phone = shopping_carts[call_sid]["customer_phone"]
-                
-                success, response_text = add_to_cart(call_sid, product_name, quantity, customer_phone)
-                
-                # Localize the response
-                if success:
-                    response_text = get_localized_text("item_added", lang_code, qty=quantity, item=product_name) or response_text
-                else:
-                    response_text = get_localized_text("add_failed", lang_code) or response_text
-                
-                if success and call_sid in shopping_carts and len(shopping_carts[call_sid]["items"]) <= 2:
-                    complementary = find_complementary_products(product_name, max_results=3)
-                    cart_items = [item["name"] for item in shopping_carts[call_sid]["items"]]
-                    available_suggestions = [item for item in complementary if item['Item Name'] not in cart_items]
-                    
-                    if available_suggestions:
-                        item = available_suggestions[0]
-                        suggestion_text = get_localized_text("suggest_item", lang_code, item=item['Item Name']) or f" Would you also like {item['Item Name']}?"
-                        response_text += suggestion_text
-            
-            elif function_name == "remove_from_cart":
-                product_name = args.get("product_name", "")
-                lang_code = args.get("language", session_lang)
-                success, response_text = remove_from_cart(call_sid, product_name)
-                
-                # Localize the response
-                if success:
-                    response_text = get_localized_text("item_removed", lang_code, item=product_name) or response_text
-                else:
-                    response_text = get_localized_text("remove_failed", lang_code) or response_text
-            
-            elif function_name == "get_cart_summary":
-                lang_code = args.get("language", session_lang)
-                response_text = get_cart_summary(call_sid)
-                
-                # Get localized cart summary if cart is empty
-                if "empty" in response_text.lower():
-                    response_text = get_localized_text("cart_empty", lang_code) or response_text
-            
-            elif function_name == "place_order":
-                # Extract customer info from args or conversation context
-                name = args.get("customer_name", "")
-                phone = args.get("customer_phone", "")
-                address = args.get("customer_address", "")
-                lang_code = args.get("language", session_lang)
-                
-                # If info is missing from function call, check conversation context
-                if (not name or name.lower() == "unknown") and call_sid in customer_info and "name" in customer_info[call_sid]:
-                    name = customer_info[call_sid]["name"]
-                
-                if (not phone or phone.lower() == "unknown") and call_sid in customer_info and "phone" in customer_info[call_sid]:
-                    phone = customer_info[call_sid]["phone"]
-                
-                if (not address or address.lower() == "unknown") and call_sid in customer_info and "address" in customer_info[call_sid]:
-                    address = customer_info[call_sid]["address"]
-                
-                # For demo purposes, use placeholder if still missing
-                if not name or name.lower() == "unknown":
-                    name = "Customer"  # Simple placeholder
-                
-                if not phone or phone.lower() == "unknown":
-                    phone = "0000000000"  # Placeholder phone
-                
-                if not address or address.lower() == "unknown":
-                    address = "Default Address"  # Placeholder address
-                
-                # Place the order
-                if call_sid in shopping_carts and shopping_carts[call_sid]["items"]:
-                    address_parts = address.split(',')
-                    customer_data = {
-                        "name": name,
-                        "phone": phone,
-                        "address": address_parts[0].strip() if len(address_parts) > 0 else address,
-                        "city": address_parts[1].strip() if len(address_parts) > 1 else "",
-                        "state": address_parts[2].strip() if len(address_parts) > 2 else "",
-                        "zip": address_parts[3].strip() if len(address_parts) > 3 else ""
-                    }
-                    
-                    success, response_text = place_order(call_sid, customer_data)
-                    
-                    # Localize order response
-                    if success and "Order ID:" in response_text:
-                        order_id = response_text.split("Order ID:")[1].strip()
-                        response_text = get_localized_text("order_placed", lang_code, order_id=order_id) or response_text
-                else:
-                    response_text = get_localized_text("cart_empty", lang_code) or "Your cart is empty. Add items before ordering."
+            # Update session language immediately when detected by Gemini
+            for _, args in function_calls:
+                if args.get('language') in ["en", "hi", "gu"]:
+                    set_session_language(call_sid, args['language'])
+                    log.debug("Updated session language for %s to %s", call_sid, args['language'])
+                    break
             
-            else:
-                response_text = "I'm not sure how to handle that request."
+            # Run every requested tool (concurrently where independent) and answer them in one reply
+            responses = await tools.dispatch(call_sid, function_calls, session_lang,
+                                             "I'm not sure how to handle that request.")
+            response_text = " ".join(text for text in responses if text)
+            metrics.inc("tool_calls", len(function_calls))
         
         else:
             response_text = response.text
-            print(f"DEBUG: Text response: {response_text}")
+            log.debug("Text response: %s", response_text)
         
         detected_lang, clean_response = parse_language_response(response_text)
         
         # Update session language if detected, otherwise preserve current session language
         if detected_lang and detected_lang in ["en", "hi", "gu"]:
             set_session_language(call_sid, detected_lang)
-            set_global_language(detected_lang)  # Update global language too
         else:
             # Use existing session language if no language detected in response
             detected_lang = get_session_language(call_sid)
@@ -607,8 +699,16 @@ Interpret the user's intent considering possible speech recognition errors."""
         add_to_conversation_history(call_sid, "assistant", clean_response)
         return detected_lang, clean_response
     
+    except GeminiTimeout as e:
+        # The abandoned request may still answer on the old chat; carry on from a clean copy
+        sessions[call_sid] = e.chat
+        return await shed_turn(call_sid, user_prompt)
+
+    except Overloaded:
+        return await shed_turn(call_sid, user_prompt)
+
     except Exception as e:
-        print(f"Error processing query: {e}")
+        log.exception("Error processing query: %s", e)
         
         # Enhanced error handling for speech recognition issues
         user_input_lower = user_prompt.lower()
@@ -672,7 +772,6 @@ Interpret the user's intent considering possible speech recognition errors."""
         # Update session language if detected, otherwise preserve current session language
         if detected_lang and detected_lang in ["en", "hi", "gu"]:
             set_session_language(call_sid, detected_lang)
-            set_global_language(detected_lang)
         else:
             # Use existing session language if no language detected in response
             detected_lang = get_session_language(call_sid)
@@ -680,12 +779,141 @@ Interpret the user's intent considering possible speech recognition errors."""
         add_to_conversation_history(call_sid, "assistant", clean_response)
         return detected_lang, clean_response
 
+async def shed_turn(call_sid, user_prompt):
+    """Answer a turn Gemini did not (shed or past its deadline): simple requests locally, otherwise ask to hold"""
+    session_lang = get_session_language(call_sid)
+    hold_text = get_localized_text("please_hold", session_lang) or "We have many callers right now. Please tell me again in a moment."
+    function_calls = match_intent(user_prompt)
+    if function_calls:
+        metrics.inc("llm_shed_local_intent")
+        responses = await tools.dispatch(call_sid, function_calls, session_lang, hold_text)
+        response_text = " ".join(text for text in responses if text)
+    else:
+        response_text = hold_text
+    add_to_conversation_history(call_sid, "assistant", response_text)
+    return session_lang, response_text
+
+# ---------------- Startup ----------------
+# The port is bound immediately; worksheets, the embedding model and the Gemini
+# warm-up session load concurrently in the background. Until the search index
+# is built, queries use a degraded TF-IDF engine (see intelligent_search).
+readiness = {"sheets": False, "search_model": False, "gemini": False, "search_index": False}
+# Attempts per warm-up step before startup goes on without it
+WARMUP_RETRIES = int(os.getenv("WARMUP_RETRIES", "3"))
+# Seconds between attempts to reach Google Sheets once warm-up went on without it
+SHEETS_RECONNECT_INTERVAL = float(os.getenv("SHEETS_RECONNECT_INTERVAL", "30"))
+
+def _warm_step(name, func, retries=WARMUP_RETRIES, **kwargs):
+    """Run one blocking warm-up step with retries and record it in `readiness`; None if it failed"""
+    for attempt in range(1, max(retries, 1) + 1):
+        try:
+            with span(f"startup.{name}"):
+                result = func(**kwargs)
+        except Exception as e:
+            if attempt >= retries:
+                log.exception("Warm-up step %s failed after %d attempts: %s", name, attempt, e)
+                readiness[name] = False
+                return None
+            delay = min(2 ** attempt, 10)
+            log.warning("Warm-up step %s failed (%s); retrying in %ds", name, e, delay)
+            time.sleep(delay)
+        else:
+            readiness[name] = result is not False
+            return result
+
+def _attach_sheets():
+    """Connect the worksheets, then reload the degraded search engine that may have been built without them"""
+    if not connect_google_sheets():
+        raise ConnectionError("Google Sheets worksheets are not attached")
+    intelligent_search.refresh_degraded_engine()
+
+async def _reconnect_sheets():
+    """Keep trying Google Sheets after warm-up went on without it, then reload what was built without it"""
+    import sheets_handler
+    while not sheets_handler.worksheets_attached():
+        await asyncio.sleep(SHEETS_RECONNECT_INTERVAL)
+        await asyncio.to_thread(_warm_step, "sheets", _attach_sheets, retries=1)
+    log.info("Connected to Google Sheets after warm-up")
+    if intelligent_search.search_engine is not None:
+        intelligent_search.search_engine.request_refresh()
+    await asyncio.to_thread(order_index.refresh)
+
+# Set by preload_for_fork() in a pre-fork master; workers adopt it instead of building their own
+preloaded_engine = None
+
+async def warm_up():
+    """Load all slow dependencies concurrently, then index the catalog
+
+    A step that still fails after its retries is skipped; the rest of
+    startup goes ahead and Sheets is retried in the background.
+    """
+    start = time.perf_counter()
+    steps = [
+        asyncio.to_thread(_warm_step, "sheets", _attach_sheets),
+        asyncio.to_thread(_warm_step, "gemini", initialize_warmup_session),
+    ]
+    if preloaded_engine is None:
+        steps.append(asyncio.to_thread(_warm_step, "search_model", intelligent_search.load_encoder))
+    await asyncio.gather(*steps)
+    # Embeddings need both the worksheets and the model; without Sheets they use the inventory snapshot
+    engine, _ = await asyncio.gather(
+        asyncio.to_thread(_warm_step, "search_index", intelligent_search.warm_up, engine=preloaded_engine),
+        asyncio.to_thread(order_index.refresh),
+    )
+    order_index.start_refresher()
+    if engine is None:
+        log.error("Warm-up could not build the search index; search stays degraded")
+    else:
+        log.info("Warm-up finished in %.1fs; %d products indexed", time.perf_counter() - start, len(engine.inventory_data))
+    import sheets_handler
+    if not sheets_handler.worksheets_attached():
+        await _reconnect_sheets()
+
+def preload_for_fork():
+    """Load the model and catalog index once in the pre-fork master (see prefork.py)"""
+    global preloaded_engine
+    import sheets_handler
+    # The master serves no requests; workers adopt queued writes after the fork
+    connect_google_sheets(recover_writes=False)
+    intelligent_search.load_encoder()
+    readiness["search_model"] = True
+    # Built in-thread: the embedding pool's processes and threads must not exist at fork time
+    preloaded_engine = intelligent_search.IntelligentSearch(use_pool=False)
+    intelligent_search.shutdown_embedding_pool(wait=True)
+    # HTTP sessions must not be shared between processes; each worker reconnects
+    sheets_handler.inventory_sheet = sheets_handler.customers_sheet = None
+    sheets_handler.orders_sheet = sheets_handler.carts_sheet = None
+
+def is_ready():
+    return intelligent_search.search_ready.is_set()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Evict idle call state in the background
+    registry.start_sweeper()
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    intelligent_search.shutdown_embedding_pool()
+
 # ---------------- FastAPI app ----------------
-app = FastAPI()
-call_retry_counts = {}
+app = FastAPI(lifespan=lifespan)
+
+@app.get("/ready")
+async def ready():
+    """200 once warm-up has finished, 503 (with per-component status) until then"""
+    return JSONResponse({"ready": is_ready(), **readiness}, status_code=200 if is_ready() else 503)
 
 @app.post("/twiml")
-async def twiml_endpoint():
+async def twiml_endpoint(request: Request):
+    with span("webhook.twiml"):
+        form_data = await request.form()
+        # Look the caller up while the greeting plays
+        start_caller_prefetch(form_data.get("CallSid"), form_data.get("From"))
+        return render_twiml_greeting()
+
+def render_twiml_greeting():
+    """TwiML for the start of a call"""
     safe_greeting = "Namaste! Welcome to GroceryBabu! I am Aditi, your personal shopping assistant."
     
     xml_response = f"""<?xml version="1.0" encoding="UTF-8"?>
@@ -706,16 +934,24 @@ async def twiml_endpoint():
 @app.post("/handle-speech")
 async def handle_speech(request: Request):
     form_data = await request.form()
+    with span("webhook.handle_speech", form_data.get("CallSid", "")):
+        return handle_speech_form(form_data)
+
+def handle_speech_form(form_data):
+    """Start processing a caller's utterance and return the holding TwiML"""
     speech_result = form_data.get("SpeechResult", "")
     call_sid = form_data.get("CallSid", "")
     
-    print(f"Received speech from {call_sid}: {speech_result}")
+    log.info("Received speech from %s: %s", call_sid, speech_result)
     
-    # Start processing in background thread
-    if call_sid not in processing_threads or not processing_threads[call_sid].is_alive():
+    # Pick up state written by whichever worker served this call's previous turn
+    hydrate_call(call_sid)
+    
+    # Start processing in background thread (unless this or another worker already is)
+    local_busy = call_sid in processing_threads and processing_threads[call_sid].is_alive()
+    if not local_busy and claim_turn(call_sid):
         # Clear any previous results
-        if call_sid in processing_results:
-            del processing_results[call_sid]
+        clear_result(call_sid)
         
         # Start new processing thread
         thread = threading.Thread(
@@ -724,10 +960,11 @@ async def handle_speech(request: Request):
             daemon=True
         )
         processing_threads[call_sid] = thread
-        thread.start()
+        with span("thread_start", call_sid):
+            thread.start()
         
         # Return immediate processing feedback in appropriate language
-        processing_phrase = get_processing_phrase(current_language)
+        processing_phrase = get_processing_phrase(get_session_language(call_sid))
         
         xml_response = f"""<?xml version="1.0" encoding="UTF-8"?>
 <Response>
@@ -745,9 +982,14 @@ async def handle_speech(request: Request):
 @app.post("/check-status/{call_sid}")
 async def check_status(call_sid: str):
     """Check processing status and return appropriate response"""
-    if call_sid in processing_results and processing_results[call_sid]["ready"]:
+    with span("webhook.check_status", call_sid):
+        return render_status(call_sid)
+
+def render_status(call_sid):
+    """TwiML with the finished response, or another short wait"""
+    result = fetch_result(call_sid)
+    if result and result["ready"]:
         # Processing complete, return final response
-        result = processing_results[call_sid]
         detected_language = result["language"]
         clean_response = result["response"]
         
@@ -755,8 +997,7 @@ async def check_status(call_sid: str):
         voice = language_info["voice"]
         
         # Clean up
-        if call_sid in processing_results:
-            del processing_results[call_sid]
+        clear_result(call_sid)
         if call_sid in processing_queues:
             del processing_queues[call_sid]
         
@@ -766,10 +1007,9 @@ async def check_status(call_sid: str):
     <Say voice="{voice}">{clean_response}</Say>
     <Hangup/>
 </Response>"""
-            if call_sid in call_retry_counts:
-                del call_retry_counts[call_sid]
-            if call_sid in conversation_context:
-                del conversation_context[call_sid]
+            # Call is over: drop all per-call state (eviction hooks flush the cart)
+            registry.end_call(call_sid)
+            release_call(call_sid)
         else:
             simple_prompts = {
                 "hi": "मैं सुन रहा हूँ।",
@@ -815,21 +1055,43 @@ def generate_status_check_response(call_sid):
 async def root():
     return {"message": "GroceryBabu Voice Assistant API - Aditi is ready to help!"}
 
+@app.get("/sessions")
+async def session_stats():
+    """Per-call state registry size, evictions and approximate memory usage"""
+    return registry.stats()
+
+metrics.register_gauge("active_calls", "Calls with state held by this worker", lambda: len(registry))
+metrics.register_gauge("session_memory_bytes", "Approximate bytes of per-call state", registry.memory_usage)
+metrics.register_gauge("llm_active_requests", "Gemini requests holding an admission slot", lambda: llm_admission.stats()["active"])
+metrics.register_gauge("llm_queued_requests", "Turns waiting for a Gemini slot", lambda: llm_admission.stats()["queued"])
+metrics.register_gauge("process_unique_memory_bytes", "Memory private to this worker process (USS)",
+                       lambda: (prefork.process_memory() or {}).get("uss", 0))
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency histograms, counters and gauges in Prometheus text format"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces/{call_sid}")
+async def call_trace(call_sid: str):
+    """Timing spans recorded for one call, oldest first"""
+    return {"call_sid": call_sid, "spans": metrics.trace(call_sid)}
+
 if __name__ == "__main__":
-    print(f"Starting server on port {PORT}")
-    print(f"Main endpoint: {DOMAIN}/twiml")
-    print(f"Speech handler: {DOMAIN}/handle-speech")
-    print("GroceryBabu assistant Aditi is ready with processing feedback!")
-    
-    # Initialize inventory and search engine
-    inventory = get_inventory()
-    print(f"Found {len(inventory)} items in inventory")
-    
-    from intelligent_search import search_engine
-    search_engine.refresh_inventory()
-    print("Search engine refreshed")
+    log.info("Starting server on port %s", PORT)
+    log.info("Main endpoint: %s/twiml", DOMAIN)
+    log.info("Speech handler: %s/handle-speech", DOMAIN)
+    log.info("GroceryBabu assistant Aditi is ready with processing feedback!")
     
-    # Initialize Gemini warm-up session for faster first requests
-    initialize_warmup_session()
-    
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
\ No newline at end of file
+    # Sheets, the search index and the Gemini warm-up session load in each worker's lifespan (see /ready)
+    # More than one worker needs STATE_BACKEND=sqlite so any worker can serve any turn
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and not state_store.shared:
+        log.warning("WEB_CONCURRENCY > 1 without a shared STATE_BACKEND; calls may hit a worker without their state")
+    if SERVER_MODE == "prefork":
+        # Model and index loaded once, shared copy-on-write by all workers
+        prefork.serve(app, "0.0.0.0", PORT, workers, preload=preload_for_fork)
+    elif workers > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=PORT, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=PORT)
\ No newline at end of file
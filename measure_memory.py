@@ -0,0 +1,148 @@
+"""Per-worker memory of the server in uvicorn and pre-fork modes.
+
+Starts ``python main.py`` with fake backends in each SERVER_MODE, waits
+for /ready, warms every worker with a few searches, then reads
+/proc/<pid>/smaps_rollup for every process in the server's tree:
+
+    python measure_memory.py --workers 4 --catalog-size 20000 --json memory.json
+
+USS (memory unique to one process) is what each extra worker really costs;
+total PSS is the whole server's footprint with shared pages split fairly.
+Linux only.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from prefork import process_memory
+
+
+def children_of(pid):
+    """All descendant PIDs of a process"""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # comm may contain spaces; ppid is the second field after it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def command_line(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode(errors="replace").strip()[:80]
+    except OSError:
+        return ""
+
+
+def get(url, timeout=2.0):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def measure_mode(mode, args, port):
+    env = dict(os.environ, FAKE_BACKENDS="1", NGROK_URL="memtest.local", PORT=str(port), SERVER_MODE=mode,
+               WEB_CONCURRENCY=str(args.workers), FAKE_CATALOG_SIZE=str(args.catalog_size),
+               FAKE_SHEETS_LATENCY_MS="0", LOG_LEVEL="WARNING",
+               # Embedding pool processes would be counted as extra workers
+               EMBEDDING_WORKERS="0")
+    server = subprocess.Popen([sys.executable, "main.py"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              env=env, start_new_session=True)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + args.timeout
+        ready_in_row = 0
+        # Each request may land on a different worker; wait until many in a row are ready
+        while ready_in_row < args.workers * 4:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{mode}: server not ready after {args.timeout}s")
+            if server.poll() is not None:
+                raise RuntimeError(f"{mode}: server exited with {server.returncode}")
+            ready_in_row = ready_in_row + 1 if get(f"{base}/ready") == 200 else 0
+            time.sleep(0.1 if ready_in_row else 0.5)
+
+        # Touch the search path in every worker
+        for i in range(args.workers * 8):
+            body = urllib.parse.urlencode({"CallSid": f"CAmem{i}", "SpeechResult": "do you have basmati rice"}).encode()
+            try:
+                urllib.request.urlopen(f"{base}/handle-speech", data=body, timeout=10).read()
+            except OSError:
+                pass
+        time.sleep(args.settle)
+
+        processes = []
+        for pid in [server.pid] + children_of(server.pid):
+            memory = process_memory(pid)
+            if memory:
+                processes.append({"pid": pid, "cmd": command_line(pid), **memory})
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(server.pid, signal.SIGKILL)
+
+    # The master/supervisor is processes[0]; the rest are workers and helpers
+    workers = processes[1:] or processes
+    return {
+        "mode": mode,
+        "processes": processes,
+        "worker_uss_mb": [round(p["uss"] / 2**20, 1) for p in workers],
+        "mean_worker_uss_mb": round(sum(p["uss"] for p in workers) / len(workers) / 2**20, 1) if workers else 0,
+        "total_pss_mb": round(sum(p["pss"] for p in processes) / 2**20, 1),
+        "total_rss_mb": round(sum(p["rss"] for p in processes) / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--modes", default="uvicorn,prefork")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--catalog-size", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for /ready")
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds to wait before sampling")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    args = parser.parse_args()
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("measure_memory.py needs Linux /proc/<pid>/smaps_rollup")
+
+    results = []
+    for offset, mode in enumerate(m.strip() for m in args.modes.split(",") if m.strip()):
+        result = measure_mode(mode, args, args.port + offset)
+        results.append(result)
+        print(f"{mode:<8} workers={args.workers}  mean worker USS={result['mean_worker_uss_mb']:>8.1f}MB  "
+              f"total PSS={result['total_pss_mb']:>8.1f}MB  total RSS={result['total_rss_mb']:>8.1f}MB  "
+              f"per-worker USS={result['worker_uss_mb']}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"workers": args.workers, "catalog_size": args.catalog_size, "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import contextvars
+import functools
+import threading
+import time
+from collections import OrderedDict, deque
+
+from log_config import get_logger
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Calls whose traces are retained, and spans kept per call
+MAX_TRACED_CALLS = 200
+MAX_SPANS_PER_CALL = 500
+
+METRIC_PREFIX = "grocerybabu"
+
+# Call the current code is working for; copied into asyncio tasks and to_thread calls
+current_call_sid = contextvars.ContextVar("current_call_sid", default=None)
+
+log = get_logger(__name__)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q):
+        """Approximate quantile (bucket upper bound) of observed values"""
+        counts, _, count = self.snapshot()
+        if count == 0:
+            return 0.0
+        target = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Process-wide latency histograms, counters, gauges and per-call traces"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}  # {stage: Histogram}
+        self.counters = {}    # {(name, label_items): value}
+        self.gauges = {}      # {name: (help, callback)}
+        self.traces = OrderedDict()  # {call_sid: deque of span dicts}, oldest call first
+
+    # ---------------- Recording ----------------
+    def observe(self, stage, seconds, call_sid=None, start=None):
+        """Record one span duration for a stage (and the call's trace)"""
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        histogram.observe(seconds)
+
+        call_sid = call_sid or current_call_sid.get()
+        if call_sid:
+            span = {"stage": stage, "start": start if start is not None else time.time() - seconds,
+                    "duration_ms": round(seconds * 1000, 3)}
+            with self._lock:
+                trace = self.traces.get(call_sid)
+                if trace is None:
+                    trace = self.traces[call_sid] = deque(maxlen=MAX_SPANS_PER_CALL)
+                    while len(self.traces) > MAX_TRACED_CALLS:
+                        self.traces.popitem(last=False)
+                trace.append(span)
+
+    def inc(self, name, amount=1, **labels):
+        """Increment a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def register_gauge(self, name, help_text, callback):
+        """Expose callback() as a gauge on /metrics"""
+        self.gauges[name] = (help_text, callback)
+
+    def trace(self, call_sid):
+        """Spans recorded for a call, oldest first"""
+        with self._lock:
+            return list(self.traces.get(call_sid, ()))
+
+    # ---------------- Exposition ----------------
+    def render_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        name = f"{METRIC_PREFIX}_stage_latency_seconds"
+        lines.append(f"# HELP {name} Latency of each request-processing stage")
+        lines.append(f"# TYPE {name} histogram")
+        for stage, histogram in sorted(self.histograms.items()):
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+        seen = set()
+        for (counter, labels), value in counters:
+            full_name = f"{METRIC_PREFIX}_{counter}_total"
+            if full_name not in seen:
+                seen.add(full_name)
+                lines.append(f"# TYPE {full_name} counter")
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+            lines.append(f"{full_name}{{{label_text}}} {value}" if label_text else f"{full_name} {value}")
+
+        for gauge, (help_text, callback) in sorted(self.gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                log.error("Gauge %s failed: %s", gauge, e)
+                continue
+            full_name = f"{METRIC_PREFIX}_{gauge}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} gauge")
+            lines.append(f"{full_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Global instance
+metrics = Metrics()
+
+
+class span:
+    """Time a block: ``with span("gemini.send_message"): ...``"""
+    __slots__ = ("stage", "call_sid", "_start", "_wall")
+
+    def __init__(self, stage, call_sid=None):
+        self.stage = stage
+        self.call_sid = call_sid
+
+    def __enter__(self):
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        metrics.observe(self.stage, time.perf_counter() - self._start, self.call_sid, self._wall)
+        return False
+
+
+def timed(stage):
+    """Decorator recording every call of the function as a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,244 @@
+"""Per-customer order history and co-purchase index over the Orders sheet.
+
+Keyed by the caller's phone number, it keeps each customer's recent orders
+and how often each item appears in them, so a returning caller's "usual
+order" is a dict lookup instead of several search → add_to_cart turns.
+Across all customers it counts which items are bought together, giving
+add_to_cart suggestions that are complements rather than near-duplicates.
+
+The Orders sheet is append-only: a refresh parses only the rows added since
+the previous one, and orders placed by this process are recorded as soon as
+they are written.
+"""
+import heapq
+import json
+import math
+import os
+import statistics
+import threading
+import time
+from collections import Counter, deque
+
+from log_config import get_logger
+from metrics import span
+from sheets_handler import normalize_phone
+
+# Seconds between reads of the Orders sheet for new rows
+ORDER_INDEX_REFRESH_INTERVAL = float(os.getenv("ORDER_INDEX_REFRESH_INTERVAL", "300"))
+# Recent orders per customer that define the usual order
+USUAL_ORDER_WINDOW = int(os.getenv("USUAL_ORDER_WINDOW", "5"))
+# An item is part of the usual order if it appears in at least this share of those orders
+USUAL_ITEM_SHARE = float(os.getenv("USUAL_ITEM_SHARE", "0.5"))
+# Orders two items must share before one is suggested with the other
+CO_PURCHASE_MIN_SUPPORT = int(os.getenv("CO_PURCHASE_MIN_SUPPORT", "2"))
+# Complements kept per item
+CO_PURCHASE_TOP_K = 10
+# Larger baskets (bulk orders) say little about what goes together
+CO_PURCHASE_MAX_BASKET = 30
+
+log = get_logger(__name__)
+
+
+def parse_order_items(items_json):
+    """{item name: quantity} from an Orders "Items JSON" cell"""
+    try:
+        items = json.loads(items_json) if isinstance(items_json, str) else items_json
+    except ValueError:
+        return {}
+    quantities = {}
+    for item in items or []:
+        if isinstance(item, dict) and item.get("name"):
+            quantities[item["name"]] = quantities.get(item["name"], 0) + int(item.get("quantity", 1) or 1)
+    return quantities
+
+
+class CustomerOrders:
+    """One customer's recent orders and item frequencies"""
+    __slots__ = ("recent", "order_count", "item_orders")
+
+    def __init__(self):
+        self.recent = deque(maxlen=USUAL_ORDER_WINDOW)  # (order_id, date, {name: quantity}), oldest first
+        self.order_count = 0
+        self.item_orders = Counter()  # item name -> number of orders containing it
+
+    def add(self, order_id, date, items):
+        self.recent.append((order_id, date, items))
+        self.order_count += 1
+        self.item_orders.update(items.keys())
+
+    def last_order(self):
+        if not self.recent:
+            return None
+        order_id, date, items = self.recent[-1]
+        return {"Order ID": order_id, "Date": date, "Items": [{"name": name, "quantity": qty} for name, qty in items.items()]}
+
+    def usual_items(self):
+        """[(name, quantity)] bought in most recent orders, most frequent first; else the last order"""
+        counts = Counter()
+        quantities = {}
+        for _, _, items in self.recent:
+            for name, quantity in items.items():
+                counts[name] += 1
+                quantities.setdefault(name, []).append(quantity)
+        threshold = max(1, USUAL_ITEM_SHARE * len(self.recent))
+        usual = [(name, int(statistics.median_low(quantities[name])))
+                 for name, count in counts.most_common() if count >= threshold]
+        if usual:
+            return usual
+        last = self.recent[-1][2] if self.recent else {}
+        return list(last.items())
+
+
+class CoPurchaseTable:
+    """Item → complements table from baskets of past orders
+
+    Pair counts are updated per order; each item's ranked complements are
+    recomputed only when one of its orders changed, on its next lookup.
+    Items are ranked by co-occurrence normalized by both items' popularity
+    (count(a, b) / sqrt(count(a) * count(b))), so staples bought with
+    everything do not crowd out real complements.
+    """
+
+    def __init__(self):
+        self.item_counts = Counter()  # lowercased name -> orders containing it
+        self.pair_counts = {}  # lowercased name -> Counter(lowercased name -> orders containing both)
+        self.names = {}  # lowercased name -> catalog name
+        self._ranked = {}  # lowercased name -> [catalog name], best first
+        self._dirty = set()
+
+    def add(self, names):
+        """Count one order's basket"""
+        keys = {name.lower(): name for name in names}
+        if len(keys) > CO_PURCHASE_MAX_BASKET:
+            return
+        self.names.update(keys)
+        self.item_counts.update(keys.keys())
+        for key in keys:
+            pairs = self.pair_counts.setdefault(key, Counter())
+            pairs.update(other for other in keys if other != key)
+        self._dirty.update(keys)
+
+    def _rank(self, key):
+        count = self.item_counts[key]
+        scored = ((pair / math.sqrt(count * self.item_counts[other]), other)
+                  for other, pair in self.pair_counts.get(key, {}).items() if pair >= CO_PURCHASE_MIN_SUPPORT)
+        return [self.names[other] for _, other in heapq.nlargest(CO_PURCHASE_TOP_K, scored)]
+
+    def complements(self, name, max_results=CO_PURCHASE_TOP_K):
+        """Catalog names most often bought with `name`, best first"""
+        key = name.lower()
+        if key in self._dirty:
+            self._ranked[key] = self._rank(key)
+            self._dirty.discard(key)
+        return self._ranked.get(key, [])[:max_results]
+
+
+class OrderHistoryIndex:
+    """Customers' order histories keyed by normalized phone number"""
+
+    def __init__(self, refresh_interval=ORDER_INDEX_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.customers = {}  # phone -> CustomerOrders
+        self.co_purchase = CoPurchaseTable()
+        self._rows_seen = 0
+        self._recorded = set()  # (order id, phone) of orders recorded before the sheet was re-read
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresh_requested = threading.Event()
+        self._refresher = None
+        self.refreshed_at = None
+
+    def _add(self, order_id, phone, date, items):
+        """Add one order; caller holds self._lock"""
+        if not items:
+            return False
+        self.co_purchase.add(items.keys())
+        phone = normalize_phone(phone)
+        if phone:
+            self.customers.setdefault(phone, CustomerOrders()).add(order_id, date, items)
+        return True
+
+    def record_order(self, order_id, phone, items, date=""):
+        """Index an order just written to the Orders sheet"""
+        quantities = parse_order_items(items)
+        with self._lock:
+            if self._add(str(order_id), phone, date, quantities):
+                self._recorded.add((str(order_id), normalize_phone(phone)))
+
+    def refresh(self):
+        """Index Orders rows added since the last refresh; returns the number of new orders"""
+        from sheets_handler import orders_sheet
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0
+        try:
+            with span("orders.refresh_index"):
+                rows = orders_sheet.get_all_records()
+            with self._lock:
+                if len(rows) < self._rows_seen:
+                    # Rows were deleted: rebuild from scratch
+                    log.info("Orders sheet shrank from %d to %d rows; rebuilding order index", self._rows_seen, len(rows))
+                    self.customers, self._rows_seen, self._recorded = {}, 0, set()
+                    self.co_purchase = CoPurchaseTable()
+                added = 0
+                for row in rows[self._rows_seen:]:
+                    order_id, phone = str(row.get("Order ID", "")), normalize_phone(row.get("Customer Phone"))
+                    if (order_id, phone) in self._recorded:
+                        self._recorded.discard((order_id, phone))
+                        continue
+                    added += self._add(order_id, phone, str(row.get("Date", "")), parse_order_items(row.get("Items JSON")))
+                self._rows_seen = len(rows)
+            self.refreshed_at = time.monotonic()
+            log.debug("Order index refreshed: %d new orders, %d customers", added, len(self.customers))
+            return added
+        except Exception as e:
+            log.error("Error refreshing order index: %s", e)
+            return 0
+        finally:
+            self._refresh_lock.release()
+
+    def start_refresher(self):
+        """Pick up orders placed through other workers every refresh_interval seconds or on request"""
+        if self._refresher is not None or self.refresh_interval <= 0:
+            return
+        def run():
+            while True:
+                self._refresh_requested.wait(self.refresh_interval)
+                self._refresh_requested.clear()
+                self.refresh()
+        self._refresher = threading.Thread(target=run, name="order-index-refresh", daemon=True)
+        self._refresher.start()
+
+    def ensure_fresh(self):
+        """Start a background refresh if the index was never loaded or is older than refresh_interval
+
+        Never reads the sheet in the caller's thread; lookups are served from
+        the index as it stands and see the new rows on a later turn.
+        """
+        if self.refreshed_at is not None and time.monotonic() - self.refreshed_at <= self.refresh_interval:
+            return
+        if self._refresher is not None:
+            self._refresh_requested.set()
+        elif not self._refresh_lock.locked():
+            threading.Thread(target=self.refresh, name="order-index-refresh-once", daemon=True).start()
+
+    def usual_items(self, phone):
+        """[(item name, quantity)] the customer usually orders; empty if unknown"""
+        self.ensure_fresh()
+        with self._lock:
+            customer = self.customers.get(normalize_phone(phone))
+            return customer.usual_items() if customer else []
+
+    def complements(self, name, max_results=CO_PURCHASE_TOP_K):
+        """Catalog names most often bought together with `name`; no Sheets access"""
+        with self._lock:
+            return self.co_purchase.complements(name, max_results)
+
+    def last_order(self, phone):
+        """The customer's most recent order, shaped like sheets_handler.get_last_order()"""
+        self.ensure_fresh()
+        with self._lock:
+            customer = self.customers.get(normalize_phone(phone))
+            return customer.last_order() if customer else None
+
+
+order_index = OrderHistoryIndex()
@@ -0,0 +1,127 @@
+"""Pre-fork server mode: load once in a master process, fork workers that share it.
+
+The master runs the expensive start-up (embedding model, catalog index),
+freezes the garbage collector so collections in the workers do not touch
+and copy the shared objects, binds the listening socket and forks
+SERVER_WORKERS uvicorn workers. Model weights and the embedding matrix stay
+in copy-on-write pages shared by every worker instead of being loaded once
+per worker as with ``uvicorn --workers``.
+
+Anything holding sockets, threads or gRPC channels (Google Sheets clients,
+the Gemini warm-up session, background threads) must be created after the
+fork, in each worker's lifespan.
+"""
+import gc
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+from log_config import get_logger
+
+log = get_logger(__name__)
+
+
+def process_memory(pid="self"):
+    """RSS, PSS and USS (unique set size) of a process in bytes, from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) * 1024
+    except OSError:
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "swap": fields.get("Swap", 0),
+    }
+
+
+def _bind(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock, log_level):
+    """Serve on the inherited socket until uvicorn exits (never returns)"""
+    status = 0
+    try:
+        config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        log.exception("Worker %d crashed", os.getpid())
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def serve(app, host, port, workers, preload=None, log_level="info"):
+    """Run `preload()` once, then fork `workers` uvicorn workers sharing its memory
+
+    Workers that exit unexpectedly are re-forked from the master, so they
+    start from the same shared, already-loaded state.
+    """
+    start = time.perf_counter()
+    if preload is not None:
+        preload()
+    # Move everything loaded so far out of the collector's reach so the
+    # workers' collections never write to (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+    master_memory = process_memory()
+    log.info("Pre-fork master %d loaded in %.1fs", os.getpid(), time.perf_counter() - start,
+             extra={"rss_mb": round(master_memory["rss"] / 2**20, 1) if master_memory else None})
+
+    sock = _bind(host, port)
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            _run_worker(app, sock, log_level)
+        children[pid] = time.monotonic()
+        log.info("Forked worker %d", pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        log.warning("Worker %d exited with status %d; re-forking", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started < 1.0:
+            # Crash loop guard
+            time.sleep(1.0)
+        spawn()
+    sock.close()
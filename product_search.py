@@ -1,69 +1,105 @@
-from intelligent_search import search_engine
+import re
+
+from intelligent_search import get_search_engine
+from order_history import order_index
+from log_config import get_logger
+from query_normalizer import normalize_query
+
+log = get_logger(__name__)
+
+# Related products ranked per requested complement, leaving room for out-of-stock and same-name rows
+COMPLEMENT_CANDIDATES = 5
 
 def search_products(query, category=None, in_stock_only=True):
     """Search for products using intelligent semantic search"""
-    print(f"DEBUG: product_search.search_products called with query='{query}', category='{category}'")
+    log.debug("search_products called with query=%r, category=%r", query, category)
+    # Hindi/Gujarati words ("chawal", "चावल") to catalog terms
+    query, category = normalize_query(query), normalize_query(category)
     
     try:
         # Use the intelligent search engine
         if category:
             # Search within specific category
-            results, matched_category = search_engine.search_by_category(category)
-            print(f"DEBUG: Category search for '{category}' matched '{matched_category}', found {len(results)} items")
+            results, matched_category = get_search_engine().search_by_category(category)
+            log.debug("Category search for %r matched %r, found %d items", category, matched_category, len(results))
             return results
         else:
             # General search
-            results = search_engine.search_products(query)
-            print(f"DEBUG: General search for '{query}' found results type: {type(results)}")
+            results = get_search_engine().search_products(query)
             
             # If it's a category listing request, return organized results
             if isinstance(results, dict):
-                print(f"DEBUG: Returning dict with categories: {list(results.keys())}")
-                return results
+                log.debug("Returning dict with categories: %s", list(results.keys()))
             elif isinstance(results, list):
-                print(f"DEBUG: Returning list with {len(results)} items")
-                return results
+                log.debug("Returning list with %d items", len(results))
             
             return results
             
     except Exception as e:
-        print(f"ERROR in intelligent search: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error in intelligent search: %s", e)
         # Fallback to basic search if needed
         return []
 
 def find_similar_products(product_name, max_results=3):
     """Find similar products using intelligent semantic search"""
     try:
-        return search_engine.find_similar_products(product_name, max_results)
+        return get_search_engine().find_similar_products(normalize_query(product_name), max_results)
     except Exception as e:
-        print(f"Error finding similar products: {e}")
+        log.error("Error finding similar products: %s", e)
         return []
 
+# Pack sizes carry no meaning for "same product" ("5kg", "7 oz", "2 lb")
+_SIZE_WORDS = {"g", "gm", "gms", "kg", "kgs", "lb", "lbs", "oz", "ml", "l", "ltr", "pack", "pcs"}
+
+def _core_tokens(name):
+    """Words of an item name without sizes or counts"""
+    return {word for word in re.findall(r"[a-z]+", name.lower()) if word not in _SIZE_WORDS}
+
+def _same_kind(item, tokens, category):
+    """True if `item` is the same kind of product: same category, or most of the name in common"""
+    if category and item.get('Category') == category:
+        return True
+    shared = tokens & _core_tokens(item.get('Item Name', ''))
+    return bool(tokens) and len(shared) * 2 >= len(tokens)
+
 def find_complementary_products(product_name, max_results=2):
-    """Find complementary products using intelligent search"""
+    """Products often bought with this one; related products if it has no order history"""
     try:
-        # Use semantic search to find related products
-        similar_products = search_engine.find_similar_products(product_name, max_results * 2)
+        engine = get_search_engine()
+        complementary = []
+        for name in order_index.complements(product_name):
+            item = engine.get_item(name)
+            if item is not None and item.get('Quantity', 0) > 0:
+                complementary.append(item)
+                if len(complementary) >= max_results:
+                    break
+        if complementary:
+            return complementary
+        
+        # Use semantic search over the other categories; the nearest products
+        # overall are mostly other brands and sizes of the same thing
+        related = engine.find_related_products(product_name, max_results * COMPLEMENT_CANDIDATES)
         
         # Filter to get truly complementary items (not just similar)
+        product = engine.get_item(product_name)
+        category = product.get('Category') if product is not None else None
+        tokens = _core_tokens(product_name)
         complementary = []
-        for item in similar_products:
-            if product_name.lower() not in item.get('Item Name', '').lower():
+        for item in related:
+            if item.get('Quantity', 0) > 0 and not _same_kind(item, tokens, category):
                 complementary.append(item)
                 if len(complementary) >= max_results:
                     break
         
         return complementary
     except Exception as e:
-        print(f"Error finding complementary products: {e}")
+        log.error("Error finding complementary products: %s", e)
         return []
 
 def get_categories_summary():
     """Get summary of available categories"""
     try:
-        return search_engine.get_categories_summary()
+        return get_search_engine().get_categories_summary()
     except Exception as e:
-        print(f"Error getting categories: {e}")
+        log.error("Error getting categories: %s", e)
         return {}
\ No newline at end of file
@@ -0,0 +1,166 @@
+import os
+
+from log_config import get_logger
+from session_registry import registry, get_session_language
+
+# Per-session chat history budget; past either limit older turns are summarized
+CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "24"))
+CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "6000"))
+# Recent messages carried verbatim into the summary
+SUMMARY_RECENT_MESSAGES = 4
+
+log = get_logger(__name__)
+
+# Speech-recognition hints; sent once as part of the system prompt, never per turn
+ASR_HINTS = """SPEECH RECOGNITION CONTEXT:
+User might say things that get misrecognized:
+- "Play Store app" usually means "place order" or "products"
+- "card" usually means "cart"
+- Numbers might be misheard: "tour" → "two", "wife" → "five"
+- Names might be misheard but accept them as-is for demo
+Interpret the user's intent considering possible speech recognition errors."""
+
+
+def _cart_snapshot(cart):
+    """Compact, comparable description of a cart"""
+    if not cart or not cart.get("items"):
+        return "empty"
+    items = ", ".join(f"{item['name']} x{item['quantity']}" for item in cart["items"])
+    return f"{len(cart['items'])} items, total ${cart['total']:.2f} ({items})"
+
+
+def _customer_snapshot(customer):
+    """Compact description of the customer details collected so far"""
+    if not customer:
+        return None
+    parts = [f"{key}={customer[key]}" for key in ("name", "phone", "address") if customer.get(key)]
+    return "; ".join(parts) or None
+
+
+def _last_order_snapshot(order):
+    """Compact description of a returning caller's previous order"""
+    if not order or not order.get("Items"):
+        return None
+    items = ", ".join(f"{item['name']} x{item.get('quantity', 1)}" for item in order["Items"] if "name" in item)
+    return f"{order.get('Date') or order.get('Order ID')}: {items}"
+
+
+def _state_snapshot(call_sid, state):
+    """Current language, cart and customer details as compact strings"""
+    return {
+        "language": get_session_language(call_sid),
+        "cart": _cart_snapshot(state.cart),
+        "customer": _customer_snapshot(state.customer),
+        "last_order": _last_order_snapshot(state.last_order),
+    }
+
+
+def build_turn_prompt(call_sid, user_prompt):
+    """Build the message for this turn: the new utterance plus state that changed
+
+    The Gemini chat session already holds the full history, so only facts the
+    model has not seen yet (language, cart, customer details updated by local
+    tool handling) are prepended, and only when they differ from the last turn.
+    Returns (prompt, state); pass the state to commit_prompt_state once the
+    model has received the prompt.
+    """
+    state = registry.get(call_sid, create=True)
+    with state.lock:
+        current = _state_snapshot(call_sid, state)
+        previous = state.prompt_state or {}
+
+    deltas = [f"{key}: {value}" for key, value in current.items()
+              if value is not None and previous.get(key) != value]
+    if not deltas:
+        return user_prompt, current
+    return "STATE UPDATE:\n" + "\n".join(deltas) + f"\n\nUSER: {user_prompt}", current
+
+
+def commit_prompt_state(call_sid, prompt_state):
+    """Record the state the model has now seen, so later turns send only what changed"""
+    state = registry.get(call_sid, create=True)
+    with state.lock:
+        state.prompt_state = prompt_state
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token) when usage metadata is missing"""
+    return max(1, len(text) // 4)
+
+
+def estimate_history_tokens(history):
+    """Estimate tokens held by a Gemini chat history (text and function parts)"""
+    total = 0
+    for content in history:
+        parts = content["parts"] if isinstance(content, dict) else content.parts
+        for part in parts:
+            if isinstance(part, str):
+                total += estimate_tokens(part)
+            elif getattr(part, "text", None):
+                total += estimate_tokens(part.text)
+            else:
+                # function_call / function_response parts: name plus small args
+                total += 32
+    return total
+
+
+def history_over_budget(history):
+    """True when a chat history exceeds the per-session turn or token budget"""
+    if len(history) > CHAT_HISTORY_MAX_TURNS:
+        return True
+    return estimate_history_tokens(history) > CHAT_HISTORY_MAX_TOKENS
+
+
+def build_state_summary(call_sid):
+    """Compact summary of a call (cart, customer, language, last messages)
+
+    Used to seed a fresh chat session once the old one exceeds its budget. A
+    trailing user message is the utterance about to be sent, so it is left out.
+    """
+    state = registry.get(call_sid, create=True)
+    with state.lock:
+        current = _state_snapshot(call_sid, state)
+        # The summary carries the current state, so the next turn needs no delta
+        state.prompt_state = current
+        recent = list(state.history or [])
+    if recent and recent[-1].role == "user":
+        recent.pop()
+    recent = recent[-SUMMARY_RECENT_MESSAGES:]
+
+    lines = ["CALL STATE SUMMARY (earlier turns were condensed):"]
+    lines += [f"{key}: {value}" for key, value in current.items() if value is not None]
+    if recent:
+        lines.append("recent conversation:")
+        lines += [f"{msg.role}: {msg.content}" for msg in recent]
+    return "\n".join(lines)
+
+
+def seed_history(system_prompt, summary=None):
+    """Initial chat history: system prompt, plus a state summary when compacting"""
+    history = [
+        {"role": "user", "parts": [system_prompt]},
+        {"role": "model", "parts": ["<language>en</language><response>Understood.</response>"]},
+    ]
+    if summary:
+        history += [
+            {"role": "user", "parts": [summary]},
+            {"role": "model", "parts": ["<language>en</language><response>Noted.</response>"]},
+        ]
+    return history
+
+
+def log_prompt_tokens(call_sid, prompt, response):
+    """Log prompt/response token counts for one turn; returns the prompt token count"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "prompt_token_count", None):
+        prompt_tokens = usage.prompt_token_count
+        output_tokens = getattr(usage, "candidates_token_count", 0)
+        source = "usage"
+    else:
+        prompt_tokens = estimate_tokens(prompt)
+        output_tokens = None
+        source = "estimate"
+    log.info("Prompt tokens", extra={"call_sid": call_sid, "prompt_tokens": prompt_tokens,
+                                     "output_tokens": output_tokens, "turn_chars": len(prompt),
+                                     "token_source": source})
+    return prompt_tokens
@@ -0,0 +1,325 @@
+"""Hindi/Gujarati → catalog-English query normalization for search and add_to_cart.
+
+Callers say "chawal", "चावल" or "chokha" for rice; the catalog is English.
+Each query is rewritten locally before it reaches the search engine:
+
+1. script detection (Latin, Devanagari, Gujarati) per token,
+2. transliteration of Devanagari/Gujarati tokens to Latin,
+3. lookup in a curated lexicon, by exact spelling and then by a phonetic key
+   that absorbs spelling variants (chawal/chaaval/चावल, dhania/dhaniya),
+4. lookup in a lexicon learned from earlier calls, where the caller said a
+   word the lexicon did not know and Gemini searched for an English term,
+5. number words before units ("do kilo" → "2 kg") and filler words
+   ("mujhe ... chahiye") are rewritten or dropped.
+
+Results are memoized. Only regional queries are rewritten: Devanagari or
+Gujarati script, a Hinglish/Gujarati marker word, or a lexicon word that is
+not also English. Everything else, and any query that is exactly a catalog
+item name, comes back unchanged. Lexicon words that appear in catalog item
+names ("Aloo Bhujia") are never rewritten, so the catalog's own spelling
+keeps matching.
+"""
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+from log_config import get_logger
+from metrics import metrics
+from state_store import state_store
+
+# Observations of the same unknown word → English term before it is learned
+LEXICON_LEARN_MIN = int(os.getenv("LEXICON_LEARN_MIN", "2"))
+# Seconds between reloads of words learned by other workers
+LEXICON_RELOAD_INTERVAL = float(os.getenv("LEXICON_RELOAD_INTERVAL", "300"))
+NORMALIZER_CACHE_SIZE = 8192
+
+log = get_logger(__name__)
+
+# ---------------- Lexicon ----------------
+# Romanized Hindi/Gujarati → catalog term; spelling variants are covered by the phonetic key
+CURATED_LEXICON = {
+    # Hindi
+    "chawal": "rice", "chaval": "rice", "dal": "dal", "daal": "dal", "atta": "atta", "aata": "atta",
+    "besan": "besan", "maida": "flour", "sooji": "sooji", "suji": "sooji", "rava": "sooji", "rawa": "sooji",
+    "cheeni": "sugar", "chini": "sugar", "shakkar": "sugar", "namak": "salt", "haldi": "turmeric",
+    "mirch": "chilli", "mirchi": "chilli", "lal mirch": "red chilli", "jeera": "cumin", "zeera": "cumin",
+    "dhaniya": "coriander", "dhania": "coriander", "rai": "mustard seeds", "sarson": "mustard",
+    "sarson ka tel": "mustard oil", "hing": "hing", "methi": "methi", "tel": "oil", "ghee": "ghee",
+    "doodh": "milk", "dahi": "curd", "makhan": "butter", "paneer": "paneer", "chai": "tea",
+    "biskut": "biscuits", "biscut": "biscuits", "namkeen": "namkeen", "bhujia": "bhujia",
+    "achar": "pickle", "achaar": "pickle", "aam ka achar": "mango pickle", "chutney": "chutney",
+    "imli": "tamarind", "aloo": "potato", "pyaz": "onion", "pyaaz": "onion", "kanda": "onion",
+    "tamatar": "tomato", "adrak": "ginger", "lahsun": "garlic", "lehsun": "garlic", "moong": "moong",
+    "masoor": "masoor", "chana": "chana", "rajma": "rajma", "toor": "toor", "arhar": "toor",
+    "poha": "poha", "moongfali": "peanuts", "mungfali": "peanuts", "kela": "banana",
+    # Gujarati
+    "chokha": "rice", "lot": "atta", "khand": "sugar", "mithu": "salt", "haldar": "turmeric",
+    "marchu": "chilli", "jiru": "cumin", "dhana": "coriander", "dudh": "milk", "chaa": "tea",
+    "batata": "potato", "dungli": "onion", "tameta": "tomato", "aadu": "ginger", "lasan": "garlic",
+    "sing": "peanuts", "athanu": "pickle", "tuvar": "toor", "chevdo": "namkeen", "ganthiya": "namkeen",
+}
+
+# Lexicon words that are also English, or usual in Indian English product
+# names; they do not make a query regional and are rewritten only in one
+ENGLISH_HOMOGRAPHS = frozenset({"lot", "sing", "be", "do", "aloo", "jeera", "chai", "achar", "achaar",
+                                "haldi", "imli", "rava", "mirchi"})
+
+# Dropped from Hinglish/Gujarati queries
+FILLER_WORDS = frozenset("""
+    mujhe muje mujhko hamein humko mere mera meri chahiye chaiye chahie chahiya hai hain kya aap aapke apke
+    paas pas dijiye dena de do wala wali vala vali ka ki ke ko liye thoda aur bhi zara please ji
+    mane amne joie joiye joiae aapo apo che chhe tame tamari tamara pase nu ni no ne ane
+""".split())
+# Words that mark a Latin-script query as Hinglish or Gujarati
+LANGUAGE_MARKERS = frozenset("mujhe muje chahiye chaiye hai kya dijiye mane joie joiye aapo che chhe".split())
+
+NUMBER_WORDS = {
+    "ek": "1", "do": "2", "teen": "3", "char": "4", "chaar": "4", "paanch": "5", "panch": "5", "chhe": "6",
+    "saat": "7", "aath": "8", "nau": "9", "das": "10", "be": "2", "tran": "3", "sat": "7", "aadha": "0.5",
+}
+UNIT_WORDS = {"kilo": "kg", "kg": "kg", "gram": "g", "graam": "g", "litre": "l", "liter": "l", "ltr": "l",
+              "packet": "pack", "paket": "pack", "dabba": "pack"}
+
+# ---------------- Script detection and transliteration ----------------
+_DEVANAGARI = (0x0900, 0x097F)
+_GUJARATI = (0x0A80, 0x0AFF)
+# The Gujarati block mirrors Devanagari at this offset
+_GUJARATI_OFFSET = _GUJARATI[0] - _DEVANAGARI[0]
+
+_CONSONANTS = {
+    "क": "k", "ख": "kh", "ग": "g", "घ": "gh", "ङ": "n", "च": "ch", "छ": "chh", "ज": "j", "झ": "jh", "ञ": "n",
+    "ट": "t", "ठ": "th", "ड": "d", "ढ": "dh", "ण": "n", "त": "t", "थ": "th", "द": "d", "ध": "dh", "न": "n",
+    "प": "p", "फ": "ph", "ब": "b", "भ": "bh", "म": "m", "य": "y", "र": "r", "ल": "l", "ळ": "l", "व": "v",
+    "श": "sh", "ष": "sh", "स": "s", "ह": "h",
+}
+# Consonant + nukta
+_NUKTA_CONSONANTS = {"क": "q", "ख": "kh", "ग": "g", "ज": "z", "ड": "r", "ढ": "rh", "फ": "f"}
+_VOWELS = {"अ": "a", "आ": "aa", "इ": "i", "ई": "ee", "उ": "u", "ऊ": "oo", "ऋ": "ri", "ए": "e", "ऐ": "ai",
+           "ऑ": "o", "ओ": "o", "औ": "au"}
+_MATRAS = {"ा": "aa", "ि": "i", "ी": "ee", "ु": "u", "ू": "oo", "ृ": "ri", "ॅ": "e", "े": "e", "ै": "ai",
+           "ॉ": "o", "ो": "o", "ौ": "au"}
+_NASALS = {"ं": "n", "ँ": "n", "ः": "h"}
+_VIRAMA, _NUKTA = "्", "़"
+_DIGITS = {chr(0x0966 + i): str(i) for i in range(10)}
+
+_TOKEN = re.compile(r"[0-9A-Za-zऀ-ॣ०-ॿ઀-૿]+")
+
+
+def script_of(token):
+    """'devanagari', 'gujarati' or 'latin' for a token"""
+    for ch in token:
+        code = ord(ch)
+        if _DEVANAGARI[0] <= code <= _DEVANAGARI[1]:
+            return "devanagari"
+        if _GUJARATI[0] <= code <= _GUJARATI[1]:
+            return "gujarati"
+    return "latin"
+
+
+def transliterate(token):
+    """Romanize a Devanagari or Gujarati word (inherent vowel dropped at the end)"""
+    chars = [chr(ord(ch) - _GUJARATI_OFFSET) if _GUJARATI[0] <= ord(ch) <= _GUJARATI[1] else ch for ch in token]
+    out = []
+    for i, ch in enumerate(chars):
+        following = chars[i + 1] if i + 1 < len(chars) else ""
+        if ch in _CONSONANTS:
+            if following == _NUKTA:
+                out.append(_NUKTA_CONSONANTS.get(ch, _CONSONANTS[ch]))
+                following = chars[i + 2] if i + 2 < len(chars) else ""
+            else:
+                out.append(_CONSONANTS[ch])
+            # Inherent "a" unless a matra, virama or the end of the word follows
+            if following and following not in _MATRAS and following != _VIRAMA:
+                out.append("a")
+        elif ch in _VOWELS:
+            out.append(_VOWELS[ch])
+        elif ch in _MATRAS:
+            out.append(_MATRAS[ch])
+        elif ch in _NASALS:
+            out.append(_NASALS[ch])
+        elif ch in _DIGITS:
+            out.append(_DIGITS[ch])
+        elif ch.isascii():
+            out.append(ch)
+    return "".join(out)
+
+
+def phonetic_key(word):
+    """Spelling-insensitive key: chawal, chaaval and चावल (chaaval) share one"""
+    key = word.lower().replace("ee", "i").replace("oo", "u").replace("w", "v").replace("z", "j")
+    key = key.replace("ph", "f").replace("q", "k").replace("iya", "ia")
+    # Aspiration is written inconsistently (dhania/dania); keep ch and sh
+    key = re.sub(r"(?<=[bdgjkpt])h", "", key)
+    # Unstressed "a" is the vowel most often dropped or doubled
+    key = key[:1] + key[1:].replace("a", "")
+    return re.sub(r"(.)\1+", r"\1", key)
+
+
+# ---------------- Normalizer ----------------
+class QueryNormalizer:
+    """Curated plus learned lexicon with a memoized normalize()"""
+
+    def __init__(self, curated=CURATED_LEXICON):
+        self.curated = dict(curated)
+        self.learned = {}  # romanized word -> catalog term
+        self._candidates = {}  # (romanized word, term) -> observations
+        self._catalog_names = frozenset()  # lowercased item names
+        self._catalog_words = frozenset()  # words of item names
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._rebuild()
+
+    def _rebuild(self):
+        """Recompute lookup tables and drop memoized results; caller holds the lock or is __init__"""
+        lexicon = {**self.curated, **self.learned}
+        self._exact = lexicon
+        self._phonetic = {}
+        for word, term in lexicon.items():
+            self._phonetic.setdefault(" ".join(phonetic_key(part) for part in word.split()), term)
+        self._longest = max((len(word.split()) for word in lexicon), default=1)
+        self._fillers = {phonetic_key(word) for word in FILLER_WORDS}
+        self._memo = lru_cache(maxsize=NORMALIZER_CACHE_SIZE)(self._normalize)
+
+    def _reload_learned(self):
+        """Pick up words learned by other workers"""
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < LEXICON_RELOAD_INTERVAL:
+            return
+        self._loaded_at = now
+        stored = state_store.get("lexicon", "learned") or {}
+        with self._lock:
+            if stored != self.learned:
+                self.learned = dict(stored)
+                self._rebuild()
+
+    def set_catalog(self, item_names):
+        """Item names that are never rewritten, and whose words are kept in any query"""
+        names = frozenset(name.lower() for name in item_names if name)
+        if names == self._catalog_names:
+            return
+        with self._lock:
+            self._catalog_names = names
+            self._catalog_words = frozenset(word for name in names for word in _TOKEN.findall(name))
+            self._rebuild()
+
+    def normalize(self, text):
+        """Query with regional words replaced by catalog terms (memoized)"""
+        if not text:
+            return text
+        self._reload_learned()
+        return self._memo(text)
+
+    def _lookup(self, words):
+        """Catalog term for a word sequence of a regional query, or None"""
+        # Words the catalog itself uses are already catalog terms
+        if all(word in self._catalog_words for word in words):
+            return None
+        term = self._exact.get(" ".join(words))
+        if term is None:
+            term = self._phonetic.get(" ".join(phonetic_key(word) for word in words))
+        return term
+
+    def _is_filler(self, word, script):
+        """Filler word; transliterated ones (चाहिए → chaahie) are matched by phonetic key"""
+        return word in FILLER_WORDS or (script != "latin" and phonetic_key(word) in self._fillers)
+
+    def _is_regional(self, words, scripts):
+        """Hindi/Gujarati script, a marker word, or a lexicon word that is neither English nor in the catalog"""
+        return (any(script != "latin" for script in scripts)
+                or any(word in LANGUAGE_MARKERS for word in words)
+                or any(word in self._exact and word not in ENGLISH_HOMOGRAPHS and word not in self._catalog_words
+                       for word in words))
+
+    def _normalize(self, text):
+        if text.strip().lower() in self._catalog_names:
+            return text
+        tokens = _TOKEN.findall(text)
+        scripts = [script_of(token) for token in tokens]
+        words = [token.lower() if script == "latin" else transliterate(token) for token, script in zip(tokens, scripts)]
+        if not self._is_regional(words, scripts):
+            return text
+
+        out, changed, i = [], False, 0
+        while i < len(words):
+            word = words[i]
+            following = words[i + 1] if i + 1 < len(words) else ""
+            if word in NUMBER_WORDS and following in UNIT_WORDS:
+                out += [NUMBER_WORDS[word], UNIT_WORDS[following]]
+                changed, i = True, i + 2
+                continue
+            if word in UNIT_WORDS and out and out[-1].replace(".", "").isdigit():
+                out.append(UNIT_WORDS[word])
+                changed, i = True, i + 1
+                continue
+            # Longest phrase first: "sarson ka tel" before "sarson"
+            for size in range(min(self._longest, len(words) - i), 0, -1):
+                term = self._lookup(words[i:i + size])
+                if term is not None:
+                    out.append(term)
+                    changed = changed or term != " ".join(words[i:i + size])
+                    i += size
+                    break
+            else:
+                if self._is_filler(word, scripts[i]):
+                    changed = True
+                else:
+                    out.append(word)
+                    changed = changed or scripts[i] != "latin"
+                i += 1
+
+        if not changed or not out:
+            return text
+        normalized = " ".join(out)
+        metrics.inc("query_normalized")
+        log.debug("Normalized query %r -> %r", text, normalized)
+        return normalized
+
+    def unknown_words(self, text):
+        """Regional words in `text` that normalize() leaves as they are"""
+        tokens = _TOKEN.findall(text)
+        scripts = [script_of(token) for token in tokens]
+        words = [token.lower() if script == "latin" else transliterate(token) for token, script in zip(tokens, scripts)]
+        if not self._is_regional(words, scripts):
+            return []
+        return [word for word, script in zip(words, scripts) if not word.isdigit() and not self._is_filler(word, script)
+                and word not in NUMBER_WORDS and word not in UNIT_WORDS and word not in self._catalog_words
+                and self._lookup([word]) is None]
+
+    def learn(self, utterance, query):
+        """Learn a regional word from an utterance and the English query Gemini searched for
+
+        Only the unambiguous case is used: exactly one unknown regional word in
+        the utterance, and a short query made of words the utterance did not
+        contain. A mapping is added after LEXICON_LEARN_MIN matching turns.
+        """
+        unknown = self.unknown_words(utterance)
+        if len(unknown) != 1 or not query:
+            return False
+        said = {word.lower() for word in _TOKEN.findall(utterance)}
+        new_words = [word for word in _TOKEN.findall(query.lower()) if word not in said and not word.isdigit()]
+        if not 1 <= len(new_words) <= 3 or any(script_of(word) != "latin" for word in new_words):
+            return False
+        word, term = unknown[0], " ".join(new_words)
+        with self._lock:
+            seen = self._candidates[(word, term)] = self._candidates.get((word, term), 0) + 1
+            if seen < LEXICON_LEARN_MIN or self.learned.get(word) == term:
+                return False
+            self.learned[word] = term
+            self._rebuild()
+            learned = dict(self.learned)
+        # Shared with other workers through the state store
+        stored = state_store.get("lexicon", "learned") or {}
+        stored.update(learned)
+        state_store.set("lexicon", "learned", stored)
+        log.info("Learned lexicon entry %r -> %r", word, term)
+        return True
+
+
+normalizer = QueryNormalizer()
+
+
+def normalize_query(text):
+    """Module-level shortcut for normalizer.normalize()"""
+    return normalizer.normalize(text)
@@ -0,0 +1,108 @@
+"""Memory and ranking agreement of quantized catalog embeddings.
+
+Encodes synthetic grocery catalogs (fake_backends.generate_catalog) with the
+search model once, stores them at each EMBEDDING_PRECISION and compares every
+reduced-precision store against float32:
+
+    python report_quantization.py --sizes 1000,10000,100000 --json quant.json
+
+Reported per size and precision: bytes held, memory saved, top-1 agreement,
+recall@k of the float32 top-k, mean absolute score error and scoring latency.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+import fake_backends
+from embedding_store import STORES
+from intelligent_search import load_encoder, product_text
+
+QUERIES = ["basmati rice", "something spicy", "biscuits for tea", "lentils", "cooking oil", "instant noodles",
+           "haldi", "crispy namkeen", "gram flour", "ready to eat dinner", "pickle", "sweet chutney"]
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first"""
+    k = min(k, len(scores))
+    indices = np.argpartition(-scores, k - 1)[:k]
+    return indices[np.argsort(-scores[indices])]
+
+
+def compare_store(store, reference, queries, k):
+    """Agreement of one store's rankings with the float32 reference"""
+    top1, recall, errors, latencies = [], [], [], []
+    for query in queries:
+        expected = reference.scores(query)
+        start = time.perf_counter()
+        actual = store.scores(query)
+        latencies.append(time.perf_counter() - start)
+
+        expected_top, actual_top = top_k(expected, k), top_k(actual, k)
+        top1.append(expected_top[0] == actual_top[0])
+        recall.append(len(set(expected_top) & set(actual_top)) / len(expected_top))
+        errors.append(float(np.abs(expected - actual).mean()))
+    return {
+        "top1_agreement": round(sum(top1) / len(top1), 4),
+        f"recall_at_{k}": round(statistics.fmean(recall), 4),
+        "mean_abs_score_error": round(statistics.fmean(errors), 6),
+        "score_p50_ms": round(sorted(latencies)[len(latencies) // 2] * 1000, 3),
+    }
+
+
+def run(args, encoder):
+    results = []
+    for size in args.sizes:
+        catalog = fake_backends.generate_catalog(size)
+        start = time.perf_counter()
+        embeddings = encoder.encode([product_text(row) for row in catalog], batch_size=256)
+        encode_s = time.perf_counter() - start
+
+        # Product-name queries exercise near-duplicate ranking as well
+        names = [" ".join(row["Item Name"].split()[1:3]) for row in catalog[::max(1, size // 20)]]
+        queries = list(encoder.encode(QUERIES + names))
+
+        reference = STORES["float32"](embeddings)
+        entry = {"catalog_size": size, "dimensions": int(embeddings.shape[1]),
+                 "encode_s": round(encode_s, 2), "precisions": {}}
+        for precision, store_class in STORES.items():
+            store = reference if precision == "float32" else store_class(embeddings)
+            report = {"bytes": int(store.nbytes),
+                      "saved_vs_float32": round(1 - store.nbytes / reference.nbytes, 4)}
+            report.update(compare_store(store, reference, queries, args.k))
+            entry["precisions"][precision] = report
+            print(f"size={size:>6}  {precision:<8} {store.nbytes / 1e6:>8.2f}MB  "
+                  f"saved={report['saved_vs_float32']:>6.1%}  top1={report['top1_agreement']:.3f}  "
+                  f"recall@{args.k}={report[f'recall_at_{args.k}']:.3f}  "
+                  f"err={report['mean_abs_score_error']:.5f}  score p50={report['score_p50_ms']:.2f}ms", flush=True)
+        results.append(entry)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated catalog sizes")
+    parser.add_argument("--k", type=int, default=10, help="ranking depth for recall")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    encoder = load_encoder()
+    if encoder is None:
+        sys.exit("sentence-transformers is required: quantization applies to transformer embeddings only")
+
+    results = run(args, encoder)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"k": args.k, "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
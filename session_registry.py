@@ -0,0 +1,292 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from log_config import get_logger
+
+log = get_logger(__name__)
+
+# Idle calls are evicted after this many seconds without activity
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "900"))
+# Hard cap on the number of calls kept in memory per worker
+SESSION_MAX_CALLS = int(os.getenv("SESSION_MAX_CALLS", "500"))
+# Minimum seconds between opportunistic idle sweeps
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "30"))
+
+SUPPORTED_LANGUAGES = ("en", "hi", "gu")
+DEFAULT_LANGUAGE = "en"
+
+
+class CallState:
+    """All per-call state for one CallSid"""
+    __slots__ = (
+        "call_sid", "created_at", "last_access", "lock",
+        "chat", "language", "context", "retry_count",
+        "processing_queue", "processing_thread", "processing_result",
+        "cart", "customer", "history", "prompt_state", "store_version",
+        "caller_phone", "last_order", "prefetch",
+    )
+
+    def __init__(self, call_sid):
+        now = time.monotonic()
+        self.call_sid = call_sid
+        self.created_at = now
+        self.last_access = now
+        # Guards every read-modify-write of this call's state (cart, history, ...)
+        self.lock = threading.RLock()
+        self.chat = None
+        self.language = None
+        self.context = None
+        self.retry_count = None
+        self.processing_queue = None
+        self.processing_thread = None
+        self.processing_result = None
+        self.cart = None
+        self.customer = None
+        self.history = None
+        self.prompt_state = None  # state last sent to the model, for prompt deltas
+        self.store_version = 0  # version of the shared-store checkpoint this state reflects
+        self.caller_phone = None  # Twilio "From" number
+        self.last_order = None
+        self.prefetch = None  # Future of the caller-ID prefetch started by /twiml
+
+    def is_busy(self):
+        """True while a background worker is still processing a turn"""
+        thread = self.processing_thread
+        return thread is not None and thread.is_alive()
+
+
+class StateFieldView(MutableMapping):
+    """Dict-like view of one CallState field across all calls
+
+    Lets existing code keep using ``shopping_carts[call_sid]`` style access
+    while the registry owns the data and its lifetime.
+    """
+
+    def __init__(self, registry, field):
+        self._registry = registry
+        self._field = field
+
+    def __getitem__(self, call_sid):
+        state = self._registry.get(call_sid)
+        value = getattr(state, self._field) if state is not None else None
+        if value is None:
+            raise KeyError(call_sid)
+        return value
+
+    def __setitem__(self, call_sid, value):
+        state = self._registry.get(call_sid, create=True)
+        setattr(state, self._field, value)
+
+    def __delitem__(self, call_sid):
+        state = self._registry.get(call_sid)
+        if state is None or getattr(state, self._field) is None:
+            raise KeyError(call_sid)
+        setattr(state, self._field, None)
+
+    def __contains__(self, call_sid):
+        state = self._registry.get(call_sid)
+        return state is not None and getattr(state, self._field) is not None
+
+    def __iter__(self):
+        return iter([state.call_sid for state in self._registry.states()
+                     if getattr(state, self._field) is not None])
+
+    def __len__(self):
+        return sum(1 for state in self._registry.states()
+                   if getattr(state, self._field) is not None)
+
+    def __repr__(self):
+        return f"StateFieldView({self._field!r}, {dict(self)!r})"
+
+
+class SessionRegistry:
+    """Bounded registry of per-call state with idle-TTL and max-size eviction"""
+
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL, max_calls=SESSION_MAX_CALLS,
+                 sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.idle_ttl = idle_ttl
+        self.max_calls = max_calls
+        self.sweep_interval = sweep_interval
+        self._calls = OrderedDict()  # {call_sid: CallState}, least recently used first
+        self._lock = threading.RLock()
+        self._eviction_hooks = []
+        self._last_sweep = time.monotonic()
+        self._sweeper = None
+        self.evictions = {"idle": 0, "capacity": 0, "ended": 0}
+
+    # ---------------- Access ----------------
+    def get(self, call_sid, create=False):
+        """Return the CallState for call_sid, creating it if requested"""
+        evicted = []
+        with self._lock:
+            state = self._calls.get(call_sid)
+            if state is not None:
+                state.last_access = time.monotonic()
+                self._calls.move_to_end(call_sid)
+            elif create:
+                state = CallState(call_sid)
+                self._calls[call_sid] = state
+                evicted = self._collect_evictions(exclude=call_sid)
+        self._run_hooks(evicted)
+        return state
+
+    def lock(self, call_sid):
+        """Per-call lock serializing updates to one call's state"""
+        return self.get(call_sid, create=True).lock
+
+    def field(self, name):
+        """Return a dict-like view over one CallState field"""
+        if name not in CallState.__slots__ or name == "lock":
+            raise AttributeError(f"CallState has no field {name!r}")
+        return StateFieldView(self, name)
+
+    def states(self):
+        """Snapshot of all live call states"""
+        with self._lock:
+            return list(self._calls.values())
+
+    def __len__(self):
+        return len(self._calls)
+
+    def __contains__(self, call_sid):
+        return call_sid in self._calls
+
+    # ---------------- Eviction ----------------
+    def add_eviction_hook(self, hook):
+        """Register hook(state, reason) called after a call is evicted"""
+        self._eviction_hooks.append(hook)
+
+    def end_call(self, call_sid):
+        """Drop all state for a finished call"""
+        with self._lock:
+            state = self._calls.pop(call_sid, None)
+        if state is not None:
+            self._run_hooks([(state, "ended")])
+        return state is not None
+
+    def sweep(self):
+        """Evict idle calls now; returns the number evicted"""
+        with self._lock:
+            evicted = self._collect_evictions(force_sweep=True)
+        self._run_hooks(evicted)
+        return len(evicted)
+
+    def _collect_evictions(self, exclude=None, force_sweep=False):
+        """Pop idle and over-capacity calls; caller must hold the lock"""
+        evicted = []
+        now = time.monotonic()
+
+        if force_sweep or now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            for call_sid, state in list(self._calls.items()):
+                if call_sid == exclude or state.is_busy():
+                    continue
+                if now - state.last_access > self.idle_ttl:
+                    evicted.append((self._calls.pop(call_sid), "idle"))
+
+        if len(self._calls) > self.max_calls:
+            for call_sid, state in list(self._calls.items()):
+                if len(self._calls) <= self.max_calls:
+                    break
+                if call_sid == exclude or state.is_busy():
+                    continue
+                evicted.append((self._calls.pop(call_sid), "capacity"))
+
+        return evicted
+
+    def _run_hooks(self, evicted):
+        """Run eviction hooks outside the registry lock"""
+        for state, reason in evicted:
+            with self._lock:
+                self.evictions[reason] += 1
+            log.debug("Evicting call state (%s)", reason, extra={"call_sid": state.call_sid})
+            for hook in self._eviction_hooks:
+                try:
+                    hook(state, reason)
+                except Exception as e:
+                    log.error("Eviction hook failed: %s", e, extra={"call_sid": state.call_sid})
+
+    def start_sweeper(self):
+        """Start a daemon thread that sweeps idle calls periodically"""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return self._sweeper
+
+        def _loop():
+            while True:
+                time.sleep(self.sweep_interval)
+                self.sweep()
+
+        self._sweeper = threading.Thread(target=_loop, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+        return self._sweeper
+
+    # ---------------- Gauges ----------------
+    def memory_usage(self):
+        """Approximate bytes held by all call states"""
+        seen = set()
+        total = 0
+        for state in self.states():
+            total += _deep_sizeof(state, seen)
+        return total
+
+    def stats(self):
+        """Summary of registry size, evictions and memory"""
+        states = self.states()
+        return {
+            "active_calls": len(states),
+            "busy_calls": sum(1 for state in states if state.is_busy()),
+            "max_calls": self.max_calls,
+            "idle_ttl_seconds": self.idle_ttl,
+            "evictions": dict(self.evictions),
+            "approx_memory_bytes": self.memory_usage(),
+        }
+
+
+def _deep_sizeof(obj, seen):
+    """Recursive sys.getsizeof over plain containers; opaque objects count shallow"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _deep_sizeof(key, seen) + _deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for value in obj:
+            size += _deep_sizeof(value, seen)
+    elif isinstance(obj, CallState):
+        for name in CallState.__slots__:
+            if name != "lock":
+                size += _deep_sizeof(getattr(obj, name), seen)
+    elif hasattr(obj, "__slots__") and not isinstance(obj, type):
+        for name in obj.__slots__:
+            size += _deep_sizeof(getattr(obj, name, None), seen)
+    return size
+
+
+# Global instance shared by main.py and cart_manager.py
+registry = SessionRegistry()
+
+
+def get_session_language(call_sid):
+    """Get language for specific session; never shared between calls"""
+    state = registry.get(call_sid)
+    if state is None or state.language is None:
+        return DEFAULT_LANGUAGE
+    return state.language
+
+
+def set_session_language(call_sid, lang_code):
+    """Set language for specific session, keeping the current one if unsupported"""
+    state = registry.get(call_sid, create=True)
+    with state.lock:
+        if lang_code in SUPPORTED_LANGUAGES:
+            state.language = lang_code
+        elif state.language is None:
+            state.language = DEFAULT_LANGUAGE
+        return state.language
@@ -1,8 +1,28 @@
+import glob
 import json
-from datetime import datetime
-import gspread
-from google.oauth2.service_account import Credentials
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from circuit_breaker import CircuitBreaker, CircuitOpen, GuardedWorksheet
+from metrics import metrics, timed
+from log_config import get_logger
+
+# Consecutive failed Sheets requests that open the circuit, and seconds before it is probed again
+SHEETS_BREAKER_FAILURES = int(os.getenv("SHEETS_BREAKER_FAILURES", "5"))
+SHEETS_BREAKER_RESET = float(os.getenv("SHEETS_BREAKER_RESET", "30"))
+# Last inventory read from Sheets, served while Sheets is unavailable
+INVENTORY_SNAPSHOT_PATH = os.getenv("INVENTORY_SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "inventory_snapshot.json"))
+# Minimum seconds between snapshot writes
+INVENTORY_SNAPSHOT_INTERVAL = float(os.getenv("INVENTORY_SNAPSHOT_INTERVAL", "60"))
+# Writes that failed, kept for replay (one file per worker process: <path>.<pid>)
+SHEETS_OUTBOX_PATH = os.getenv("SHEETS_OUTBOX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sheets_outbox.json"))
+# Seconds between replay attempts while writes are queued
+SHEETS_REPLAY_INTERVAL = float(os.getenv("SHEETS_REPLAY_INTERVAL", "10"))
+
+log = get_logger(__name__)
 
 # These will be initialized by main.py
 inventory_sheet = None
@@ -10,15 +30,75 @@ customers_sheet = None
 orders_sheet = None
 carts_sheet = None
 
+# ---------------- Circuit breaker ----------------
+# Every worksheet request goes through one breaker: when Sheets is down, calls
+# fail immediately instead of each waiting for the HTTP timeout
+sheets_breaker = CircuitBreaker("sheets", SHEETS_BREAKER_FAILURES, SHEETS_BREAKER_RESET)
+
+def guard_worksheets(recover=True):
+    """Route the attached worksheets through sheets_breaker and pick up writes left by dead workers"""
+    global inventory_sheet, customers_sheet, orders_sheet, carts_sheet
+    inventory_sheet, customers_sheet, orders_sheet, carts_sheet = (
+        sheet if sheet is None or isinstance(sheet, GuardedWorksheet) else GuardedWorksheet(sheet, sheets_breaker)
+        for sheet in (inventory_sheet, customers_sheet, orders_sheet, carts_sheet)
+    )
+    if recover:
+        recover_outbox()
+
+def worksheets_attached():
+    """True once every worksheet is attached (main.connect_google_sheets succeeded)"""
+    return all(sheet is not None for sheet in (inventory_sheet, customers_sheet, orders_sheet, carts_sheet))
+
+# ---------------- Inventory snapshot ----------------
+_inventory_snapshot = None
+_snapshot_saved_at = None
+_snapshot_lock = threading.Lock()
+
+def _write_snapshot(records):
+    """Atomically replace the snapshot file"""
+    tmp_path = f"{INVENTORY_SNAPSHOT_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(records, f)
+        os.replace(tmp_path, INVENTORY_SNAPSHOT_PATH)
+    except OSError as e:
+        log.warning("Could not write inventory snapshot: %s", e)
+
+def _remember_inventory(records):
+    """Keep the latest good inventory, persisting it at most every INVENTORY_SNAPSHOT_INTERVAL"""
+    global _inventory_snapshot, _snapshot_saved_at
+    _inventory_snapshot = records
+    now = time.monotonic()
+    with _snapshot_lock:
+        if _snapshot_saved_at is not None and now - _snapshot_saved_at < INVENTORY_SNAPSHOT_INTERVAL:
+            return
+        _snapshot_saved_at = now
+    threading.Thread(target=_write_snapshot, args=(records,), name="inventory-snapshot", daemon=True).start()
+
+def _snapshot_inventory():
+    """Last known good inventory (from memory, else from the snapshot file); empty if there is none"""
+    global _inventory_snapshot
+    if _inventory_snapshot is None:
+        try:
+            with open(INVENTORY_SNAPSHOT_PATH) as f:
+                _inventory_snapshot = json.load(f)
+            log.warning("Loaded inventory snapshot with %d items from %s", len(_inventory_snapshot), INVENTORY_SNAPSHOT_PATH)
+        except (OSError, ValueError) as e:
+            log.error("No inventory snapshot available: %s", e)
+            return []
+    metrics.inc("inventory_snapshot_served")
+    return _inventory_snapshot
+
+@timed("sheets.get_inventory")
 def get_inventory():
-    """Get current inventory from Google Sheets"""
+    """Get current inventory from Google Sheets; the last good copy while Sheets is unavailable"""
     try:
         if inventory_sheet is None:
-            print("DEBUG: inventory_sheet is None, using fallback data")
+            log.debug("inventory_sheet is None, using fallback data")
             raise Exception("Inventory sheet not initialized")
             
         records = inventory_sheet.get_all_records()
-        print(f"DEBUG: Found {len(records)} inventory records from Google Sheets")
+        log.debug("Found %d inventory records from Google Sheets", len(records))
         
         # Ensure numeric values are properly converted
         for record in records:
@@ -33,100 +113,79 @@ def get_inventory():
                 except:
                     record["Price (USD)"] = 0.0
         
-        # Print inventory for debugging
-        print("DEBUG: Inventory contents:")
-        for i, item in enumerate(records[:5]):  # Print first 5 items
-            print(f"  {i+1}. {item.get('Item Name', 'N/A')} - Qty: {item.get('Quantity', 0)} - Price: ${item.get('Price (USD)', 0):.2f}")
-        if len(records) > 5:
-            print(f"  ... and {len(records) - 5} more items")
+        # Log a sample of the inventory for debugging
+        if log.isEnabledFor(logging.DEBUG):
+            for i, item in enumerate(records[:5]):  # First 5 items
+                log.debug("Inventory %d. %s - Qty: %s - Price: $%.2f", i + 1, item.get('Item Name', 'N/A'),
+                          item.get('Quantity', 0), item.get('Price (USD)', 0))
+            if len(records) > 5:
+                log.debug("Inventory ... and %d more items", len(records) - 5)
             
+        _remember_inventory(records)
         return records
+    except CircuitOpen:
+        log.debug("Sheets circuit open; serving inventory snapshot")
+        return _snapshot_inventory()
     except Exception as e:
-        print(f"Error getting inventory: {e}")
-        # Fallback to hardcoded data if Sheets is unavailable
-        fallback_data = [
-            {"Item Name": "Chora Black Eyed Peas 4 lb", "Category": "Grocery", "Quantity": 3, "Price (USD)": 10.49, "Description": "Organic black eyed peas", "Tags": "pulses, organic, grocery"},
-            {"Item Name": "Milk Bikis Minis Wafflez 7 oz", "Category": "Snacks", "Quantity": 5, "Price (USD)": 2.29, "Description": "Crispy mini waffle biscuits", "Tags": "biscuits, snacks, crispy"},
-            {"Item Name": "Maggi Masala Noodles", "Category": "Food", "Quantity": 10, "Price (USD)": 1.99, "Description": "Instant masala noodles", "Tags": "noodles, instant, masala"},
-            {"Item Name": "Tomato Ketchup", "Category": "Condiments", "Quantity": 8, "Price (USD)": 3.49, "Description": "Sweet and tangy tomato ketchup", "Tags": "ketchup, tomato, condiments"},
-            {"Item Name": "Basmati Rice 5kg", "Category": "Grocery", "Quantity": 4, "Price (USD)": 15.99, "Description": "Premium long grain basmati rice", "Tags": "rice, basmati, grocery"},
-            {"Item Name": "Horse Gram 2 lb", "Category": "Grocery", "Quantity": 2, "Price (USD)": 4.89, "Description": "Protein-rich lentil", "Tags": "lentils, pulses, protein"},
-        ]
-        print("DEBUG: Using fallback inventory data")
-        return fallback_data
+        log.error("Error getting inventory, serving last snapshot: %s", e)
+        return _snapshot_inventory()
+
+def normalize_phone(phone):
+    """Last 10 digits of a phone number, so "+1 (555) 123-4567" matches 5551234567"""
+    digits = "".join(ch for ch in str(phone or "") if ch.isdigit())
+    return digits[-10:]
 
+@timed("sheets.get_customer_by_phone")
 def get_customer_by_phone(phone):
     """Get customer details by phone number"""
     try:
+        wanted = normalize_phone(phone)
+        if not wanted:
+            return None
         customers = customers_sheet.get_all_records()
         for customer in customers:
-            if customer["Phone Number"] == phone:
+            # Sheets returns numeric-looking cells as numbers, so compare digits
+            if normalize_phone(customer["Phone Number"]) == wanted:
                 return customer
         return None
+    except CircuitOpen:
+        return None
     except Exception as e:
-        print(f"Error getting customer: {e}")
+        log.error("Error getting customer: %s", e)
         return None
 
-def save_customer(customer_data):
-    """Save or update customer details"""
+@timed("sheets.get_last_order")
+def get_last_order(phone):
+    """Most recent order placed from a phone number"""
     try:
-        customers = customers_sheet.get_all_records()
-        
-        # Find if customer already exists
-        for i, customer in enumerate(customers):
-            if customer["Phone Number"] == customer_data["Phone Number"]:
-                # Update existing customer
-                row_num = i + 2  # +2 for header row and 0-based index
-                for col_num, key in enumerate(["Phone Number", "Name", "Address", "City", "State", "Zip", "Last Order Date"], 1):
-                    if key in customer_data:
-                        customers_sheet.update_cell(row_num, col_num, customer_data[key])
-                return
-        
-        # Add new customer
-        customers_sheet.append_row([
-            customer_data.get("Phone Number", ""),
-            customer_data.get("Name", ""),
-            customer_data.get("Address", ""),
-            customer_data.get("City", ""),
-            customer_data.get("State", ""),
-            customer_data.get("Zip", ""),
-            customer_data.get("Last Order Date", "")
-        ])
-    except Exception as e:
-        print(f"Error saving customer: {e}")
-
-def save_cart(session_id, cart_data):
-    """Save cart to Google Sheets"""
-    try:
-        if carts_sheet is None:
-            print("DEBUG: carts_sheet is None, cannot save to Google Sheets")
-            return
-            
-        carts = carts_sheet.get_all_records()
-        
-        # Find if cart already exists for this session
-        for i, cart in enumerate(carts):
-            if cart["Session ID"] == session_id:
-                # Update existing cart
-                row_num = i + 2  # +2 for header row and 0-based index
-                carts_sheet.update_cell(row_num, 2, cart_data.get("Customer Phone", ""))
-                carts_sheet.update_cell(row_num, 3, json.dumps(cart_data.get("Items", [])))
-                carts_sheet.update_cell(row_num, 4, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                print(f"DEBUG: Updated existing cart for session {session_id}")
-                return
-        
-        # Add new cart
-        carts_sheet.append_row([
-            session_id,
-            cart_data.get("Customer Phone", ""),
-            json.dumps(cart_data.get("Items", [])),
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ])
-        print(f"DEBUG: Added new cart for session {session_id}")
+        wanted = normalize_phone(phone)
+        if not wanted:
+            return None
+        last = None
+        for order in orders_sheet.get_all_records():
+            if normalize_phone(order.get("Customer Phone")) == wanted:
+                # Order IDs start with a timestamp, so the largest is the latest
+                if last is None or str(order.get("Order ID", "")) > str(last.get("Order ID", "")):
+                    last = order
+        if last is None:
+            return None
+        try:
+            items = json.loads(last.get("Items JSON") or "[]")
+        except ValueError:
+            items = []
+        return {
+            "Order ID": str(last.get("Order ID", "")),
+            "Items": items,
+            "Total": last.get("Total", 0),
+            "Date": last.get("Date", ""),
+        }
+    except CircuitOpen:
+        return None
     except Exception as e:
-        print(f"Error saving cart: {e}")
-        print("DEBUG: Cart will only be stored locally")
+        log.error("Error getting last order: %s", e)
+        return None
 
+@timed("sheets.load_cart")
 def load_cart(session_id):
     """Load cart from Google Sheets"""
     try:
@@ -144,19 +203,347 @@ def load_cart(session_id):
                     "Last Updated": cart.get("Last Updated", "")
                 }
         return None
+    except CircuitOpen:
+        return None
     except Exception as e:
-        print(f"Error loading cart: {e}")
+        log.error("Error loading cart: %s", e)
         return None
 
-def delete_cart(session_id):
-    """Delete cart from Google Sheets"""
+@timed("sheets.load_cart_by_phone")
+def load_cart_by_phone(phone):
+    """Most recently updated non-empty cart saved under a phone number"""
     try:
-        carts = carts_sheet.get_all_records()
-        for i, cart in enumerate(carts):
-            if cart["Session ID"] == session_id:
-                carts_sheet.delete_rows(i + 2)  # +2 for header row and 0-based index
-                return True
-        return False
+        wanted = normalize_phone(phone)
+        if not wanted:
+            return None
+        latest = None
+        for cart in carts_sheet.get_all_records():
+            if normalize_phone(cart.get("Customer Phone")) != wanted:
+                continue
+            try:
+                items = json.loads(cart["Items JSON"])
+            except (KeyError, TypeError, ValueError):
+                items = []
+            if items and (latest is None or str(cart.get("Last Updated", "")) > latest["Last Updated"]):
+                latest = {
+                    "Session ID": cart.get("Session ID", ""),
+                    "Customer Phone": cart.get("Customer Phone", ""),
+                    "Items": items,
+                    "Last Updated": str(cart.get("Last Updated", "")),
+                }
+        return latest
+    except CircuitOpen:
+        return None
     except Exception as e:
-        print(f"Error deleting cart: {e}")
-        return False
\ No newline at end of file
+        log.error("Error loading cart by phone: %s", e)
+        return None
+
+# ---------------- Writes ----------------
+# A write that fails transiently (circuit open, network error, 429 or 5xx) is
+# queued under a key and replayed in order once Sheets answers again. Later
+# writes for the same key replace a queued one, so a cart is written once with
+# its latest contents. The queue is persisted so writes survive a restart.
+# A write that fails for good (e.g. a rejected row) is logged and moved to a
+# dead-letter file instead, so it never blocks the writes queued behind it.
+
+def _save_customer(customer_data):
+    customers = customers_sheet.get_all_records()
+    
+    # Find if customer already exists
+    for i, customer in enumerate(customers):
+        if customer["Phone Number"] == customer_data["Phone Number"]:
+            # Update existing customer
+            row_num = i + 2  # +2 for header row and 0-based index
+            for col_num, key in enumerate(["Phone Number", "Name", "Address", "City", "State", "Zip", "Last Order Date"], 1):
+                if key in customer_data:
+                    customers_sheet.update_cell(row_num, col_num, customer_data[key])
+            return
+    
+    # Add new customer
+    customers_sheet.append_row([
+        customer_data.get("Phone Number", ""),
+        customer_data.get("Name", ""),
+        customer_data.get("Address", ""),
+        customer_data.get("City", ""),
+        customer_data.get("State", ""),
+        customer_data.get("Zip", ""),
+        customer_data.get("Last Order Date", "")
+    ])
+
+def _save_cart(session_id, cart_data):
+    if carts_sheet is None:
+        log.debug("carts_sheet is None, cannot save to Google Sheets")
+        return
+        
+    carts = carts_sheet.get_all_records()
+    updated = cart_data.get("Last Updated") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    # Find if cart already exists for this session
+    for i, cart in enumerate(carts):
+        if cart["Session ID"] == session_id:
+            # Update existing cart
+            row_num = i + 2  # +2 for header row and 0-based index
+            carts_sheet.update_cell(row_num, 2, cart_data.get("Customer Phone", ""))
+            carts_sheet.update_cell(row_num, 3, json.dumps(cart_data.get("Items", [])))
+            carts_sheet.update_cell(row_num, 4, updated)
+            log.debug("Updated existing cart", extra={"call_sid": session_id})
+            return
+    
+    # Add new cart
+    carts_sheet.append_row([
+        session_id,
+        cart_data.get("Customer Phone", ""),
+        json.dumps(cart_data.get("Items", [])),
+        updated
+    ])
+    log.debug("Added new cart", extra={"call_sid": session_id})
+
+def _delete_cart(session_id):
+    carts = carts_sheet.get_all_records()
+    for i, cart in enumerate(carts):
+        if cart["Session ID"] == session_id:
+            carts_sheet.delete_rows(i + 2)  # +2 for header row and 0-based index
+            return True
+    return False
+
+def _append_order(order_row, may_have_landed=False):
+    # A failed append may still have been written; only then look for the row first
+    if may_have_landed:
+        order_id = str(order_row[0])
+        if any(str(order.get("Order ID", "")) == order_id for order in orders_sheet.get_all_records()):
+            log.info("Order %s already in the Orders sheet", order_id)
+            return
+    orders_sheet.append_row(order_row)
+
+def _decrement_stock(items, applied=None):
+    """Subtract ordered quantities from the Inventory sheet, reading current stock first.
+
+    `applied` holds the indices of items already subtracted. It grows as each
+    cell is written and is queued with the write, so replaying a partly
+    applied decrement skips the items it already took from stock.
+    """
+    applied = [] if applied is None else applied
+    for i, record in enumerate(inventory_sheet.get_all_records()):
+        index = next((n for n, item in enumerate(items)
+                      if n not in applied and item["name"] == record.get("Item Name")), None)
+        if index is not None:
+            stock = int(record["Quantity"]) if str(record.get("Quantity", "")).isdigit() else 0
+            inventory_sheet.update_cell(i + 2, 3, stock - items[index]["quantity"])  # +2 because of header row
+            applied.append(index)
+
+_WRITES = {
+    "save_customer": _save_customer,
+    "save_cart": _save_cart,
+    "delete_cart": _delete_cart,
+    "append_order": _append_order,
+    "decrement_stock": _decrement_stock,
+}
+
+# Worksheet each write needs; a write before it is attached waits in the queue
+_WRITE_SHEETS = {
+    "save_customer": "customers_sheet",
+    "save_cart": "carts_sheet",
+    "delete_cart": "carts_sheet",
+    "append_order": "orders_sheet",
+    "decrement_stock": "inventory_sheet",
+}
+
+# Appends that fail after reaching Sheets (e.g. a timeout) may have been
+# written; they are queued with may_have_landed=True so the replay checks
+_APPENDS = {"append_order"}
+
+_outbox = OrderedDict()  # key -> [operation, args]
+_outbox_lock = threading.Lock()
+_replay_wanted = threading.Event()
+_replayer = None
+dead_letters = deque(maxlen=100)  # recent writes that failed for good: (op, args, error)
+
+def _outbox_file(pid=None):
+    return f"{SHEETS_OUTBOX_PATH}.{pid or os.getpid()}"
+
+def _is_transient(error):
+    """True if a failed write may succeed later: circuit open, network error, rate limit or server error"""
+    if isinstance(error, (CircuitOpen, ConnectionError, TimeoutError, OSError)):
+        return True
+    # gspread.exceptions.APIError carries the HTTP response
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+def _apply(op, args):
+    """Run a write; a worksheet that is not attached yet counts as Sheets being unavailable"""
+    if globals()[_WRITE_SHEETS[op]] is None:
+        raise ConnectionError(f"{_WRITE_SHEETS[op]} is not attached")
+    return _WRITES[op](*args)
+
+def _dead_letter(op, args, error):
+    """Set aside a write that can never succeed, appending it to <outbox path>.dead for an operator"""
+    log.error("Sheets write %s failed permanently, moved to dead letters: %s", op, error)
+    metrics.inc("sheets_writes_dead_lettered", op=op)
+    dead_letters.append((op, list(args), repr(error)))
+    try:
+        with open(f"{SHEETS_OUTBOX_PATH}.dead", "a") as f:
+            f.write(json.dumps({"op": op, "args": list(args), "error": repr(error)}, default=str) + "\n")
+    except OSError as e:
+        log.warning("Could not record dead-lettered Sheets write: %s", e)
+
+def _persist_outbox():
+    """Write the queue to this process's outbox file (removed when empty); caller holds _outbox_lock"""
+    path = _outbox_file()
+    try:
+        if not _outbox:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(path + ".tmp", "w") as f:
+            json.dump([[list(key), op, args] for key, (op, args) in _outbox.items()], f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        log.warning("Could not persist queued Sheets writes: %s", e)
+
+def _enqueue(key, op, args):
+    global _replayer
+    with _outbox_lock:
+        _outbox.pop(key, None)
+        _outbox[key] = [op, list(args)]
+        _persist_outbox()
+        if _replayer is None:
+            _replayer = threading.Thread(target=_replay_loop, name="sheets-replay", daemon=True)
+            _replayer.start()
+    metrics.inc("sheets_writes_queued", op=op)
+
+def _write(key, op, *args):
+    """Apply a write now, or queue it for replay if Sheets is failing or writes for `key` are queued"""
+    with _outbox_lock:
+        queued = key in _outbox
+    if not queued:
+        try:
+            return _apply(op, args)
+        except CircuitOpen:
+            log.debug("Sheets circuit open; queueing %s", op)
+        except Exception as e:
+            if not _is_transient(e):
+                _dead_letter(op, args, e)
+                return None
+            log.error("Error in Sheets write %s, queued for replay: %s", op, e)
+            if op in _APPENDS:
+                args = args + (True,)
+    _enqueue(key, op, args)
+    return None
+
+def replay_writes():
+    """Apply queued writes oldest first; stops at the first transient failure. Returns the number applied"""
+    applied = 0
+    while True:
+        with _outbox_lock:
+            if not _outbox:
+                return applied
+            key, entry = next(iter(_outbox.items()))
+        op, args = entry
+        try:
+            _apply(op, args)
+        except Exception as e:
+            if _is_transient(e):
+                if not isinstance(e, CircuitOpen):
+                    log.warning("Replaying Sheets write %s failed: %s", op, e)
+                # Keep any progress the write recorded in its arguments
+                with _outbox_lock:
+                    _persist_outbox()
+                return applied
+            _dead_letter(op, args, e)
+            with _outbox_lock:
+                if _outbox.get(key) is entry:
+                    del _outbox[key]
+                _persist_outbox()
+            continue
+        with _outbox_lock:
+            # Unless a newer write for the key was queued meanwhile
+            if _outbox.get(key) is entry:
+                del _outbox[key]
+            _persist_outbox()
+        applied += 1
+        metrics.inc("sheets_writes_replayed", op=op)
+
+def _replay_loop():
+    while True:
+        _replay_wanted.wait(SHEETS_REPLAY_INTERVAL)
+        _replay_wanted.clear()
+        if _outbox:
+            applied = replay_writes()
+            if applied:
+                log.info("Replayed %d queued Sheets writes (%d still queued)", applied, len(_outbox))
+
+# Sheets is back: flush the queue without waiting for the next interval
+sheets_breaker.add_close_listener(lambda: _replay_wanted.set())
+
+def _reset_outbox_after_fork():
+    """A forked worker starts with an empty queue and no replay thread of its own yet"""
+    global _outbox, _outbox_lock, _replay_wanted, _replayer
+    _outbox = OrderedDict()
+    _outbox_lock = threading.Lock()
+    _replay_wanted = threading.Event()
+    _replayer = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_outbox_after_fork)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def recover_outbox():
+    """Adopt writes queued by worker processes that exited before replaying them"""
+    recovered = 0
+    for path in glob.glob(glob.escape(SHEETS_OUTBOX_PATH) + ".*"):
+        pid = path.rsplit(".", 1)[-1]
+        if not pid.isdigit() or int(pid) == os.getpid() or _pid_alive(int(pid)):
+            continue
+        # Renaming claims the file, so two workers never replay the same writes
+        claimed = _outbox_file() + ".recovering"
+        try:
+            os.rename(path, claimed)
+            with open(claimed) as f:
+                entries = json.load(f)
+            os.remove(claimed)
+        except (OSError, ValueError) as e:
+            log.warning("Could not recover queued Sheets writes from %s: %s", path, e)
+            continue
+        for key, op, args in entries:
+            if op in _WRITES:
+                _enqueue(tuple(key), op, args)
+                recovered += 1
+    if recovered:
+        log.warning("Recovered %d queued Sheets writes", recovered)
+        _replay_wanted.set()
+    return recovered
+
+@timed("sheets.save_customer")
+def save_customer(customer_data):
+    """Save or update customer details"""
+    _write(("customer", str(customer_data.get("Phone Number", ""))), "save_customer", customer_data)
+
+@timed("sheets.save_cart")
+def save_cart(session_id, cart_data):
+    """Save cart to Google Sheets"""
+    cart_data = {**cart_data, "Last Updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    _write(("cart", session_id), "save_cart", session_id, cart_data)
+
+@timed("sheets.delete_cart")
+def delete_cart(session_id):
+    """Delete cart from Google Sheets"""
+    return bool(_write(("cart", session_id), "delete_cart", session_id))
+
+@timed("sheets.append_order")
+def append_order(order_row):
+    """Add a row to the Orders sheet"""
+    _write(("order", str(order_row[0])), "append_order", order_row)
+
+@timed("sheets.update_inventory")
+def decrement_stock(order_id, items):
+    """Reduce stock in the Inventory sheet by the quantities of an order's items"""
+    items = [{"name": item["name"], "quantity": item["quantity"]} for item in items]
+    _write(("stock", str(order_id)), "decrement_stock", items, [])
@@ -0,0 +1,268 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from conversation import ConversationHistory
+from log_config import get_logger
+from session_registry import registry, SESSION_IDLE_TTL
+
+# "memory" keeps state in this process only; "sqlite" shares it between uvicorn workers
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "call_state.db"))
+# A worker that dies mid-turn releases its claim on the call after this many seconds
+PROCESSING_CLAIM_TTL = float(os.getenv("PROCESSING_CLAIM_TTL", "120"))
+
+log = get_logger(__name__)
+
+
+class StateStore:
+    """Key/value store for JSON-serializable call state, grouped by namespace"""
+    # True when other processes can see what this store holds
+    shared = False
+
+    def get(self, namespace, key):
+        raise NotImplementedError
+
+    def set(self, namespace, key, value, ttl=None):
+        raise NotImplementedError
+
+    def set_if_absent(self, namespace, key, value, ttl=None):
+        """Store value only if the key is missing or expired; True if stored"""
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+
+class MemoryStateStore(StateStore):
+    """Process-local store; the default for a single worker"""
+
+    def __init__(self):
+        self._data = {}  # {(namespace, key): (value, expires_at)}
+        self._lock = threading.Lock()
+
+    def _live(self, entry, now):
+        return entry is not None and (entry[1] is None or entry[1] > now)
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if not self._live(entry, time.time()):
+                self._data.pop((namespace, key), None)
+                return None
+            return entry[0]
+
+    def set(self, namespace, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[(namespace, key)] = (value, expires_at)
+
+    def set_if_absent(self, namespace, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            if self._live(self._data.get((namespace, key)), now):
+                return False
+            self._data[(namespace, key)] = (value, now + ttl if ttl else None)
+            return True
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+
+class SQLiteStateStore(StateStore):
+    """Store backed by one SQLite file in WAL mode, shared by all local workers"""
+    shared = True
+    # Expired rows are purged after this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path=STATE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        # A connection must never be used in a process forked after it was opened
+        os.register_at_fork(after_in_child=self._forget_connections)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            )""")
+
+    def _connect(self):
+        """One connection per thread; sqlite3 connections are not thread-safe"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _forget_connections(self):
+        self._local = threading.local()
+
+    def get(self, namespace, key):
+        row = self._connect().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        self._connect().execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), expires_at)
+        )
+        self._maybe_purge()
+
+    def set_if_absent(self, namespace, key, value, ttl=None):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM state WHERE namespace = ? AND key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (namespace, key, now)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl if ttl else None)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def delete(self, namespace, key):
+        self._connect().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def _maybe_purge(self):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._connect().execute(
+                "DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            )
+
+
+def create_state_store(backend=STATE_BACKEND):
+    """Build the configured state store"""
+    if backend == "sqlite":
+        log.info("Using shared SQLite state store at %s", STATE_DB_PATH)
+        return SQLiteStateStore()
+    if backend != "memory":
+        log.warning("Unknown STATE_BACKEND %r, using in-memory state", backend)
+    return MemoryStateStore()
+
+
+# Global instance
+state_store = create_state_store()
+
+
+# ---------------- Call state synchronization ----------------
+# Twilio turns for one call are sequential, so call state is loaded from the
+# store when a turn starts and written back when it ends. Chat sessions are not
+# serializable; a worker picking up a call it did not serve last rebuilds the
+# Gemini session from the call-state summary instead.
+
+def hydrate_call(call_sid):
+    """Load newer call state written by another worker into the local registry"""
+    if not state_store.shared:
+        return False
+    doc = state_store.get("call", call_sid)
+    state = registry.get(call_sid, create=True)
+    with state.lock:
+        if not doc or doc["version"] <= state.store_version:
+            return False
+        state.cart = doc.get("cart")
+        state.customer = doc.get("customer")
+        state.language = doc.get("language")
+        state.caller_phone = doc.get("caller_phone")
+        state.last_order = doc.get("last_order")
+        state.history = ConversationHistory.from_pairs(doc.get("history", []))
+        # Our chat session (if any) missed the turns served elsewhere
+        state.chat = None
+        state.prompt_state = None
+        state.store_version = doc["version"]
+    log.debug("Hydrated call from shared state (version %d)", doc["version"], extra={"call_sid": call_sid})
+    return True
+
+
+def checkpoint_call(call_sid):
+    """Write the serializable part of a call's state back to the store"""
+    if not state_store.shared:
+        return False
+    state = registry.get(call_sid)
+    if state is None:
+        return False
+    with state.lock:
+        state.store_version += 1
+        doc = {
+            "version": state.store_version,
+            "cart": state.cart,
+            "customer": state.customer,
+            "language": state.language,
+            "caller_phone": state.caller_phone,
+            "last_order": state.last_order,
+            "history": state.history.as_pairs() if state.history is not None else [],
+        }
+        state_store.set("call", call_sid, doc, ttl=SESSION_IDLE_TTL)
+    return True
+
+
+def claim_turn(call_sid):
+    """Claim the call for one turn so no other worker starts processing it too"""
+    if not state_store.shared:
+        return True
+    return state_store.set_if_absent("processing", call_sid, os.getpid(), ttl=PROCESSING_CLAIM_TTL)
+
+
+def publish_result(call_sid, result):
+    """Make a finished turn's result visible to whichever worker serves /check-status"""
+    if state_store.shared:
+        # Only in the store: a copy kept here would outlive its clearing by another worker
+        state_store.set("result", call_sid, result, ttl=PROCESSING_CLAIM_TTL)
+        state_store.delete("processing", call_sid)
+    else:
+        registry.field("processing_result")[call_sid] = result
+
+
+def release_turn(call_sid):
+    """Drop this worker's claim on the call (e.g. after a failed turn)"""
+    if state_store.shared:
+        state_store.delete("processing", call_sid)
+
+
+def fetch_result(call_sid):
+    """Finished result for a call, from the shared store if there is one, else this worker"""
+    if state_store.shared:
+        return state_store.get("result", call_sid)
+    return registry.field("processing_result").get(call_sid)
+
+
+def clear_result(call_sid):
+    """Forget a delivered (or superseded) result"""
+    if state_store.shared:
+        state_store.delete("result", call_sid)
+    else:
+        registry.field("processing_result").pop(call_sid, None)
+
+
+def release_call(call_sid):
+    """Remove all shared state for a finished call"""
+    if state_store.shared:
+        for namespace in ("call", "result", "processing"):
+            state_store.delete(namespace, call_sid)
+
+
+def is_processing(call_sid):
+    """True if any worker currently holds the turn claim for this call"""
+    if not state_store.shared:
+        return False
+    return state_store.get("processing", call_sid) is not None
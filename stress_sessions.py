@@ -0,0 +1,164 @@
+"""Concurrency stress test for per-call session state.
+
+Simulates many simultaneous calls in one process: each call gets several
+worker threads adding items to the same cart, switching its own language and
+appending conversation history, while other calls do the same. Afterwards
+every cart must hold exactly the quantities that were added (no lost updates)
+and every call must still report its own language (no cross-talk).
+
+Runs without Google Sheets: the Inventory and Carts worksheets are in-memory
+stand-ins with configurable latency (the inventory seeded with a synthetic
+catalog in stock), so cart updates interleave the way they do against the
+real API.
+
+    python stress_sessions.py --calls 50 --threads 8 --adds 25 --sheet-latency 0.002
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import sheets_handler
+from fake_backends import generate_catalog
+from cart_manager import add_to_cart, add_to_conversation_history, shopping_carts, conversation_history
+from session_registry import registry, get_session_language, set_session_language, SUPPORTED_LANGUAGES
+from sheets_handler import get_inventory
+
+
+class InMemoryWorksheet:
+    """Minimal stand-in for a gspread worksheet with a fixed per-request latency"""
+
+    def __init__(self, header, latency, rows=()):
+        self.header = header
+        self.rows = [list(row) for row in rows]
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def get_all_records(self):
+        time.sleep(self.latency)
+        with self._lock:
+            return [dict(zip(self.header, row)) for row in self.rows]
+
+    def update_cell(self, row, col, value):
+        time.sleep(self.latency)
+        with self._lock:
+            self.rows[row - 2][col - 1] = value
+
+    def append_row(self, values):
+        time.sleep(self.latency)
+        with self._lock:
+            self.rows.append(list(values))
+
+
+def run(calls, threads_per_call, adds_per_thread, seed):
+    rng = random.Random(seed)
+    inventory = get_inventory()
+    names = [item["Item Name"] for item in inventory]
+
+    call_sids = [f"CA-stress-{i:04d}" for i in range(calls)]
+    call_languages = {call_sid: rng.choice(SUPPORTED_LANGUAGES) for call_sid in call_sids}
+    expected = {call_sid: {} for call_sid in call_sids}
+    expected_lock = threading.Lock()
+    errors = []
+    barrier = threading.Barrier(calls * threads_per_call)
+
+    def worker(call_sid, worker_seed):
+        local_rng = random.Random(worker_seed)
+        language = call_languages[call_sid]
+        added = {}
+        try:
+            barrier.wait()
+            for _ in range(adds_per_thread):
+                name = local_rng.choice(names)
+                success, message = add_to_cart(call_sid, name, 1)
+                if not success:
+                    errors.append(f"{call_sid}: add_to_cart failed for {name}: {message}")
+                    continue
+                added[name] = added.get(name, 0) + 1
+
+                set_session_language(call_sid, language)
+                add_to_conversation_history(call_sid, "user", f"add {name}")
+                if get_session_language(call_sid) != language:
+                    errors.append(f"{call_sid}: language cross-talk, saw {get_session_language(call_sid)}")
+        except Exception as e:
+            errors.append(f"{call_sid}: {e!r}")
+        with expected_lock:
+            for name, qty in added.items():
+                expected[call_sid][name] = expected[call_sid].get(name, 0) + qty
+
+    threads = []
+    for call_sid in call_sids:
+        for t in range(threads_per_call):
+            threads.append(threading.Thread(target=worker, args=(call_sid, rng.random())))
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    for call_sid in call_sids:
+        cart = shopping_carts.get(call_sid, {"items": [], "total": 0})
+        actual = {item["name"]: item["quantity"] for item in cart["items"]}
+        if actual != expected[call_sid]:
+            errors.append(f"{call_sid}: lost cart update, expected {expected[call_sid]} got {actual}")
+        expected_total = round(sum(item["subtotal"] for item in cart["items"]), 6)
+        if round(cart["total"], 6) != expected_total:
+            errors.append(f"{call_sid}: cart total {cart['total']} != sum of subtotals {expected_total}")
+        if get_session_language(call_sid) != call_languages[call_sid]:
+            errors.append(f"{call_sid}: final language {get_session_language(call_sid)} != {call_languages[call_sid]}")
+        if len(conversation_history.get(call_sid, [])) > 10:
+            errors.append(f"{call_sid}: conversation history exceeded its bound")
+
+    total_ops = calls * threads_per_call * adds_per_thread
+    print(f"{calls} calls x {threads_per_call} threads x {adds_per_thread} adds = {total_ops} cart updates in {elapsed:.2f}s "
+          f"({total_ops / elapsed:.0f} ops/s)")
+    print(f"Registry: {registry.stats()}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=8, help="worker threads per call")
+    parser.add_argument("--adds", type=int, default=25, help="add_to_cart calls per thread")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--sheet-latency", type=float, default=0.002,
+                        help="seconds per simulated Inventory/Carts sheet request")
+    parser.add_argument("--catalog-size", type=int, default=50, help="synthetic inventory rows")
+    args = parser.parse_args()
+
+    # Keep the report readable
+    logging.getLogger("sheets_handler").setLevel(logging.CRITICAL)
+
+    inventory_header = ["Item Name", "Category", "Quantity", "Price (USD)", "Description", "Tags"]
+    # Enough stock that every add succeeds
+    catalog = [dict(item, Quantity=1000) for item in generate_catalog(args.catalog_size)]
+    # Keep the run's inventory snapshot out of the real snapshot file
+    sheets_handler.INVENTORY_SNAPSHOT_PATH = os.path.join(tempfile.mkdtemp(), "inventory_snapshot.json")
+    sheets_handler.inventory_sheet = InMemoryWorksheet(
+        inventory_header, args.sheet_latency, ([item[key] for key in inventory_header] for item in catalog))
+    sheets_handler.carts_sheet = InMemoryWorksheet(
+        ["Session ID", "Customer Phone", "Items JSON", "Last Updated"], args.sheet_latency)
+    # Switch threads aggressively so unsynchronized read-modify-writes would interleave
+    sys.setswitchinterval(1e-5)
+
+    # Keep every simulated call resident for the duration of the run
+    registry.max_calls = max(registry.max_calls, args.calls)
+
+    errors = run(args.calls, args.threads, args.adds, args.seed)
+    if errors:
+        print(f"FAILED with {len(errors)} errors:")
+        for error in errors[:20]:
+            print(f"  {error}")
+        sys.exit(1)
+    print("OK: no lost cart updates and no language cross-talk")
+
+
+if __name__ == "__main__":
+    main()
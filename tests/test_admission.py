@@ -0,0 +1,35 @@
+"""Admission control for Gemini calls."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, Overloaded
+
+
+def test_full_with_no_queue_sheds_immediately():
+    controller = AdmissionController(max_concurrency=1, max_queue=0)
+    controller.acquire("CA-one")
+    with pytest.raises(Overloaded) as shed:
+        controller.acquire("CA-two")
+    assert shed.value.reason == "queue_full"
+    controller.release("CA-one")
+    assert controller.acquire("CA-two") == 0.0
+
+
+def test_queued_turn_gets_the_freed_slot():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, max_queue_wait=2.0)
+    controller.acquire("CA-one")
+    waited = []
+    waiter = threading.Thread(target=lambda: waited.append(controller.acquire("CA-two")))
+    waiter.start()
+    deadline = time.monotonic() + 2
+    while controller.stats()["queued"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    controller.release("CA-one")
+    waiter.join(timeout=2)
+    assert waited and controller.stats()["active"] == 1
@@ -0,0 +1,26 @@
+"""Caller-ID prefetch against in-memory worksheets."""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sheets_handler
+from caller_prefetch import _prefetch
+from fake_backends import FakeWorksheet
+from session_registry import registry
+
+CARTS_HEADER = ["Session ID", "Customer Phone", "Items JSON", "Last Updated"]
+
+
+def test_adopted_cart_moves_to_the_new_call(monkeypatch):
+    items = [{"name": "Deep Basmati Rice 200 g", "quantity": 1, "price": 7.59, "subtotal": 7.59}]
+    carts = FakeWorksheet("Carts", CARTS_HEADER, [["CA-earlier", "5551234567", json.dumps(items), "2026-10-18 10:00:00"]], latency_ms=0)
+    monkeypatch.setattr(sheets_handler, "carts_sheet", carts)
+    monkeypatch.setattr(sheets_handler, "customers_sheet", FakeWorksheet("Customers", ["Phone Number"], latency_ms=0))
+    monkeypatch.setattr(sheets_handler, "orders_sheet", FakeWorksheet("Orders", ["Order ID"], latency_ms=0))
+
+    _prefetch("CA-later", "+1 (555) 123-4567")
+
+    assert registry.get("CA-later").cart["items"] == items
+    assert [row[0] for row in carts.rows] == ["CA-later"]
@@ -0,0 +1,75 @@
+"""Turn deadlines and hedging in gemini_client, against the fake Gemini chat."""
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "0")
+os.environ.setdefault("FAKE_LLM_JITTER_MS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_backends
+import gemini_client
+from gemini_client import GeminiTimeout
+
+
+class SlowChat(fake_backends.FakeChatSession):
+    def __init__(self, model, history=None, delay=1.0):
+        super().__init__(model, history)
+        self.delay = delay
+
+    def send_message(self, content, **kwargs):
+        time.sleep(self.delay)
+        return super().send_message(content, **kwargs)
+
+
+def test_send_message_uses_only_sdk_keywords():
+    chat = fake_backends.FakeGenerativeModel().start_chat()
+    response, session = gemini_client.send_message(chat, "do you have basmati rice", hedge=False)
+    assert session is chat
+    assert response.candidates
+
+
+def test_deadline_is_enforced_without_a_transport_timeout():
+    chat = SlowChat(fake_backends.FakeGenerativeModel(), delay=1.0)
+    start = time.monotonic()
+    with pytest.raises(GeminiTimeout):
+        gemini_client.send_message(chat, "hello", deadline=0.2, hedge=False, retries=0)
+    assert time.monotonic() - start < 0.6
+
+
+def test_requests_run_in_the_callers_context():
+    from metrics import current_call_sid
+    seen = []
+
+    class RecordingChat(fake_backends.FakeChatSession):
+        def send_message(self, content, **kwargs):
+            seen.append(current_call_sid.get())
+            return super().send_message(content, **kwargs)
+
+    token = current_call_sid.set("CA-context")
+    try:
+        gemini_client.send_message(RecordingChat(fake_backends.FakeGenerativeModel()), "hello", hedge=False)
+    finally:
+        current_call_sid.reset(token)
+    assert seen == ["CA-context"]
+
+
+def test_timed_out_turn_continues_on_a_clean_chat():
+    from admission import llm_admission
+    chat = SlowChat(fake_backends.FakeGenerativeModel(), delay=0.5)
+    abandoned = llm_admission.stats()["abandoned"]
+    with pytest.raises(GeminiTimeout) as timeout:
+        gemini_client.send_message(chat, "add two basmati rice", deadline=0.1, hedge=False, retries=0)
+    fresh = timeout.value.chat
+    assert fresh is not chat and fresh.history == []
+    assert llm_admission.stats()["abandoned"] == abandoned + 1
+
+    # The abandoned request still lands on the old chat, not on the one the call continues with
+    deadline = time.monotonic() + 2
+    while len(chat.history) < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.05)
+    assert llm_admission.stats()["abandoned"] <= abandoned
+    assert len(chat.history) == 2 and fresh.history == []
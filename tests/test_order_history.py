@@ -0,0 +1,43 @@
+"""Live lookups are served from the order index without waiting on the Orders sheet."""
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sheets_handler
+from fake_backends import FakeWorksheet
+from order_history import OrderHistoryIndex
+
+ORDERS_HEADER = ["Order ID", "Customer Phone", "Items JSON", "Total", "Status", "Date"]
+
+
+class BlockingWorksheet(FakeWorksheet):
+    """Holds every read until released"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, latency_ms=0, **kwargs)
+        self.release = threading.Event()
+
+    def get_all_records(self):
+        self.release.wait(5)
+        return super().get_all_records()
+
+
+def test_stale_index_refreshes_in_the_background(monkeypatch):
+    items = json.dumps([{"name": "Basmati Rice", "quantity": 2}])
+    sheet = BlockingWorksheet("Orders", ORDERS_HEADER, [["1", "5550100", items, 10, "Placed", "2026-01-01"]])
+    monkeypatch.setattr(sheets_handler, "orders_sheet", sheet)
+    index = OrderHistoryIndex(refresh_interval=60)
+
+    start = time.monotonic()
+    assert index.usual_items("5550100") == []
+    assert time.monotonic() - start < 1
+
+    sheet.release.set()
+    deadline = time.monotonic() + 5
+    while index.refreshed_at is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.usual_items("5550100") == [("Basmati Rice", 2)]
@@ -0,0 +1,37 @@
+"""Hindi/Gujarati query normalization leaves English and catalog names alone."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_normalizer import QueryNormalizer
+
+CATALOG = ["Haldiram's Aloo Bhujia 400 g", "Deep Basmati Rice 5kg", "Wagh Bakri Masala Chai 500 g"]
+
+
+def normalizer():
+    normalizer = QueryNormalizer()
+    normalizer.set_catalog(CATALOG)
+    return normalizer
+
+
+def test_english_queries_are_unchanged():
+    n = normalizer()
+    for query in ("Aloo Bhujia", "jeera rice", "masala chai", "basmati rice"):
+        assert n.normalize(query) == query
+
+
+def test_catalog_names_are_unchanged():
+    assert normalizer().normalize("Haldiram's Aloo Bhujia 400 g") == "Haldiram's Aloo Bhujia 400 g"
+
+
+def test_regional_queries_are_rewritten():
+    n = normalizer()
+    assert n.normalize("chawal") == "rice"
+    assert n.normalize("mujhe do kilo chawal chahiye") == "2 kg rice"
+    assert n.normalize("चावल") == "rice"
+    assert n.normalize("jeera chahiye") == "cumin"
+
+
+def test_catalog_words_are_kept_in_regional_queries():
+    assert normalizer().normalize("mujhe aloo bhujia chahiye") == "aloo bhujia"
@@ -0,0 +1,144 @@
+"""Queued Sheets writes are safe to replay after partial or ambiguous failures."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sheets_handler
+from fake_backends import FakeWorksheet
+
+INVENTORY_HEADER = ["Item Name", "Category", "Quantity", "Price (USD)", "Description", "Tags"]
+ORDERS_HEADER = ["Order ID", "Customer Phone", "Items JSON", "Total", "Status", "Date"]
+
+
+class FlakyWorksheet(FakeWorksheet):
+    """Fails the n-th update_cell once; optionally fails append_row after applying it"""
+
+    def __init__(self, *args, fail_update=None, fail_after_append=False, **kwargs):
+        super().__init__(*args, latency_ms=0, **kwargs)
+        self.updates = 0
+        self.fail_update = fail_update
+        self.fail_after_append = fail_after_append
+
+    def update_cell(self, row, col, value):
+        self.updates += 1
+        if self.updates == self.fail_update:
+            raise ConnectionError("update failed")
+        super().update_cell(row, col, value)
+
+    def append_row(self, values):
+        super().append_row(values)
+        if self.fail_after_append:
+            self.fail_after_append = False
+            raise TimeoutError("response lost after the row was written")
+
+
+@pytest.fixture(autouse=True)
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheets_handler, "SHEETS_OUTBOX_PATH", str(tmp_path / "outbox.json"))
+    monkeypatch.setattr(sheets_handler, "inventory_sheet", None)
+    monkeypatch.setattr(sheets_handler, "orders_sheet", None)
+    sheets_handler._outbox.clear()
+    yield
+    sheets_handler._outbox.clear()
+
+
+def test_replayed_decrement_skips_items_already_subtracted(monkeypatch):
+    sheet = FlakyWorksheet("Inventory", INVENTORY_HEADER,
+                           [["Rice", "Grocery", 10, 5.0, "", ""], ["Dal", "Grocery", 10, 3.0, "", ""]],
+                           fail_update=2)
+    monkeypatch.setattr(sheets_handler, "inventory_sheet", sheet)
+
+    sheets_handler.decrement_stock("ORD-1", [{"name": "Rice", "quantity": 2}, {"name": "Dal", "quantity": 3}])
+    assert [row[2] for row in sheet.rows] == [8, 10]
+
+    assert sheets_handler.replay_writes() == 1
+    assert [row[2] for row in sheet.rows] == [8, 7]
+
+
+def test_replayed_order_is_not_appended_twice(monkeypatch):
+    sheet = FlakyWorksheet("Orders", ORDERS_HEADER, fail_after_append=True)
+    monkeypatch.setattr(sheets_handler, "orders_sheet", sheet)
+
+    sheets_handler.append_order(["ORD-2", "5551234567", "[]", 0, "Placed", "2026-10-19"])
+    assert sheets_handler._outbox
+
+    sheets_handler.replay_writes()
+    assert [row[0] for row in sheet.rows] == ["ORD-2"]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_worker_starts_with_an_empty_queue(monkeypatch):
+    monkeypatch.setattr(sheets_handler, "orders_sheet", FlakyWorksheet("Orders", ORDERS_HEADER, fail_after_append=True))
+    sheets_handler.append_order(["ORD-3", "5551234567", "[]", 0, "Placed", "2026-10-19"])
+    assert sheets_handler._outbox
+
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if not sheets_handler._outbox and sheets_handler._replayer is None else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert sheets_handler._outbox
+
+
+def test_orders_in_the_same_second_are_both_written(monkeypatch):
+    import cart_manager
+    from datetime import datetime
+
+    class FrozenClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2026, 10, 19, 9, 0, 0)
+
+    orders = FlakyWorksheet("Orders", ORDERS_HEADER)
+    monkeypatch.setattr(sheets_handler, "orders_sheet", orders)
+    monkeypatch.setattr(sheets_handler, "inventory_sheet", FlakyWorksheet("Inventory", INVENTORY_HEADER,
+                                                                          [["Rice", "Grocery", 10, 5.0, "", ""]]))
+    monkeypatch.setattr(sheets_handler, "customers_sheet", FlakyWorksheet("Customers", ["Phone Number"]))
+    monkeypatch.setattr(sheets_handler, "carts_sheet", FlakyWorksheet("Carts", ["Session ID"]))
+    monkeypatch.setattr(cart_manager, "datetime", FrozenClock)
+    # A live append never reads the Orders sheet
+    monkeypatch.setattr(orders, "get_all_records", lambda: pytest.fail("read Orders on a live append"))
+
+    for call_sid, phone in (("CA-first", "5551110000"), ("CA-second", "5552220000")):
+        cart_manager.shopping_carts[call_sid] = {"items": [{"name": "Rice", "quantity": 1, "price": 5.0, "subtotal": 5.0}],
+                                                 "total": 5.0, "customer_phone": phone}
+        success, _ = cart_manager.place_order(call_sid, {"phone": phone, "name": "Test"})
+        assert success
+
+    assert len(orders.rows) == 2
+    assert orders.rows[0][0] != orders.rows[1][0]
+    assert not sheets_handler._outbox
+
+
+def test_permanent_failure_does_not_block_the_queue(monkeypatch):
+    class RejectingWorksheet(FlakyWorksheet):
+        def append_row(self, values):
+            if values[0] == "ORD-bad" and not self.outage:
+                raise ValueError("row rejected")
+            super().append_row(values)
+
+    orders = RejectingWorksheet("Orders", ORDERS_HEADER)
+    monkeypatch.setattr(sheets_handler, "orders_sheet", orders)
+    # Queue both while Sheets is unreachable, then replay
+    orders.outage = True
+    sheets_handler.append_order(["ORD-bad", "5551234567", "[]", 0, "Placed", "2026-10-19"])
+    sheets_handler.append_order(["ORD-good", "5551234567", "[]", 0, "Placed", "2026-10-19"])
+    assert len(sheets_handler._outbox) == 2
+    orders.outage = False
+
+    assert sheets_handler.replay_writes() == 1
+    assert [row[0] for row in orders.rows] == ["ORD-good"]
+    assert not sheets_handler._outbox
+    assert sheets_handler.dead_letters[-1][0] == "append_order"
+    assert os.path.exists(sheets_handler.SHEETS_OUTBOX_PATH + ".dead")
+
+
+def test_permanent_failure_of_a_live_write_is_not_queued(monkeypatch):
+    orders = FlakyWorksheet("Orders", ORDERS_HEADER)
+    monkeypatch.setattr(orders, "append_row", lambda values: (_ for _ in ()).throw(ValueError("row rejected")))
+    monkeypatch.setattr(sheets_handler, "orders_sheet", orders)
+    sheets_handler.append_order(["ORD-4", "5551234567", "[]", 0, "Placed", "2026-10-19"])
+    assert not sheets_handler._outbox
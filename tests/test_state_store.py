@@ -0,0 +1,33 @@
+"""Turn results shared between workers through the SQLite state store."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import state_store
+from state_store import SQLiteStateStore, publish_result, fetch_result, clear_result
+
+
+@pytest.fixture
+def shared_store(tmp_path, monkeypatch):
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    monkeypatch.setattr(state_store, "state_store", store)
+    return store
+
+
+def test_result_cleared_by_another_worker_is_not_replayed(shared_store):
+    publish_result("CA-result", {"status": "completed", "message": "turn one"})
+    assert fetch_result("CA-result")["message"] == "turn one"
+
+    # Another worker delivers the result and clears it from the store
+    shared_store.delete("result", "CA-result")
+    assert fetch_result("CA-result") is None
+
+
+def test_clear_result_removes_the_shared_copy(shared_store):
+    publish_result("CA-clear", {"status": "completed", "message": "done"})
+    clear_result("CA-clear")
+    assert shared_store.get("result", "CA-clear") is None
+    assert fetch_result("CA-clear") is None
@@ -0,0 +1,135 @@
+"""Registered tool handlers, called the way ToolDispatcher calls them, against fake backends."""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("FAKE_BACKENDS", "1")
+os.environ.setdefault("NGROK_URL", "example.test")
+os.environ.setdefault("FAKE_SHEETS_LATENCY_MS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+main = pytest.importorskip("main")
+
+
+@pytest.fixture(scope="module", autouse=True)
+def sheets():
+    main.connect_google_sheets()
+
+
+def test_search_products_handler_is_the_tool():
+    handler, _ = main.tools.handlers["search_products"]
+    assert handler is main.tool_search_products
+
+
+def test_search_products_handler_answers():
+    handler, _ = main.tools.handlers["search_products"]
+    main.add_to_conversation_history("CA-test-search", "user", "do you have basmati rice")
+    response = handler("CA-test-search", {"query": "basmati rice"}, "en")
+    assert isinstance(response, str)
+    assert "Basmati Rice" in response
+
+
+def test_every_declared_tool_has_a_handler():
+    assert main.tools.missing() == []
+
+
+def test_complements_are_not_other_brands_of_the_same_product():
+    import sheets_handler
+    from product_search import find_complementary_products
+    rice = next(item for item in sheets_handler.get_inventory() if "Basmati Rice" in item["Item Name"])
+    suggestions = find_complementary_products(rice["Item Name"], max_results=3)
+    assert suggestions
+    for item in suggestions:
+        assert "basmati" not in item["Item Name"].lower()
+        assert item["Category"] != rice["Category"]
+
+
+def test_related_products_skip_the_category_and_stay_bounded():
+    import intelligent_search
+    engine = intelligent_search.get_search_engine()
+    rice = next(item for item in engine.inventory_data if "Basmati Rice" in item["Item Name"])
+    related = engine.find_related_products(rice["Item Name"], max_results=4)
+    assert 0 < len(related) <= 4
+    assert all(item["Category"].lower() != rice["Category"].lower() for item in related)
+
+
+def test_degraded_engine_reloads_once_sheets_are_attached(monkeypatch):
+    import intelligent_search
+    import sheets_handler
+    monkeypatch.setattr(intelligent_search, "search_engine", None)
+    monkeypatch.setattr(intelligent_search, "_degraded_engine", None)
+    monkeypatch.setattr(sheets_handler, "inventory_sheet", None)
+    monkeypatch.setattr(sheets_handler, "_inventory_snapshot", [])
+    assert intelligent_search.get_search_engine().inventory_data == []
+
+    main._attach_sheets()
+    assert intelligent_search.get_search_engine().inventory_data
+
+
+def test_warm_step_gives_up_without_raising(monkeypatch):
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ConnectionError("sheets down")
+
+    assert main._warm_step("sheets_test", failing, retries=3) is None
+    assert len(calls) == 3
+
+
+def test_sheets_not_ready_when_worksheets_are_not_attached(monkeypatch):
+    import sheets_handler
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+    monkeypatch.setitem(main.readiness, "sheets", True)
+
+    def unreachable(recover_writes=True):
+        # What connect_google_sheets does when open_by_key fails
+        sheets_handler.inventory_sheet = sheets_handler.customers_sheet = None
+        sheets_handler.orders_sheet = sheets_handler.carts_sheet = None
+        return sheets_handler.worksheets_attached()
+
+    monkeypatch.setattr(main, "connect_google_sheets", unreachable)
+    main._warm_step("sheets", main._attach_sheets)
+    assert main.readiness["sheets"] is False
+    monkeypatch.undo()
+    assert main.connect_google_sheets() is True
+    assert sheets_handler.worksheets_attached()
+
+
+def test_failed_turn_resends_its_state_update(monkeypatch):
+    import asyncio
+    from session_registry import registry
+    call_sid = "CA-test-failed-turn"
+    main.add_to_cart(call_sid, "Basmati Rice", 1)
+    sent = []
+
+    def failing_send(chat, prompt, **kwargs):
+        sent.append(prompt)
+        raise RuntimeError("gemini unavailable")
+
+    monkeypatch.setattr(main.gemini_client, "send_message", failing_send)
+    asyncio.run(main.process_user_query("what is in my cart", call_sid))
+    asyncio.run(main.process_user_query("what is in my cart", call_sid))
+    assert registry.get(call_sid).prompt_state is None
+    assert len(sent) == 2 and all("STATE UPDATE" in prompt for prompt in sent)
+
+
+def test_state_summary_leaves_out_the_turn_being_sent():
+    call_sid = "CA-test-summary"
+    main.add_to_conversation_history(call_sid, "user", "hello")
+    main.add_to_conversation_history(call_sid, "assistant", "hi, what would you like?")
+    main.add_to_conversation_history(call_sid, "user", "two packets of basmati rice")
+    summary = main.build_state_summary(call_sid)
+    assert "hello" in summary
+    assert "basmati" not in summary
+
+
+def test_adopted_preloaded_engine_rebuilds_in_the_pool(monkeypatch):
+    import intelligent_search
+    monkeypatch.setattr(intelligent_search, "search_engine", None)
+    preloaded = intelligent_search.IntelligentSearch(backend="tfidf", use_pool=False, similar_neighbours=0)
+    monkeypatch.setattr(preloaded, "start_refresher", lambda: None)
+    assert intelligent_search.warm_up(engine=preloaded) is preloaded
+    assert preloaded.use_pool
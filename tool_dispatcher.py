@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from log_config import get_logger
+from metrics import metrics
+
+log = get_logger(__name__)
+
+# Gemini sends INTEGER arguments as floats (2.0); coerce by declared type
+_COERCE = {
+    "INTEGER": lambda value: int(float(value)),
+    "NUMBER": float,
+    "STRING": str,
+    "BOOLEAN": bool,
+}
+
+
+class ToolDispatcher:
+    """Table of tool handlers keyed by the names in functions.function_declarations
+
+    Handlers are plain functions ``handler(call_sid, args, lang_code) -> str``.
+    All function calls in one model response are run concurrently in worker
+    threads, grouped by phase: every call of a lower phase finishes before the
+    next phase starts, so e.g. a cart summary requested alongside two
+    add_to_cart calls sees both items.
+    """
+
+    def __init__(self, declarations):
+        self.declarations = {declaration["name"]: declaration for declaration in declarations}
+        self.handlers = {}  # {name: (handler, phase)}
+
+    def register(self, name, phase=0):
+        """Decorator registering the handler for a declared tool"""
+        if name not in self.declarations:
+            raise ValueError(f"Tool {name!r} is not in function_declarations")
+
+        def decorator(handler):
+            self.handlers[name] = (handler, phase)
+            return handler
+        return decorator
+
+    def missing(self):
+        """Declared tools without a handler"""
+        return sorted(set(self.declarations) - set(self.handlers))
+
+    def coerce_args(self, name, args):
+        """Arguments converted to their declared types; undeclared ones are dropped"""
+        properties = self.declarations[name].get("parameters", {}).get("properties", {})
+        coerced = {}
+        for key, value in args.items():
+            spec = properties.get(key)
+            if spec is None:
+                log.debug("Dropping undeclared argument %s for %s", key, name)
+                continue
+            convert = _COERCE.get(spec.get("type"))
+            try:
+                coerced[key] = convert(value) if convert else value
+            except (TypeError, ValueError):
+                coerced[key] = value
+            if "enum" in spec and coerced[key] not in spec["enum"]:
+                del coerced[key]
+        return coerced
+
+    def _run(self, call_sid, name, args, lang_code):
+        """Run one handler (in a worker thread) and time it"""
+        handler, _ = self.handlers[name]
+        start = time.perf_counter()
+        try:
+            return handler(call_sid, args, lang_code)
+        finally:
+            metrics.observe(f"tool.{name}", time.perf_counter() - start)
+
+    async def dispatch(self, call_sid, function_calls, session_lang, fallback_text):
+        """Execute (name, args) calls concurrently by phase; returns their responses in call order"""
+        responses = [None] * len(function_calls)
+        phases = {}
+        for position, (name, args) in enumerate(function_calls):
+            if name not in self.handlers:
+                log.warning("No handler for tool %s", name, extra={"call_sid": call_sid})
+                responses[position] = fallback_text
+                continue
+            args = self.coerce_args(name, args)
+            lang_code = args.get("language", session_lang)
+            phases.setdefault(self.handlers[name][1], []).append((position, name, args, lang_code))
+
+        for phase in sorted(phases):
+            batch = phases[phase]
+            results = await asyncio.gather(
+                *(asyncio.to_thread(self._run, call_sid, name, args, lang_code) for _, name, args, lang_code in batch),
+                return_exceptions=True,
+            )
+            for (position, name, _, _), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    log.error("Tool %s failed: %s", name, result, exc_info=result, extra={"call_sid": call_sid})
+                    result = fallback_text
+                responses[position] = result
+        return responses